@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark del database della libreria (DatabaseManager).
+
+Costruisce librerie sintetiche di 1k, 10k e 100k video, con trascrizioni
+nelle lingue richieste da download_video (it, en) di lunghezza realistica,
+segmenti e screenshot, e misura i percorsi caldi di inserimento, ricerca ed
+elenco: add_video, add_transcript, search_transcripts, get_all_videos e
+get_video_screenshots. Per ogni operazione registra latenze (media, p50,
+p95, max) e picco di memoria Python; i risultati vanno in un file JSON da
+confrontare tra versioni.
+
+Con trascrizioni di lunghezza reale la libreria da 100k video occupa
+diversi GB e richiede decine di minuti: --transcript-scale 0.1 la riduce
+per un controllo rapido (i risultati vanno confrontati a parità di scala).
+
+Esempi:
+    python bench_database.py
+    python bench_database.py --sizes 1000 10000 -o bench_new.json --compare bench_old.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from youtube_core import DatabaseManager, DownloadPipeline, percentile
+
+
+# Parole per lingua, dalla più alla meno frequente: estratte con pesi 1/rango
+# (legge di Zipf) per avere termini comuni, medi e rari come nei sottotitoli veri
+WORDS = {
+    'it': ("di e il la che a per in un è non una del con si da le questo come "
+           "più ma sono anche se alla ci al lo nel della gli cosa quando molto "
+           "video oggi fare tutto dove allora perché proprio ancora abbiamo "
+           "vediamo adesso qui poi bene sempre tempo parte modo prima dopo "
+           "esempio punto lavoro progetto codice funzione valore dati sistema "
+           "problema soluzione risultato domanda risposta tutorial corso lezione "
+           "capitolo schermo finestra pulsante impostazioni database ricerca "
+           "libreria download qualità formato audio musica chitarra ricetta "
+           "cucina pasta pomodoro basilico montagna viaggio treno aereo mappa "
+           "bicicletta motore batteria pannello energia sole vento pioggia "
+           "neve giardino albero fiore seme terreno acqua fiume lago mare "
+           "spiaggia isola vulcano terremoto stella pianeta galassia telescopio "
+           "microscopio cellula proteina molecola atomo elettrone quantistica "
+           "algoritmo compilatore sintassi variabile ciclo ricorsione grafo "
+           "ontologia epistemologia ermeneutica fenomenologia").split(),
+    'en': ("the and to of a in is that it you this for on with we so be as "
+           "are have not but what can just like was all your do if one about "
+           "video today make right here now going really know think want see "
+           "look thing way time first then because actually pretty little "
+           "example point work project code function value data system problem "
+           "solution result question answer tutorial course lesson chapter "
+           "screen window button settings database search library download "
+           "quality format audio music guitar recipe kitchen pasta tomato basil "
+           "mountain travel train plane map bicycle engine battery panel energy "
+           "sun wind rain snow garden tree flower seed soil water river lake sea "
+           "beach island volcano earthquake star planet galaxy telescope "
+           "microscope cell protein molecule atom electron quantum algorithm "
+           "compiler syntax variable loop recursion graph ontology epistemology "
+           "hermeneutics phenomenology").split(),
+}
+
+# Parole al minuto del parlato (sottotitoli automatici)
+WORDS_PER_MINUTE = 140
+
+# Durata dei video (lognormale): mediana ~8 minuti, coda fino a ~2 ore
+DURATION_MEDIAN = 8 * 60
+DURATION_SIGMA = 0.9
+DURATION_MAX = 2 * 60 * 60
+
+# Un cue dei sottotitoli ogni ~10 parole; uno screenshot ogni 30 secondi
+# (Visual Summary automatico) per una parte dei video
+CUE_WORDS = 10
+SCREENSHOT_INTERVAL = DownloadPipeline.SUMMARY_INTERVAL
+SCREENSHOT_SHARE = 0.3
+
+# Video inseriti per transazione durante la costruzione della libreria
+BUILD_BATCH = 500
+
+
+class LibraryGenerator:
+    """Genera video sintetici ma realistici, riproducibili dato il seed"""
+
+    def __init__(self, seed=0, transcript_scale=1.0):
+        self.random = random.Random(seed)
+        self.transcript_scale = transcript_scale
+        self.cum_weights = {
+            lang: list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+            for lang, words in WORDS.items()
+        }
+
+    def words(self, language, count):
+        return self.random.choices(WORDS[language], cum_weights=self.cum_weights[language],
+                                   k=count)
+
+    def duration(self):
+        value = self.random.lognormvariate(0, DURATION_SIGMA) * DURATION_MEDIAN
+        return int(min(max(value, 30), DURATION_MAX))
+
+    def video(self, index):
+        duration = self.duration()
+        video_id = f"bench{index:06d}"
+        title = ' '.join(self.words('it', 6)).capitalize()
+        return {
+            'id': video_id,
+            'title': title,
+            'uploader': f"Canale {self.random.randrange(500)}",
+            'duration': duration,
+            'upload_date': f"20{self.random.randrange(10, 26)}"
+                           f"{self.random.randrange(1, 13):02d}{self.random.randrange(1, 29):02d}",
+            'description': ' '.join(self.words('it', self.random.randrange(20, 120))),
+            'thumbnail_path': f"/library/{video_id}.webp",
+            'file_path': f"/library/{video_id}.mp4",
+            'file_size': duration * 250_000,
+            'format': 'video'
+        }
+
+    def transcript(self, language, duration):
+        """Testo completo e cue (inizio, fine, testo) della trascrizione"""
+        count = max(CUE_WORDS, int(duration / 60 * WORDS_PER_MINUTE * self.transcript_scale))
+        words = self.words(language, count)
+        cue_length = duration / (count / CUE_WORDS)
+        segments = []
+        for n, start in enumerate(range(0, count, CUE_WORDS)):
+            text = ' '.join(words[start:start + CUE_WORDS])
+            segments.append((language, n * cue_length, (n + 1) * cue_length, text))
+        return ' '.join(words), segments
+
+    def screenshots(self, video):
+        if self.random.random() >= SCREENSHOT_SHARE:
+            return []
+        return [(t, f"/library/{video['id']}_summary/screenshot_{t}.jpg")
+                for t in range(0, video['duration'], SCREENSHOT_INTERVAL)]
+
+    def record(self, index):
+        video = self.video(index)
+        transcripts = []
+        segments = []
+        for language in DownloadPipeline.TRANSCRIPT_LANGUAGES:
+            text, cues = self.transcript(language, video['duration'])
+            transcripts.append((language, text))
+            segments.extend(cues)
+        return {
+            'video': video,
+            'transcripts': transcripts,
+            'segments': segments,
+            'screenshots': self.screenshots(video)
+        }
+
+    def queries(self):
+        """Ricerche tipiche: parole comuni, medie e rare, frasi, prefissi, nessun risultato"""
+        it, en = WORDS['it'], WORDS['en']
+        return [
+            ('comune', it[45]),
+            ('comune', en[40]),
+            ('media', it[90]),
+            ('media', en[95]),
+            ('rara', it[-3]),
+            ('rara', en[-2]),
+            ('due parole', f"{it[60]} {it[70]}"),
+            ('frase', f'"{en[50]} {en[51]}"'),
+            ('prefisso', it[100][:4] + '*'),
+            ('nessun risultato', 'zzyzx'),
+        ]
+
+
+def summarize(durations, peak):
+    """Statistiche delle latenze (ms) e picco di memoria (KiB)"""
+    ordered = sorted(durations)
+    return {
+        'count': len(ordered),
+        'total_s': round(sum(ordered), 4),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+        'peak_kib': round(peak / 1024, 1)
+    }
+
+
+def timed(calls):
+    """Durata (secondi) di ogni chiamata"""
+    durations = []
+    for call in calls:
+        start = time.perf_counter()
+        call()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def peak_memory(call):
+    """Picco di memoria Python (byte) di una chiamata. Misurato a parte:
+    tracemalloc rallenta le allocazioni e falserebbe le latenze"""
+    tracemalloc.start()
+    try:
+        call()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(calls):
+    """Latenze di tutte le chiamate e picco di memoria della prima"""
+    return summarize(timed(calls), peak_memory(calls[0]))
+
+
+def build_library(db, generator, size, log):
+    """Popola il database con `size` video tramite ingest_videos (a lotti)"""
+    start = time.perf_counter()
+    durations = []
+    for first in range(0, size, BUILD_BATCH):
+        batch = [generator.record(i) for i in range(first, min(first + BUILD_BATCH, size))]
+        batch_start = time.perf_counter()
+        if not db.ingest_videos(batch):
+            raise RuntimeError("ingest_videos fallito")
+        durations.append(time.perf_counter() - batch_start)
+        log(f"   {min(first + BUILD_BATCH, size)}/{size} video")
+    return {
+        'videos': size,
+        'batch': BUILD_BATCH,
+        'wall_s': round(time.perf_counter() - start, 3),
+        'ingest': summarize(durations, 0)
+    }
+
+
+def run_size(size, args, log):
+    """Costruisce la libreria di una dimensione e misura tutte le operazioni"""
+    work_dir = Path(tempfile.mkdtemp(prefix=f'bench_db_{size}_', dir=args.work_dir))
+    try:
+        db = DatabaseManager(str(work_dir / 'youtube_library.db'))
+        generator = LibraryGenerator(seed=args.seed + size, transcript_scale=args.transcript_scale)
+
+        log(f"📚 Libreria da {size} video...")
+        build = build_library(db, generator, size, log)
+        rng = random.Random(args.seed)
+
+        results = {'build': build}
+
+        # Inserimenti singoli come add_video/add_transcript (un commit ciascuno)
+        log("⏱️ add_video / add_transcript")
+        extra = [generator.record(size + i) for i in range(args.samples)]
+        results['add_video'] = measure(
+            [lambda r=r: db.add_video(r['video']) for r in extra])
+        results['add_transcript'] = measure(
+            [lambda r=r: db.add_transcript(r['video']['id'], *r['transcripts'][0])
+             for r in extra])
+
+        log("⏱️ search_transcripts")
+        per_query = {}
+        all_durations = []
+        all_peak = 0
+        for kind, query in generator.queries():
+            durations = timed([lambda q=query: db.search_transcripts(q)] * args.repeat)
+            peak = peak_memory(lambda q=query: db.search_transcripts(q))
+            all_durations.extend(durations)
+            all_peak = max(all_peak, peak)
+            stats = summarize(durations, peak)
+            stats['kind'] = kind
+            stats['hits'] = len(db.search_transcripts(query))
+            per_query[query] = stats
+        results['search_transcripts'] = summarize(all_durations, all_peak)
+        results['search_transcripts']['queries'] = per_query
+
+        log("⏱️ get_all_videos")
+        results['get_all_videos'] = measure([db.get_all_videos] * args.repeat)
+        results['get_all_videos']['rows'] = len(db.get_all_videos())
+
+        log("⏱️ get_video_screenshots")
+        ids = [f"bench{rng.randrange(size):06d}" for _ in range(args.samples)]
+        results['get_video_screenshots'] = measure(
+            [lambda v=v: db.get_video_screenshots(v) for v in ids])
+
+        db.close()
+        results['db_bytes'] = sum(f.stat().st_size for f in work_dir.iterdir())
+        return results
+    finally:
+        if args.keep:
+            log(f"📁 Database conservato in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def environment():
+    """Versione del codice e dell'ambiente, per confrontare i risultati"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    conn = sqlite3.connect(':memory:')
+    try:
+        conn.execute('CREATE VIRTUAL TABLE t USING fts5(x)')
+        fts5 = True
+    except sqlite3.OperationalError:
+        fts5 = False
+    conn.close()
+
+    return {
+        'commit': commit,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'fts5': fts5,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def print_report(report, baseline=None):
+    """Tabella riassuntiva (con la variazione del p50 rispetto al baseline)"""
+    operations = ('add_video', 'add_transcript', 'search_transcripts',
+                  'get_all_videos', 'get_video_screenshots')
+    for size, results in report['results'].items():
+        build = results['build']
+        print(f"\n📚 {size} video - costruzione {build['wall_s']:.1f}s, "
+              f"database {results['db_bytes'] / 1048576:.1f}MiB")
+        print(f"   {'operazione':<24}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"
+              f"{'picco KiB':>12}{'vs base':>10}")
+        for name in operations:
+            stats = results[name]
+            change = ''
+            base = (baseline or {}).get('results', {}).get(size, {}).get(name)
+            if base and base['p50_ms']:
+                change = f"{(stats['p50_ms'] / base['p50_ms'] - 1) * 100:+.0f}%"
+            print(f"   {name:<24}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}"
+                  f"{stats['max_ms']:>10.3f}{stats['peak_kib']:>12.1f}{change:>10}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del database della libreria")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        metavar='N', help="numero di video delle librerie (default: 1k 10k 100k)")
+    parser.add_argument('-o', '--output', default='bench_database.json', metavar='FILE',
+                        help="file JSON dei risultati (default: bench_database.json)")
+    parser.add_argument('--compare', metavar='FILE',
+                        help="risultati precedenti con cui confrontare il p50")
+    parser.add_argument('--samples', type=int, default=200, metavar='N',
+                        help="chiamate misurate per inserimenti e screenshot (default: 200)")
+    parser.add_argument('--repeat', type=int, default=5, metavar='N',
+                        help="ripetizioni di ogni ricerca e dell'elenco completo (default: 5)")
+    parser.add_argument('--transcript-scale', type=float, default=1.0, metavar='X',
+                        help="fattore sulla lunghezza delle trascrizioni (default: 1.0)")
+    parser.add_argument('--seed', type=int, default=0, help="seed dei dati sintetici")
+    parser.add_argument('--work-dir', metavar='DIR',
+                        help="cartella dei database temporanei (default: cartella temporanea)")
+    parser.add_argument('--keep', action='store_true',
+                        help="non eliminare i database generati")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Funzione principale"""
+    args = parse_args(argv)
+
+    def log(message):
+        print(message, file=sys.stderr, flush=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    report = {
+        'environment': environment(),
+        'settings': {
+            'samples': args.samples,
+            'repeat': args.repeat,
+            'transcript_scale': args.transcript_scale,
+            'seed': args.seed,
+            'languages': list(DownloadPipeline.TRANSCRIPT_LANGUAGES)
+        },
+        'results': {}
+    }
+
+    for size in args.sizes:
+        report['results'][str(size)] = run_size(size, args, log)
+        # Salvato dopo ogni dimensione: le librerie grandi richiedono tempo
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print_report(report, baseline)
+    log(f"\n💾 Risultati salvati in {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sostituto offline di yt-dlp per bench_pipeline.py.
+
+Accetta le opzioni che DownloadPipeline passa a yt-dlp e si comporta allo
+stesso modo senza rete: stampa l'estrazione e le righe di progresso JSON
+(PROGRESS_PREFIX), scrive sottotitoli VTT, thumbnail e il file media
+(copiato dai fixture in BENCH_FIXTURES, in un file .part poi rinominato) e
+i metadati di --print-to-file. Con --flat-playlist stampa gli elementi.
+
+URL riconosciuti:
+    fake://video/<id>              video (fallisce se l'id inizia con "fail")
+    fake://playlist/<nome>?count=N playlist di N video
+
+Variabili d'ambiente:
+    BENCH_FIXTURES       cartella con media.mp4 e thumb.jpg (obbligatoria)
+    BENCH_RATE           byte/s simulati per download (0 = velocità del disco)
+    BENCH_EXTRACT_DELAY  secondi di estrazione simulata prima del download
+    BENCH_SIZE           dimensione in byte del file scaricato (0 = quella del fixture)
+    BENCH_DURATION       durata in secondi dichiarata nei metadati e nei sottotitoli
+"""
+
+import json
+import os
+import shutil
+import struct
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from youtube_progress import PROGRESS_PREFIX
+
+
+CHUNK_SIZE = 256 * 1024
+
+# Opzioni di yt-dlp che prendono un argomento (le altre sono flag)
+VALUE_OPTIONS = {
+    '-o', '-f', '-O', '--remote-components', '--progress-template', '--audio-format',
+    '--audio-quality', '--sub-langs', '--sub-format', '--merge-output-format',
+    '--download-archive', '--proxy', '--limit-rate'
+}
+
+SUBTITLE_WORDS = ("oggi vediamo come funziona il progetto passo dopo passo "
+                  "today we look at how the project works step by step").split()
+
+
+def parse_command(argv):
+    """Opzioni (ultimo valore per nome, --print-to-file a parte) e URL"""
+    options = {}
+    flags = set()
+    urls = []
+    args = iter(argv)
+    for arg in args:
+        if arg == '--print-to-file':
+            options['--print-to-file'] = (next(args), next(args))
+        elif arg in VALUE_OPTIONS:
+            options[arg] = next(args)
+        elif arg.startswith('-'):
+            flags.add(arg)
+        else:
+            urls.append(arg)
+    return options, flags, urls
+
+
+def format_timestamp(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:06.3f}"
+
+
+def write_subtitles(path, duration, language):
+    """Sottotitoli VTT con un cue ogni 4 secondi"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("WEBVTT\nKind: captions\nLanguage: " + language + "\n\n")
+        for n, start in enumerate(range(0, int(duration), 4)):
+            words = [SUBTITLE_WORDS[(n + i) % len(SUBTITLE_WORDS)] for i in range(8)]
+            f.write(f"{format_timestamp(start)} --> {format_timestamp(start + 4)}\n"
+                    f"{' '.join(words)}\n\n")
+
+
+def emit_progress(video_id, filename, downloaded, total, started):
+    elapsed = time.monotonic() - started
+    speed = downloaded / elapsed if elapsed > 0 else None
+    progress = {
+        'status': 'finished' if downloaded >= total else 'downloading',
+        'downloaded_bytes': downloaded,
+        'total_bytes': total,
+        'speed': speed,
+        'eta': (total - downloaded) / speed if speed else None,
+        'elapsed': elapsed,
+        'filename': filename
+    }
+    print(PROGRESS_PREFIX + json.dumps({'info': {'id': video_id, 'format_id': 'fake'},
+                                        'progress': progress}), flush=True)
+
+
+def download_media(source, target, video_id, size, rate):
+    """Copia il fixture nel .part (riprendendo quello esistente) con il ritmo simulato.
+
+    Oltre la dimensione del fixture aggiunge un box MP4 'free': il file
+    resta un MP4 valido per ffmpeg.
+    """
+    partial = target + '.part'
+    media_size = os.path.getsize(source)
+    total = max(size, media_size + 8)
+    done = os.path.getsize(partial) if os.path.exists(partial) else 0
+    if done:
+        print(f"[download] Resuming download at byte {done}", flush=True)
+
+    started = time.monotonic()
+    sent = 0
+    with open(source, 'rb') as src, open(partial, 'ab') as dst:
+        src.seek(min(done, media_size))
+        while done < total:
+            if done < media_size:
+                chunk = src.read(min(CHUNK_SIZE, media_size - done))
+            elif done == media_size:
+                chunk = struct.pack('>I', total - media_size) + b'free'
+            else:
+                chunk = bytes(min(CHUNK_SIZE, total - done))
+            dst.write(chunk)
+            done += len(chunk)
+            sent += len(chunk)
+
+            if rate:
+                ahead = sent / rate - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+            emit_progress(video_id, target, done, total, started)
+
+    os.replace(partial, target)
+
+
+def run_video(url, options, flags, fixtures):
+    video_id = urlsplit(url).path.strip('/')
+    print(f"[fake] Extracting URL: {url}", flush=True)
+    time.sleep(float(os.environ.get('BENCH_EXTRACT_DELAY', 0)))
+    if video_id.startswith('fail'):
+        print(f"ERROR: [fake] {video_id}: Video unavailable", flush=True)
+        return 1
+
+    duration = int(os.environ.get('BENCH_DURATION', 0)) or 300
+    title = f"Video {video_id}"
+    audio = '-x' in flags
+    ext = options.get('--audio-format', 'mp3') if audio else 'mp4'
+    template = options.get('-o', '%(title)s.%(ext)s')
+    target = template.replace('%(title)s', title).replace('%(ext)s', ext)
+    base = os.path.splitext(target)[0]
+    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+
+    info = {
+        'id': video_id,
+        'extractor_key': 'Fake',
+        'title': title,
+        'uploader': 'Canale Benchmark',
+        'duration': duration,
+        'upload_date': '20260101',
+        'description': 'Video generato per il benchmark offline',
+    }
+
+    subtitles = []
+    if '--write-subs' in flags or '--write-auto-subs' in flags:
+        for language in options.get('--sub-langs', '').split(','):
+            if language in ('it', 'en'):
+                path = f"{base}.{language}.vtt"
+                write_subtitles(path, duration, language)
+                print(f"[info] Writing video subtitles to: {path}", flush=True)
+                subtitles.append(path)
+    info['requested_subtitles.:.filepath'] = subtitles
+
+    thumbnails = []
+    if '--write-thumbnail' in flags:
+        path = f"{base}.jpg"
+        shutil.copyfile(os.path.join(fixtures, 'thumb.jpg'), path)
+        thumbnails.append(path)
+    info['thumbnails.:.filepath'] = thumbnails
+
+    print_to_file = options.get('--print-to-file')
+
+    def write_metadata(when):
+        if print_to_file and print_to_file[0].startswith(when + ':'):
+            with open(print_to_file[1].replace('%%', '%'), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(info, ensure_ascii=False) + '\n')
+
+    write_metadata('before_dl')
+    if '--skip-download' not in flags:
+        print(f"[download] Destination: {target}", flush=True)
+        size = int(os.environ.get('BENCH_SIZE', 0))
+        rate = float(os.environ.get('BENCH_RATE', 0))
+        download_media(os.path.join(fixtures, 'media.mp4'), target, video_id, size, rate)
+        info['filepath'] = target
+        info['filesize'] = os.path.getsize(target)
+        write_metadata('after_move')
+    return 0
+
+
+def run_playlist(url, options):
+    parts = urlsplit(url)
+    name = parts.path.strip('/')
+    count = int(parse_qs(parts.query).get('count', ['10'])[0])
+    for n in range(count):
+        video_id = f"{name}{n:04d}"
+        print(json.dumps({'id': video_id, 'url': f"fake://video/{video_id}",
+                          'webpage_url': f"fake://video/{video_id}",
+                          'title': f"Video {video_id}", 'ie_key': 'Fake'}), flush=True)
+    return 0
+
+
+def main(argv=None):
+    options, flags, urls = parse_command(sys.argv[1:] if argv is None else argv)
+    fixtures = os.environ.get('BENCH_FIXTURES')
+    if not fixtures or not urls:
+        print("ERROR: BENCH_FIXTURES e URL obbligatori", flush=True)
+        return 2
+
+    url = urls[-1]
+    if '--flat-playlist' in flags:
+        return run_playlist(url, options)
+    return run_video(url, options, flags, fixtures)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
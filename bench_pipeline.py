@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline della pipeline download → ingest → screenshot.
+
+Esegue DownloadPipeline e DownloadQueue reali, ma al posto di yt-dlp avvia
+bench_fake_ytdlp.py, che simula estrazione e download (ritmo e dimensione
+configurabili) e scrive media, sottotitoli e thumbnail generati da ffmpeg.
+Per ogni livello di concorrenza esegue N job su una libreria vuota e
+riporta job/min, byte/s, latenza dei job (p50, p99) e tempo per fase
+(attesa in coda, download, ingest, screenshot). Richiede ffmpeg.
+
+Esempi:
+    python bench_pipeline.py
+    python bench_pipeline.py --jobs 32 --concurrency 2 4 8 16 --rate 5M -o bench_pipeline.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from bench_database import environment
+from youtube_bandwidth import format_rate, parse_rate
+from youtube_core import (DatabaseManager, DownloadPipeline, DownloadQueue, FrameExtractor,
+                          percentile)
+from youtube_progress import format_bytes
+
+
+FAKE_YTDLP = str(Path(__file__).resolve().with_name('bench_fake_ytdlp.py'))
+
+# Fasi riportate, nell'ordine in cui avvengono
+STAGES = ('queue', 'download', 'ingest', 'screenshots')
+
+
+class BenchPipeline(DownloadPipeline):
+    """DownloadPipeline con yt-dlp simulato e tempi per fase di ogni job"""
+
+    YTDLP_COMMAND = (sys.executable, FAKE_YTDLP)
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self.stages = defaultdict(dict)
+        self._current = threading.local()
+
+    def download_video(self, job):
+        self._current.job = job
+        start = time.perf_counter()
+        try:
+            return super().download_video(job)
+        finally:
+            stages = self.stages[job.id]
+            stages['started'] = start
+            stages['total'] = time.perf_counter() - start
+
+    def save_to_database(self, video_infos, options, timer=None):
+        start = time.perf_counter()
+        try:
+            return super().save_to_database(video_infos, options, timer)
+        finally:
+            # Include il Visual Summary (on_saved), sottratto nel report
+            self.stages[self._current.job.id]['save'] = time.perf_counter() - start
+
+    def generate_summaries(self, records, options):
+        start = time.perf_counter()
+        try:
+            return super().generate_summaries(records, options)
+        finally:
+            self.stages[self._current.job.id]['screenshots'] = time.perf_counter() - start
+
+
+def make_fixtures(directory, duration):
+    """Video di prova (con audio) e thumbnail generati da ffmpeg"""
+    directory.mkdir(parents=True, exist_ok=True)
+    subprocess.run([
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc=duration={duration}:size=640x360:rate=25',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-c:a', 'aac', '-shortest',
+        '-movflags', '+faststart',
+        str(directory / 'media.mp4')
+    ], check=True)
+    subprocess.run([
+        'ffmpeg', '-y', '-v', 'error', '-i', str(directory / 'media.mp4'),
+        '-frames:v', '1', str(directory / 'thumb.jpg')
+    ], check=True)
+
+
+def stats(values):
+    """Media, p50 e p99 (secondi)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        'mean_s': round(statistics.fmean(ordered), 3),
+        'p50_s': round(percentile(ordered, 50), 3),
+        'p99_s': round(percentile(ordered, 99), 3),
+        'max_s': round(ordered[-1], 3)
+    }
+
+
+def run_level(concurrency, args, work_root):
+    """Esegue tutti i job con `concurrency` download paralleli su una libreria vuota"""
+    library = Path(tempfile.mkdtemp(prefix=f'level{concurrency}_', dir=work_root))
+    db = DatabaseManager(str(library / 'youtube_library.db'))
+
+    finished = {}
+    submitted = {}
+
+    def on_done(job):
+        finished[job.id] = time.perf_counter()
+
+    pipeline = BenchPipeline(db, on_done=on_done,
+                             frame_extractor=FrameExtractor(args.ffmpeg_workers))
+    queue = DownloadQueue(pipeline.download_video, concurrency)
+
+    options = {
+        'output_path': str(library),
+        'format': 'video',
+        'quality': 'best',
+        'knowledge_base': True,
+        'playlist': False,
+        'auto_summary': not args.no_screenshots,
+        'skip_known': False
+    }
+
+    start = time.perf_counter()
+    jobs = []
+    for n in range(args.jobs):
+        # I job "fail" misurano anche il costo degli errori
+        prefix = 'fail' if n < args.failures else 'bench'
+        job = pipeline.create_job(f"fake://video/{prefix}{concurrency:02d}{n:05d}", dict(options))
+        submitted[job.id] = time.perf_counter()
+        jobs.append(job)
+        queue.submit(job)
+    queue.join()
+    wall = time.perf_counter() - start
+
+    ok = [job for job in jobs if job.video_ids]
+    media_bytes = sum(job.tracker.downloaded_bytes for job in ok)
+
+    per_stage = {stage: [] for stage in STAGES}
+    latencies = []
+    for job in ok:
+        times = pipeline.stages[job.id]
+        save = times.get('save', 0)
+        screenshots = times.get('screenshots', 0)
+        per_stage['queue'].append(times['started'] - submitted[job.id])
+        per_stage['download'].append(times['total'] - save)
+        per_stage['ingest'].append(save - screenshots)
+        if 'screenshots' in times:
+            per_stage['screenshots'].append(screenshots)
+        latencies.append(finished[job.id] - submitted[job.id])
+
+    db.close()
+    if not args.keep:
+        shutil.rmtree(library, ignore_errors=True)
+
+    return {
+        'concurrency': concurrency,
+        'jobs': len(jobs),
+        'ok': len(ok),
+        'failed': len(jobs) - len(ok),
+        'wall_s': round(wall, 3),
+        'jobs_per_min': round(len(jobs) / wall * 60, 2),
+        'bytes_per_s': round(media_bytes / wall),
+        'latency': stats(latencies),
+        'stages': {stage: stats(values) for stage, values in per_stage.items()}
+    }
+
+
+def print_report(report):
+    print(f"\n{'paralleli':>9}{'job/min':>10}{'MiB/s':>9}{'p50 s':>9}{'p99 s':>9}  "
+          + ''.join(f"{stage + ' p50':>17}" for stage in STAGES))
+    for level in report['results']:
+        latency = level['latency'] or {}
+        row = (f"{level['concurrency']:>9}{level['jobs_per_min']:>10.1f}"
+               f"{level['bytes_per_s'] / 1048576:>9.1f}"
+               f"{latency.get('p50_s', 0):>9.2f}{latency.get('p99_s', 0):>9.2f}  ")
+        for stage in STAGES:
+            values = level['stages'][stage]
+            row += f"{values['p50_s'] if values else 0:>17.3f}"
+        print(row)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark offline della pipeline di download (yt-dlp simulato)")
+    parser.add_argument('--jobs', type=int, default=16, metavar='N',
+                        help="job per livello di concorrenza (default: 16)")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8],
+                        metavar='N', help="download paralleli da provare (default: 1 2 4 8)")
+    parser.add_argument('--rate', type=parse_rate, default=parse_rate('8M'), metavar='RATE',
+                        help="velocità simulata di ogni download (default: 8M, 0 = disco)")
+    parser.add_argument('--size', type=parse_rate, default=parse_rate('20M'), metavar='BYTES',
+                        help="dimensione di ogni video scaricato (default: 20M)")
+    parser.add_argument('--duration', type=int, default=300, metavar='SEC',
+                        help="durata del video di prova (default: 300)")
+    parser.add_argument('--extract-delay', type=float, default=1.0, metavar='SEC',
+                        help="tempo di estrazione simulato per video (default: 1.0)")
+    parser.add_argument('--failures', type=int, default=0, metavar='N',
+                        help="job che falliscono durante l'estrazione (default: 0)")
+    parser.add_argument('--no-screenshots', action='store_true',
+                        help="senza Visual Summary (solo download e ingest)")
+    parser.add_argument('--ffmpeg-workers', type=int, metavar='N',
+                        help="processi ffmpeg per video (default: come la GUI)")
+    parser.add_argument('-o', '--output', default='bench_pipeline.json', metavar='FILE',
+                        help="file JSON dei risultati (default: bench_pipeline.json)")
+    parser.add_argument('--keep', action='store_true',
+                        help="non eliminare librerie e fixture generati")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Funzione principale"""
+    args = parse_args(argv)
+    if shutil.which('ffmpeg') is None:
+        print("ERRORE: ffmpeg non trovato nel PATH", file=sys.stderr)
+        return 2
+
+    work_root = Path(tempfile.mkdtemp(prefix='bench_pipeline_'))
+    fixtures = work_root / 'fixtures'
+    print(f"🎞️ Generazione fixture ({args.duration}s)...", file=sys.stderr, flush=True)
+    make_fixtures(fixtures, args.duration)
+
+    # Configurazione del finto yt-dlp (ereditata dai subprocess)
+    os.environ.update({
+        'BENCH_FIXTURES': str(fixtures),
+        'BENCH_RATE': str(args.rate or 0),
+        'BENCH_SIZE': str(args.size or 0),
+        'BENCH_DURATION': str(args.duration),
+        'BENCH_EXTRACT_DELAY': str(args.extract_delay)
+    })
+
+    report = {
+        'environment': environment(),
+        'settings': {
+            'jobs': args.jobs,
+            'rate': args.rate,
+            'size': args.size,
+            'duration': args.duration,
+            'extract_delay': args.extract_delay,
+            'failures': args.failures,
+            'screenshots': not args.no_screenshots,
+            'screenshot_interval': DownloadPipeline.SUMMARY_INTERVAL
+        },
+        'results': []
+    }
+
+    try:
+        for concurrency in args.concurrency:
+            print(f"⏱️ {args.jobs} job, {concurrency} paralleli, "
+                  f"{format_bytes(args.size)} a {format_rate(args.rate)}...",
+                  file=sys.stderr, flush=True)
+            report['results'].append(run_level(concurrency, args, work_root))
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+    finally:
+        if args.keep:
+            print(f"📁 File generati in {work_root}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    print_report(report)
+    print(f"\n💾 Risultati salvati in {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
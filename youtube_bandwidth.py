@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Limite di banda globale condiviso tra i download in parallelo.
+
+Ogni processo yt-dlp scarica attraverso un piccolo proxy HTTP locale
+(--proxy) dedicato al suo job: i byte ricevuti passano da un token bucket
+per job, e il BandwidthGovernor divide il limite complessivo in parti
+uguali tra i job che stanno effettivamente scaricando. A differenza di
+--limit-rate (fisso per processo), il limite cambia anche a download in
+corso: quando parte o finisce un job e al cambio di fascia oraria.
+
+Se è configurato un proxy di sistema (HTTP_PROXY/HTTPS_PROXY, NO_PROXY o
+le impostazioni del sistema operativo) il proxy locale si collega
+attraverso quello, come avrebbe fatto yt-dlp senza --proxy.
+"""
+
+import base64
+import re
+import socket
+import socketserver
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from urllib.parse import unquote, urlsplit
+
+from youtube_progress import format_bytes
+
+
+# Dimensione dei blocchi letti e misurati dal proxy
+CHUNK_SIZE = 16 * 1024
+
+# Valori che indicano "nessun limite"
+UNLIMITED = ('', '0', 'none', 'off', 'illimitato')
+
+RATE_RE = re.compile(r'^(\d+(?:\.\d+)?)\s*([kmg]?)(?:i?b)?(?:/s)?$', re.IGNORECASE)
+WINDOW_RE = re.compile(r'^(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(.*)$')
+
+
+def system_proxies():
+    """Proxy di sistema per http e https (urlsplit), come li vedrebbe yt-dlp"""
+    proxies = {}
+    for scheme, url in urllib.request.getproxies().items():
+        if scheme in ('http', 'https') and url:
+            proxies[scheme] = urlsplit(url if '://' in url else f"http://{url}")
+    return proxies
+
+
+def chainable(proxies):
+    """True se il proxy locale può inoltrare attraverso questi proxy (solo HTTP)"""
+    return all(proxy.scheme == 'http' and proxy.hostname for proxy in proxies.values())
+
+
+def parse_rate(value):
+    """Converte un limite come "500K", "2M" o "1.5MiB" in byte/s (None = illimitato)"""
+    value = str(value).strip()
+    if value.lower() in UNLIMITED:
+        return None
+
+    match = RATE_RE.match(value)
+    if not match:
+        raise ValueError(f"limite di banda non valido: {value!r} (es. 500K, 2M)")
+
+    number, unit = match.groups()
+    rate = float(number) * 1024 ** ' kmg'.index(unit.lower() or ' ')
+    return int(rate) or None
+
+
+def parse_schedule(value):
+    """Converte "08:00-19:00=2M, 22:00-06:00=0" in fasce (inizio, fine, byte/s).
+
+    Inizio e fine sono minuti dalla mezzanotte; una fascia con fine minore
+    dell'inizio prosegue oltre la mezzanotte.
+    """
+    windows = []
+    for part in str(value).split(','):
+        part = part.strip()
+        if not part:
+            continue
+
+        match = WINDOW_RE.match(part)
+        if not match:
+            raise ValueError(f"fascia oraria non valida: {part!r} (es. 08:00-19:00=2M)")
+
+        start_h, start_m, end_h, end_m, rate = match.groups()
+        start = int(start_h) * 60 + int(start_m)
+        end = int(end_h) * 60 + int(end_m)
+        if start >= 24 * 60 or end > 24 * 60:
+            raise ValueError(f"orario non valido: {part!r}")
+        windows.append((start, end, parse_rate(rate)))
+    return windows
+
+
+def format_rate(rate):
+    """Limite leggibile per log e interfaccia"""
+    return f"{format_bytes(rate)}/s" if rate else "illimitato"
+
+
+class TokenBucket:
+    """Token bucket di un job: consume() attende finché i byte non rientrano nel limite"""
+
+    # Byte accumulabili a download fermo, in secondi di limite
+    BURST_SECONDS = 0.5
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        # Ultimo utilizzo: i job fermi (estrazione, merge) non tolgono banda agli altri
+        self.last_used = self.updated
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def _refill(self, now):
+        if self.rate:
+            burst = max(self.rate * self.BURST_SECONDS, CHUNK_SIZE)
+            self.tokens = min(burst, self.tokens + (now - self.updated) * self.rate)
+        else:
+            self.tokens = 0.0
+        self.updated = now
+
+    def consume(self, amount):
+        """Preleva `amount` byte, attendendo il tempo necessario"""
+        with self._lock:
+            now = time.monotonic()
+            self.last_used = now
+            self._refill(now)
+            if not self.rate:
+                return
+            # Il debito viene pagato da chi lo crea: più connessioni dello
+            # stesso job si dividono il limite senza superarlo
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+
+
+class BandwidthGovernor:
+    """Limite di banda di tutto il processo, diviso tra i job in download.
+
+    `rate` è il limite di base (None = illimitato); `schedule` è un elenco di
+    fasce orarie (vedi parse_schedule) che lo sostituiscono nel loro orario.
+    Il governor è attivo (enabled) se è configurato un limite o una fascia:
+    solo allora i job scaricano attraverso il proxy. Con `adjustable` (limite
+    modificabile a download in corso, come nella GUI) è sempre attivo: i job
+    avviati senza limite passano comunque dal proxy, con quota illimitata, e
+    vengono rallentati appena un limite entra in vigore.
+
+    Un proxy di sistema SOCKS o HTTPS non si può concatenare al proxy
+    locale: in quel caso il governor non è attivo e il limite non viene
+    applicato (vedi chainable).
+    """
+
+    # Secondi senza traffico dopo i quali un job non conta più nella divisione
+    ACTIVE_WINDOW = 2.0
+    # Intervallo di ricalcolo delle quote (fasce orarie e job fermi)
+    REBALANCE_INTERVAL = 1.0
+
+    def __init__(self, rate=None, schedule=None, adjustable=False):
+        self.rate = rate
+        self.schedule = list(schedule or [])
+        self.adjustable = adjustable
+        self._buckets = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def limited(self):
+        """True se è configurato un limite o una fascia oraria"""
+        return bool(self.rate or self.schedule)
+
+    @property
+    def enabled(self):
+        return (self.limited or self.adjustable) and chainable(system_proxies())
+
+    def configure(self, rate=None, schedule=None):
+        """Cambia limite e fasce orarie; vale subito anche per i job in corso"""
+        self.rate = rate
+        self.schedule = list(schedule or [])
+        self.rebalance()
+
+    def current_rate(self, now=None):
+        """Limite complessivo in vigore all'ora indicata (default: adesso)"""
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start, end, rate in self.schedule:
+            if start <= end:
+                inside = start <= minute < end
+            else:
+                inside = minute >= start or minute < end
+            if inside:
+                return rate
+        return self.rate
+
+    def open(self):
+        """Avvia il proxy locale di un nuovo job (da chiudere con close())"""
+        bucket = TokenBucket()
+        with self._lock:
+            self._buckets.add(bucket)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._rebalance_loop, daemon=True)
+                self._thread.start()
+        self.rebalance()
+        return ThrottledProxy(self, bucket)
+
+    def release(self, bucket):
+        with self._lock:
+            self._buckets.discard(bucket)
+        self.rebalance()
+
+    def rebalance(self):
+        """Divide il limite in vigore tra i job che stanno scaricando"""
+        rate = self.current_rate()
+        with self._lock:
+            buckets = list(self._buckets)
+        if not buckets:
+            return
+
+        if not rate:
+            for bucket in buckets:
+                bucket.set_rate(None)
+            return
+
+        now = time.monotonic()
+        active = [b for b in buckets if now - b.last_used < self.ACTIVE_WINDOW] or buckets
+        share = rate / len(active)
+        # Un job fermo che riparte ha già la quota che avrà al prossimo ricalcolo
+        idle_share = rate / (len(active) + 1)
+        for bucket in buckets:
+            bucket.set_rate(share if bucket in active else idle_share)
+
+    def _rebalance_loop(self):
+        while True:
+            time.sleep(self.REBALANCE_INTERVAL)
+            self.rebalance()
+
+    def describe(self):
+        """Configurazione leggibile per il log"""
+        text = format_rate(self.rate)
+        for start, end, rate in self.schedule:
+            text += (f", {start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}"
+                     f" {format_rate(rate)}")
+        return text
+
+
+class ThrottledProxy:
+    """Proxy HTTP locale di un job (CONNECT per HTTPS, inoltro per HTTP)"""
+
+    def __init__(self, governor, bucket):
+        self.governor = governor
+        self.bucket = bucket
+        self.server = _ProxyServer(('127.0.0.1', 0), _ProxyHandler)
+        self.server.bucket = bucket
+        # Proxy di sistema letti all'avvio del job, usati per ogni connessione
+        self.server.proxies = system_proxies()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.governor.release(self.bucket)
+
+
+class _ProxyServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _ProxyHandler(socketserver.BaseRequestHandler):
+
+    # Intestazioni per il proxy, da non inoltrare al server
+    HOP_HEADERS = ('proxy-connection', 'proxy-authorization', 'connection', 'keep-alive')
+
+    def handle(self):
+        client = self.request
+        head, rest = self.read_head(client)
+        if head is None:
+            return
+
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split()
+        except ValueError:
+            return
+
+        try:
+            if method == 'CONNECT':
+                host, _, port = target.rpartition(':')
+                host = host.strip('[]')
+                proxy = self.system_proxy('https', host)
+                if proxy is None:
+                    upstream = socket.create_connection((host, int(port or 443)), 30)
+                else:
+                    upstream = socket.create_connection((proxy.hostname, proxy.port or 80), 30)
+                    request = [f"CONNECT {target} HTTP/1.1", f"Host: {target}"]
+                    request += self.proxy_authorization(proxy)
+                    upstream.sendall(('\r\n'.join(request) + '\r\n\r\n').encode('latin-1'))
+                    reply, extra = self.read_head(upstream)
+                    if reply is None:
+                        raise OSError("risposta non valida dal proxy di sistema")
+                    status = reply.split(b' ', 2)
+                    if len(status) < 2 or not status[1].startswith(b'2'):
+                        # Errore del proxy di sistema (es. 407): lo riceve yt-dlp
+                        client.sendall(reply + b'\r\n\r\n' + extra)
+                        upstream.close()
+                        return
+                client.sendall(b'HTTP/1.1 200 Connection established\r\n\r\n')
+                # Byte del server già arrivati insieme alla risposta del proxy
+                if proxy is not None and extra:
+                    client.sendall(extra)
+            else:
+                parts = urlsplit(target)
+                proxy = self.system_proxy('http', parts.hostname)
+                if proxy is None:
+                    upstream = socket.create_connection((parts.hostname, parts.port or 80), 30)
+                    path = parts.path or '/'
+                    if parts.query:
+                        path += '?' + parts.query
+                else:
+                    # Il proxy di sistema vuole l'URL completo
+                    upstream = socket.create_connection((proxy.hostname, proxy.port or 80), 30)
+                    path = target
+                # Una richiesta per connessione: il server chiude a fine risposta
+                request = [f"{method} {path} {version}"]
+                request += [line for line in lines[1:]
+                            if line and line.split(':', 1)[0].strip().lower() not in self.HOP_HEADERS]
+                if proxy is not None:
+                    request += self.proxy_authorization(proxy)
+                request.append('Connection: close')
+                upstream.sendall(('\r\n'.join(request) + '\r\n\r\n').encode('latin-1'))
+        except (OSError, ValueError):
+            client.sendall(b'HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n')
+            return
+
+        upstream.settimeout(None)
+        if rest:
+            upstream.sendall(rest)
+
+        # Richieste verso il server senza limite, risposte dal token bucket del job
+        threading.Thread(target=self.pipe, args=(client, upstream), daemon=True).start()
+        self.pipe(upstream, client, self.server.bucket)
+        upstream.close()
+
+    def system_proxy(self, scheme, host):
+        """Proxy di sistema da usare per `host`, None per la connessione diretta"""
+        proxy = self.server.proxies.get(scheme)
+        if proxy is None or urllib.request.proxy_bypass(host):
+            return None
+        return proxy
+
+    @staticmethod
+    def proxy_authorization(proxy):
+        """Intestazione Proxy-Authorization per le credenziali nell'URL del proxy"""
+        if not proxy.username:
+            return []
+        credentials = f"{unquote(proxy.username)}:{unquote(proxy.password or '')}"
+        return [f"Proxy-Authorization: Basic {base64.b64encode(credentials.encode()).decode()}"]
+
+    @staticmethod
+    def read_head(sock):
+        """Legge la richiesta fino alla riga vuota; ritorna (intestazioni, byte successivi)"""
+        data = b''
+        while b'\r\n\r\n' not in data:
+            chunk = sock.recv(CHUNK_SIZE)
+            if not chunk or len(data) > 65536:
+                return None, b''
+            data += chunk
+        head, _, rest = data.partition(b'\r\n\r\n')
+        return head, rest
+
+    @staticmethod
+    def pipe(source, target, bucket=None):
+        try:
+            while True:
+                data = source.recv(CHUNK_SIZE)
+                if not data:
+                    break
+                if bucket is not None:
+                    bucket.consume(len(data))
+                target.sendall(data)
+        except OSError:
+            pass
+        finally:
+            try:
+                target.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+YouTube Downloader Premium - riga di comando
+Download, Knowledge Base e Visual Summary senza interfaccia grafica
+
+Legge gli URL dagli argomenti, da un file o da stdin (uno per riga) e li
+scarica in parallelo; per ogni job terminato stampa una riga JSON su stdout,
+mentre il log va su stderr. Non importa tkinter né PIL.
+
+I job restano nel database finché non terminano: dopo un'interruzione
+(Ctrl-C) si riprendono con --resume, e yt-dlp continua dai file .part.
+
+Esempi:
+    python youtube_cli.py https://youtu.be/VIDEO_ID
+    python youtube_cli.py -i urls.txt -j 8 --format audio
+    cat urls.txt | python youtube_cli.py -i - --no-summary
+    python youtube_cli.py --resume
+    python youtube_cli.py -i urls.txt -j 8 --limit-rate 0 --rate-schedule "08:00-19:00=2M"
+"""
+
+import argparse
+import json
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from youtube_bandwidth import BandwidthGovernor, parse_rate, parse_schedule
+from youtube_core import (DEFAULT_DB_PATH, DEFAULT_LIBRARY_DIR, DatabaseManager,
+                          DownloadArchive, DownloadJob, DownloadPipeline, DownloadQueue,
+                          JobStore)
+from youtube_profiling import KINDS, PROFILE_ENV, Profiler, parse_kinds
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Scarica video da YouTube e li salva nella Knowledge Base")
+    parser.add_argument('urls', nargs='*', metavar='URL',
+                        help="URL da scaricare")
+    parser.add_argument('-i', '--input', metavar='FILE',
+                        help="file con un URL per riga ('-' per stdin)")
+    parser.add_argument('-j', '--jobs', type=int, default=4, metavar='N',
+                        help="download paralleli (default: 4)")
+    parser.add_argument('-o', '--output', default=str(DEFAULT_LIBRARY_DIR), metavar='DIR',
+                        help=f"cartella di download (default: {DEFAULT_LIBRARY_DIR})")
+    parser.add_argument('--db', default=str(DEFAULT_DB_PATH), metavar='PATH',
+                        help=f"database della libreria (default: {DEFAULT_DB_PATH})")
+    parser.add_argument('--format', choices=['video', 'audio', 'subtitles'], default='video',
+                        help="cosa scaricare (default: video)")
+    parser.add_argument('--quality', choices=['best', '1080', '720', '480'], default='best',
+                        help="qualità massima del video (default: best)")
+    parser.add_argument('--no-knowledge-base', dest='knowledge_base', action='store_false',
+                        help="non salvare metadati e trascrizioni nel database")
+    parser.add_argument('--playlist', action='store_true',
+                        help="scarica l'intera playlist (elementi in parallelo)")
+    parser.add_argument('--no-summary', dest='auto_summary', action='store_false',
+                        help="non generare il Visual Summary")
+    parser.add_argument('--redownload', dest='skip_known', action='store_false',
+                        help="scarica anche i video già in libreria")
+    parser.add_argument('--archive', metavar='FILE',
+                        help="archivio download compatibile con yt-dlp "
+                             "(default: download_archive.txt accanto al database)")
+    parser.add_argument('--limit-rate', type=parse_rate, metavar='RATE',
+                        help="banda massima complessiva, divisa tra i download in corso "
+                             "(es. 500K, 2M; default: illimitata)")
+    parser.add_argument('--rate-schedule', type=parse_schedule, metavar='FASCE',
+                        help="limiti per fascia oraria al posto di --limit-rate "
+                             "(es. \"08:00-19:00=2M, 19:00-08:00=0\")")
+    parser.add_argument('--resume', action='store_true',
+                        help="riprende i job interrotti o rimasti in coda nelle sessioni precedenti")
+    parser.add_argument('--profile', type=parse_kinds, nargs='?', const=set(KINDS), metavar='FASI',
+                        help="cProfile e tracemalloc per ogni job, salvati in profiles/ accanto "
+                             f"al database ({', '.join(KINDS)}; default: tutte; "
+                             f"anche con {PROFILE_ENV})")
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help="nessun log su stderr, solo i risultati JSON")
+    return parser.parse_args(argv)
+
+
+def read_urls(args):
+    """Genera gli URL man mano che vengono letti (righe vuote e # ignorate)"""
+    yield from args.urls
+
+    if not args.input:
+        return
+
+    stream = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8')
+    try:
+        for line in stream:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def job_result(job):
+    """Risultato del job come dizionario serializzabile in JSON"""
+    return {
+        'job': job.id,
+        'url': job.url,
+        'ok': job.state == DownloadJob.DONE,
+        'skipped': job.skipped,
+        'state': job.state,
+        'result': job.result,
+        'playlist': job.parent.id if job.parent is not None else None,
+        'video_ids': job.video_ids,
+        'downloaded_bytes': job.tracker.downloaded_bytes,
+        'average_speed': job.tracker.average_speed,
+        'stages': job.timer.totals() if job.timer is not None else {},
+    }
+
+
+def main(argv=None):
+    """Funzione principale"""
+    args = parse_args(argv)
+    if not args.urls and not args.input and not args.resume:
+        print("ERRORE: nessun URL (passa gli URL come argomenti, usa -i FILE / -i - o --resume)",
+              file=sys.stderr)
+        return 2
+
+    output_lock = threading.Lock()
+
+    def log(message, tag='info'):
+        if args.quiet:
+            return
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        with output_lock:
+            print(f"[{timestamp}] {message}", file=sys.stderr, flush=True)
+
+    db_path = Path(args.db)
+    profiles_dir = db_path.parent / "profiles"
+    try:
+        if args.profile:
+            profiler = Profiler(profiles_dir, args.profile, log)
+        else:
+            profiler = Profiler.from_env(profiles_dir, log)
+    except ValueError as e:
+        print(f"ERRORE: {PROFILE_ENV}: {e}", file=sys.stderr)
+        return 2
+    if profiler is not None:
+        log(f"🔬 Profilazione attiva ({', '.join(sorted(profiler.kinds))}): {profiles_dir}", 'info')
+
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    db = DatabaseManager(str(db_path))
+
+    archive = DownloadArchive(db, args.archive or db_path.parent / "download_archive.txt")
+    jobs = []
+
+    def submit(job):
+        jobs.append(job)
+        queue.submit(job)
+
+    def on_done(job):
+        # Una riga JSON per job, appena termina
+        with output_lock:
+            print(json.dumps(job_result(job), ensure_ascii=False), flush=True)
+
+    store = JobStore(db)
+    governor = BandwidthGovernor(args.limit_rate, args.rate_schedule)
+    pipeline = DownloadPipeline(db, log=log, archive=archive, on_done=on_done, submit=submit,
+                                store=store, governor=governor, profiler=profiler)
+    queue = DownloadQueue(pipeline.download_video, args.jobs)
+
+    options = {
+        'output_path': args.output,
+        'format': args.format,
+        'quality': args.quality,
+        'knowledge_base': args.knowledge_base,
+        'playlist': args.playlist,
+        'auto_summary': args.auto_summary,
+        'skip_known': args.skip_known
+    }
+
+    store.start()
+    try:
+        if args.resume:
+            resumed = pipeline.resume(register=jobs.append)
+            log(f"▶️ Job ripresi dalle sessioni precedenti: {len(resumed)}", 'info')
+
+        # I job partono mentre gli URL vengono ancora letti
+        for url in read_urls(args):
+            job = pipeline.create_job(url, dict(options))
+            submit(job)
+            log(f"[#{job.id}] ➕ Aggiunto alla coda: {url}", 'info')
+
+        queue.join()
+    except KeyboardInterrupt:
+        log("⛔ Interrotto: i download non terminati riprendono con --resume", 'error')
+        pipeline.shutdown()
+        queue.join(timeout=10)
+        return 130
+    finally:
+        store.stop()
+        db.close()
+
+    # Le playlist contano attraverso i loro elementi
+    leaves = [job for job in jobs if not job.children]
+    failed = sum(1 for job in leaves if job.state != DownloadJob.DONE)
+    log(f"✅ Completati: {len(leaves) - failed} ok, {failed} errori", 'info')
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
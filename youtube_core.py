@@ -0,0 +1,2237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nucleo di YouTube Downloader Premium senza interfaccia grafica.
+
+Database, coda di download, esecuzione di yt-dlp, ingest nella Knowledge Base
+ed estrazione degli screenshot. Non importa tkinter né PIL: lo usano sia la
+GUI (youtube_downloader_v2.py) sia la riga di comando (youtube_cli.py).
+"""
+
+import os
+import sys
+import socket
+import threading
+import sqlite3
+from pathlib import Path
+import json
+from datetime import datetime
+import re
+import subprocess
+import tempfile
+import heapq
+import itertools
+import math
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from youtube_progress import (PROGRESS_TEMPLATE, ProgressTracker, format_bytes,
+                              parse_progress_line)
+from youtube_subtitles import iter_cues
+
+
+# Cartella predefinita di download e della libreria
+DEFAULT_LIBRARY_DIR = Path.home() / "Downloads" / "YouTube"
+DEFAULT_DB_PATH = DEFAULT_LIBRARY_DIR / "youtube_library.db"
+
+# Id del video negli URL di YouTube (watch, youtu.be, shorts, embed, live)
+YOUTUBE_ID_RE = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)'
+    r'([0-9A-Za-z_-]{11})(?![0-9A-Za-z_-])'
+)
+YOUTUBE_VIDEO_ID_RE = re.compile(r'[0-9A-Za-z_-]{11}')
+
+# yt-dlp gira in un proprio gruppo di processi: Ctrl-C arriva solo a noi, che
+# fermiamo i download in modo ordinato (vedi DownloadPipeline.shutdown)
+if sys.platform == 'win32':
+    SUBPROCESS_OPTIONS = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    SUBPROCESS_OPTIONS = {'start_new_session': True}
+
+
+def percentile(ordered, pct):
+    """Percentile (interpolazione lineare) di una lista già ordinata"""
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * pct / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+class DatabaseManager:
+    """Gestisce il database SQLite per metadati e trascrizioni.
+
+    Ogni thread (Tk, worker di download, estrazione screenshot) usa una
+    propria connessione persistente; il database è in modalità WAL, quindi
+    le letture non bloccano la scrittura in corso.
+    """
+
+    # Attesa massima (ms) su un lock prima di "database is locked"
+    BUSY_TIMEOUT = 10000
+    # Cache pagine per connessione (valore negativo = KiB)
+    CACHE_SIZE = -16000
+
+    def __init__(self, db_path, initialize=True):
+        """Con initialize=False lo schema va creato chiamando init_database()
+        (anche da un altro thread): fino ad allora le query restano in attesa.
+        """
+        self.db_path = db_path
+        self.fts_enabled = False
+        self._local = threading.local()
+        self._ready = threading.Event()
+        if initialize:
+            self.init_database()
+
+    def wait_ready(self, timeout=None):
+        """Attende che lo schema sia inizializzato; ritorna False allo scadere"""
+        return self._ready.wait(timeout)
+
+    def get_connection(self):
+        """Ritorna la connessione del thread corrente, creandola se serve"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Nessuna query prima che init_database() abbia creato le tabelle
+            if not getattr(self._local, 'initializing', False):
+                self._ready.wait()
+            conn = sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT / 1000)
+            conn.execute(f'PRAGMA busy_timeout = {self.BUSY_TIMEOUT}')
+            # In WAL, NORMAL è sicuro contro la corruzione e risparmia un fsync per commit
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute(f'PRAGMA cache_size = {self.CACHE_SIZE}')
+            conn.execute('PRAGMA temp_store = MEMORY')
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Chiude la connessione del thread corrente.
+
+        Le connessioni dei thread worker vengono chiuse automaticamente quando
+        il thread termina.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def init_database(self):
+        """Inizializza il database con le tabelle necessarie"""
+        self._local.initializing = True
+        try:
+            self._create_schema()
+        finally:
+            self._local.initializing = False
+            self._ready.set()
+
+    def _create_schema(self):
+        conn = self.get_connection()
+
+        # WAL è persistente nel file: basta impostarlo una volta
+        mode = conn.execute('PRAGMA journal_mode = WAL').fetchone()[0]
+        if mode.lower() != 'wal':
+            print(f"Attenzione: journal_mode WAL non disponibile ({mode})")
+
+        cursor = conn.cursor()
+
+        # Tabella video
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS videos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                video_id TEXT UNIQUE NOT NULL,
+                title TEXT NOT NULL,
+                channel TEXT,
+                duration INTEGER,
+                upload_date TEXT,
+                description TEXT,
+                thumbnail_path TEXT,
+                file_path TEXT,
+                download_date TEXT,
+                file_size INTEGER,
+                format TEXT,
+                extractor TEXT
+            )
+        ''')
+
+        # Colonne aggiunte dopo la prima versione dello schema
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(videos)')}
+        if 'extractor' not in columns:
+            cursor.execute('ALTER TABLE videos ADD COLUMN extractor TEXT')
+
+        # Tabella trascrizioni
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS transcripts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                video_id TEXT NOT NULL,
+                language TEXT,
+                transcript_text TEXT,
+                FOREIGN KEY (video_id) REFERENCES videos(video_id)
+            )
+        ''')
+
+        # Segmenti (cue) delle trascrizioni con i tempi nel video
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS transcript_segments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                video_id TEXT NOT NULL,
+                language TEXT,
+                start_time REAL,
+                end_time REAL,
+                text TEXT,
+                FOREIGN KEY (video_id) REFERENCES videos(video_id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_segments_video
+            ON transcript_segments(video_id, language, start_time)
+        ''')
+
+        # Tabella screenshot
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS screenshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                video_id TEXT NOT NULL,
+                timestamp REAL,
+                screenshot_path TEXT,
+                FOREIGN KEY (video_id) REFERENCES videos(video_id)
+            )
+        ''')
+
+        # Coda di download persistente: job da riprendere dopo un riavvio
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                options TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER DEFAULT 0,
+                parent_id INTEGER,
+                enumerated INTEGER DEFAULT 0,
+                partial_files TEXT,
+                result TEXT,
+                owner TEXT,
+                lease_until REAL,
+                created_at TEXT,
+                updated_at TEXT,
+                FOREIGN KEY (parent_id) REFERENCES jobs(id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state, lease_until)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_jobs_parent ON jobs(parent_id)
+        ''')
+
+        # Durata delle fasi di ogni job (vedi StageTimer)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS job_metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id INTEGER,
+                video_id TEXT,
+                stage TEXT NOT NULL,
+                started_at TEXT,
+                duration REAL NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_job_metrics_job ON job_metrics(job_id)
+        ''')
+
+        # Indice per la paginazione keyset della Libreria
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_videos_download_date
+            ON videos(download_date DESC, video_id DESC)
+        ''')
+
+        # Il vecchio indice B-tree sul testo non è utilizzabile da LIKE '%...%'
+        cursor.execute('DROP INDEX IF EXISTS idx_transcript_search')
+
+        # Indice full-text FTS5 sincronizzato con la tabella transcripts
+        try:
+            self.init_fts(cursor)
+            self.fts_enabled = True
+        except sqlite3.OperationalError as e:
+            print(f"FTS5 non disponibile, ricerca con LIKE: {e}")
+
+        conn.commit()
+
+    def init_fts(self, cursor):
+        """Crea gli indici FTS5 di trascrizioni e segmenti"""
+        self.create_fts_index(cursor, 'transcripts', 'transcript_text')
+        self.create_fts_index(cursor, 'transcript_segments', 'text')
+
+    def create_fts_index(self, cursor, table, column):
+        """Crea l'indice FTS5 `<table>_fts` sulla colonna e i trigger di sincronizzazione"""
+        fts = f'{table}_fts'
+        cursor.execute("""
+            SELECT 1 FROM sqlite_master
+            WHERE type = 'table' AND name = ?
+        """, (fts,))
+        exists = cursor.fetchone() is not None
+
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {column},
+                content='{table}',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {fts}_insert
+            AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts}(rowid, {column})
+                VALUES (new.id, new.{column});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {fts}_delete
+            AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {column})
+                VALUES ('delete', old.id, old.{column});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {fts}_update
+            AFTER UPDATE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {column})
+                VALUES ('delete', old.id, old.{column});
+                INSERT INTO {fts}(rowid, {column})
+                VALUES (new.id, new.{column});
+            END
+        ''')
+
+        # Database esistente: indicizza le righe già presenti
+        if not exists:
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    @staticmethod
+    def build_fts_query(query):
+        """Converte la ricerca dell'utente in una query FTS5 valida.
+
+        Supporta frasi esatte tra virgolette ("frase esatta") e prefissi
+        (parola*); tutti gli altri caratteri speciali vengono neutralizzati.
+        """
+        terms = []
+        for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+            if phrase.strip():
+                terms.append(f'"{phrase.strip()}"')
+            elif word:
+                prefix = word.endswith('*')
+                word = word.replace('"', '').rstrip('*')
+                if word:
+                    terms.append(f'"{word}"' + ('*' if prefix else ''))
+        return ' '.join(terms)
+
+    def add_video(self, video_data):
+        """Aggiunge un video al database"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                INSERT OR REPLACE INTO videos
+                (video_id, title, channel, duration, upload_date, description,
+                 thumbnail_path, file_path, download_date, file_size, format, extractor)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                video_data.get('id'),
+                video_data.get('title'),
+                video_data.get('uploader'),
+                video_data.get('duration'),
+                video_data.get('upload_date'),
+                video_data.get('description'),
+                video_data.get('thumbnail_path'),
+                video_data.get('file_path'),
+                datetime.now().isoformat(),
+                video_data.get('file_size'),
+                video_data.get('format'),
+                video_data.get('extractor')
+            ))
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Errore inserimento video: {e}")
+            return False
+
+    def add_transcript(self, video_id, language, text):
+        """Aggiunge una trascrizione"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                INSERT INTO transcripts (video_id, language, transcript_text)
+                VALUES (?, ?, ?)
+            ''', (video_id, language, text))
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Errore inserimento trascrizione: {e}")
+            return False
+
+    def add_screenshot(self, video_id, timestamp, path):
+        """Aggiunge uno screenshot"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                INSERT INTO screenshots (video_id, timestamp, screenshot_path)
+                VALUES (?, ?, ?)
+            ''', (video_id, timestamp, path))
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Errore inserimento screenshot: {e}")
+            return False
+
+    def ingest_videos(self, records):
+        """Salva più video con trascrizioni e screenshot in una sola transazione.
+
+        Ogni record è un dict con le chiavi 'video' (come per add_video),
+        'transcripts' (lista di (lingua, testo)) e opzionalmente 'segments'
+        (lista di (lingua, inizio, fine, testo)) e 'screenshots' (lista di
+        (timestamp, percorso)). Trascrizioni e segmenti dei video già
+        presenti vengono sostituiti.
+        """
+        if not records:
+            return True
+
+        download_date = datetime.now().isoformat()
+        videos = []
+        transcripts = []
+        segments = []
+        screenshots = []
+        for record in records:
+            video_data = record['video']
+            video_id = video_data.get('id')
+            videos.append((
+                video_id,
+                video_data.get('title'),
+                video_data.get('uploader'),
+                video_data.get('duration'),
+                video_data.get('upload_date'),
+                video_data.get('description'),
+                video_data.get('thumbnail_path'),
+                video_data.get('file_path'),
+                download_date,
+                video_data.get('file_size'),
+                video_data.get('format'),
+                video_data.get('extractor')
+            ))
+            transcripts.extend((video_id, language, text)
+                               for language, text in record.get('transcripts', []))
+            segments.extend((video_id, language, start, end, text)
+                            for language, start, end, text in record.get('segments', []))
+            screenshots.extend((video_id, timestamp, path)
+                               for timestamp, path in record.get('screenshots', []))
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.executemany('''
+                INSERT OR REPLACE INTO videos
+                (video_id, title, channel, duration, upload_date, description,
+                 thumbnail_path, file_path, download_date, file_size, format, extractor)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', videos)
+            cursor.executemany('''
+                DELETE FROM transcripts WHERE video_id = ?
+            ''', [(video[0],) for video in videos])
+            cursor.executemany('''
+                INSERT INTO transcripts (video_id, language, transcript_text)
+                VALUES (?, ?, ?)
+            ''', transcripts)
+            cursor.executemany('''
+                DELETE FROM transcript_segments WHERE video_id = ?
+            ''', [(video[0],) for video in videos])
+            cursor.executemany('''
+                INSERT INTO transcript_segments
+                (video_id, language, start_time, end_time, text)
+                VALUES (?, ?, ?, ?, ?)
+            ''', segments)
+            cursor.executemany('''
+                INSERT INTO screenshots (video_id, timestamp, screenshot_path)
+                VALUES (?, ?, ?)
+            ''', screenshots)
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Errore inserimento multiplo: {e}")
+            return False
+
+    def add_screenshots(self, video_id, screenshots):
+        """Aggiunge una lista di (timestamp, percorso) in una sola transazione"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.executemany('''
+                INSERT INTO screenshots (video_id, timestamp, screenshot_path)
+                VALUES (?, ?, ?)
+            ''', [(video_id, timestamp, path) for timestamp, path in screenshots])
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Errore inserimento screenshot: {e}")
+            return False
+
+    def search_transcripts(self, query, limit=100):
+        """Ricerca nelle trascrizioni.
+
+        Con FTS5 i risultati sono ordinati per rilevanza (BM25) e il sesto
+        campo contiene già lo snippet con il testo trovato; senza FTS5 contiene
+        la trascrizione completa.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            if self.fts_enabled:
+                fts_query = self.build_fts_query(query)
+                if not fts_query:
+                    return []
+
+                cursor.execute('''
+                    SELECT v.video_id, v.title, v.channel, v.thumbnail_path,
+                           v.file_path,
+                           snippet(transcripts_fts, 0, '«', '»', '', 24),
+                           t.language
+                    FROM transcripts_fts
+                    JOIN transcripts t ON t.id = transcripts_fts.rowid
+                    JOIN videos v ON v.video_id = t.video_id
+                    WHERE transcripts_fts MATCH ?
+                    ORDER BY bm25(transcripts_fts)
+                    LIMIT ?
+                ''', (fts_query, limit))
+            else:
+                cursor.execute('''
+                    SELECT DISTINCT v.video_id, v.title, v.channel, v.thumbnail_path,
+                           v.file_path, t.transcript_text, t.language
+                    FROM videos v
+                    JOIN transcripts t ON v.video_id = t.video_id
+                    WHERE t.transcript_text LIKE ?
+                    ORDER BY v.download_date DESC
+                    LIMIT ?
+                ''', (f'%{query}%', limit))
+
+            results = cursor.fetchall()
+            return results
+        except Exception as e:
+            print(f"Errore ricerca: {e}")
+            return []
+
+    def search_segments(self, query, limit=200):
+        """Ricerca nei segmenti delle trascrizioni.
+
+        Ogni risultato è un cue: (video_id, titolo, canale, thumbnail, file,
+        lingua, inizio, fine, testo). Con FTS5 sono ordinati per rilevanza e
+        il testo ha le parole trovate evidenziate tra «».
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            if self.fts_enabled:
+                fts_query = self.build_fts_query(query)
+                if not fts_query:
+                    return []
+
+                cursor.execute('''
+                    SELECT v.video_id, v.title, v.channel, v.thumbnail_path,
+                           v.file_path, s.language, s.start_time, s.end_time,
+                           highlight(transcript_segments_fts, 0, '«', '»')
+                    FROM transcript_segments_fts
+                    JOIN transcript_segments s ON s.id = transcript_segments_fts.rowid
+                    JOIN videos v ON v.video_id = s.video_id
+                    WHERE transcript_segments_fts MATCH ?
+                    ORDER BY bm25(transcript_segments_fts)
+                    LIMIT ?
+                ''', (fts_query, limit))
+            else:
+                cursor.execute('''
+                    SELECT v.video_id, v.title, v.channel, v.thumbnail_path,
+                           v.file_path, s.language, s.start_time, s.end_time, s.text
+                    FROM transcript_segments s
+                    JOIN videos v ON v.video_id = s.video_id
+                    WHERE s.text LIKE ?
+                    ORDER BY v.download_date DESC, s.start_time
+                    LIMIT ?
+                ''', (f'%{query}%', limit))
+
+            return cursor.fetchall()
+        except Exception as e:
+            print(f"Errore ricerca segmenti: {e}")
+            return []
+
+    def add_job(self, url, options, parent_id, owner, lease_until):
+        """Registra un nuovo job in coda e ne ritorna l'id (None in caso di errore)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        now = datetime.now().isoformat()
+
+        try:
+            cursor.execute('''
+                INSERT INTO jobs
+                (url, options, state, parent_id, owner, lease_until, created_at, updated_at)
+                VALUES (?, ?, 'pending', ?, ?, ?, ?, ?)
+            ''', (url, json.dumps(options), parent_id, owner, lease_until, now, now))
+            conn.commit()
+            return cursor.lastrowid
+        except Exception as e:
+            conn.rollback()
+            print(f"Errore inserimento job: {e}")
+            return None
+
+    def save_job(self, job_id, state, attempts, result, partial_files, enumerated):
+        """Aggiorna stato, tentativi, risultato e file parziali di un job"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                UPDATE jobs
+                SET state = ?, attempts = ?, result = ?, partial_files = ?,
+                    enumerated = ?, updated_at = ?
+                WHERE id = ?
+            ''', (state, attempts, result, json.dumps(partial_files),
+                  int(enumerated), datetime.now().isoformat(), job_id))
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Errore aggiornamento job: {e}")
+            return False
+
+    def renew_job_leases(self, owner, lease_until):
+        """Prolunga il lease dei job non terminati della sessione"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                UPDATE jobs SET lease_until = ?
+                WHERE owner = ? AND state IN ('pending', 'running')
+            ''', (lease_until, owner))
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Errore rinnovo lease job: {e}")
+            return False
+
+    def claim_jobs(self, owner, lease_until, now, max_attempts):
+        """Prende in carico i job non terminati con lease scaduto.
+
+        I job interrotti già `max_attempts` volte vengono segnati come falliti.
+        Ritorna le righe (id, url, options, state, attempts, parent_id,
+        enumerated, partial_files) dei job presi, in ordine di creazione.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                UPDATE jobs
+                SET state = 'failed', result = '❌ Interrotto troppe volte', lease_until = NULL
+                WHERE state = 'running' AND attempts >= ?
+                  AND (lease_until IS NULL OR lease_until < ?)
+            ''', (max_attempts, now))
+            cursor.execute('''
+                UPDATE jobs SET owner = ?, lease_until = ?
+                WHERE state IN ('pending', 'running')
+                  AND (lease_until IS NULL OR lease_until < ?)
+            ''', (owner, lease_until, now))
+            conn.commit()
+
+            if cursor.rowcount == 0:
+                return []
+
+            cursor.execute('''
+                SELECT id, url, options, state, attempts, parent_id, enumerated, partial_files
+                FROM jobs
+                WHERE owner = ? AND lease_until = ? AND state IN ('pending', 'running')
+                ORDER BY id
+            ''', (owner, lease_until))
+            return cursor.fetchall()
+        except Exception as e:
+            conn.rollback()
+            print(f"Errore ripresa job: {e}")
+            return []
+
+    def get_child_jobs(self, parent_id):
+        """Righe (id, url, options, state, attempts, parent_id, enumerated,
+        partial_files, result) degli elementi di una playlist"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                SELECT id, url, options, state, attempts, parent_id, enumerated,
+                       partial_files, result
+                FROM jobs WHERE parent_id = ? ORDER BY id
+            ''', (parent_id,))
+            return cursor.fetchall()
+        except Exception as e:
+            print(f"Errore recupero elementi playlist: {e}")
+            return []
+
+    def delete_child_jobs(self, parent_id):
+        """Elimina gli elementi di una playlist da elencare di nuovo"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('DELETE FROM jobs WHERE parent_id = ?', (parent_id,))
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Errore eliminazione elementi playlist: {e}")
+            return False
+
+    def release_jobs(self, owner):
+        """Rilascia i job della sessione (chiusura): riprendibili subito"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                UPDATE jobs SET lease_until = NULL WHERE owner = ?
+            ''', (owner,))
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Errore rilascio job: {e}")
+            return False
+
+    def prune_jobs(self, before):
+        """Elimina i job terminati (e le metriche) prima della data indicata (ISO)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                DELETE FROM jobs
+                WHERE state IN ('done', 'failed') AND updated_at < ?
+                  AND (parent_id IS NULL OR parent_id NOT IN (
+                      SELECT id FROM jobs WHERE state IN ('pending', 'running')))
+            ''', (before,))
+            cursor.execute('DELETE FROM job_metrics WHERE started_at < ?', (before,))
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Errore pulizia job: {e}")
+            return False
+
+    def add_job_metrics(self, rows):
+        """Salva le fasi misurate: righe (job_id, video_id, fase, inizio, durata)"""
+        if not rows:
+            return True
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.executemany('''
+                INSERT INTO job_metrics (job_id, video_id, stage, started_at, duration)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Errore salvataggio metriche: {e}")
+            return False
+
+    def get_stage_durations(self, last_jobs=50):
+        """Durata totale di ogni fase per ciascuno degli ultimi `last_jobs` job.
+
+        Ritorna {fase: [secondi per job]}.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                SELECT stage, SUM(duration) FROM job_metrics
+                WHERE job_id IN (
+                    SELECT DISTINCT job_id FROM job_metrics
+                    WHERE job_id IS NOT NULL
+                    ORDER BY job_id DESC LIMIT ?
+                )
+                GROUP BY job_id, stage
+            ''', (last_jobs,))
+            durations = defaultdict(list)
+            for stage, duration in cursor.fetchall():
+                durations[stage].append(duration)
+            return dict(durations)
+        except Exception as e:
+            print(f"Errore lettura metriche: {e}")
+            return {}
+
+    def get_video_extractors(self):
+        """(id, estrattore di yt-dlp) di tutti i video della libreria"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('SELECT video_id, extractor FROM videos')
+            return cursor.fetchall()
+        except Exception as e:
+            print(f"Errore recupero id video: {e}")
+            return []
+
+    def get_all_videos(self):
+        """Ottiene tutti i video"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                SELECT video_id, title, channel, thumbnail_path, file_path,
+                       download_date, format
+                FROM videos
+                ORDER BY download_date DESC
+            ''')
+            return cursor.fetchall()
+        except Exception as e:
+            print(f"Errore recupero video: {e}")
+            return []
+
+    def count_videos(self):
+        """Numero di video nel database"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('SELECT COUNT(*) FROM videos')
+            return cursor.fetchone()[0]
+        except Exception as e:
+            print(f"Errore conteggio video: {e}")
+            return 0
+
+    def get_videos_page(self, after=None, limit=50):
+        """Pagina di video, dal più recente, con paginazione keyset.
+
+        `after` è la chiave (download_date, video_id) dell'ultima riga della
+        pagina precedente: il costo non dipende da quanto si è in fondo.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            if after is None:
+                cursor.execute('''
+                    SELECT video_id, title, channel, thumbnail_path, file_path,
+                           download_date, format
+                    FROM videos
+                    ORDER BY download_date DESC, video_id DESC
+                    LIMIT ?
+                ''', (limit,))
+            else:
+                cursor.execute('''
+                    SELECT video_id, title, channel, thumbnail_path, file_path,
+                           download_date, format
+                    FROM videos
+                    WHERE (download_date, video_id) < (?, ?)
+                    ORDER BY download_date DESC, video_id DESC
+                    LIMIT ?
+                ''', (after[0], after[1], limit))
+            return cursor.fetchall()
+        except Exception as e:
+            print(f"Errore recupero pagina video: {e}")
+            return []
+
+    def get_video_key_at(self, offset):
+        """Chiave keyset della riga in posizione `offset` (per i salti della scrollbar)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            # Scansione del solo indice, senza leggere le righe
+            cursor.execute('''
+                SELECT download_date, video_id
+                FROM videos
+                ORDER BY download_date DESC, video_id DESC
+                LIMIT 1 OFFSET ?
+            ''', (offset,))
+            return cursor.fetchone()
+        except Exception as e:
+            print(f"Errore recupero posizione video: {e}")
+            return None
+
+    def get_video_screenshots(self, video_id):
+        """Ottiene gli screenshot di un video"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                SELECT timestamp, screenshot_path
+                FROM screenshots
+                WHERE video_id = ?
+                ORDER BY timestamp
+            ''', (video_id,))
+            return cursor.fetchall()
+        except Exception as e:
+            print(f"Errore recupero screenshot: {e}")
+            return []
+
+
+class DownloadArchive:
+    """Video già scaricati: id della libreria in memoria e file per yt-dlp.
+
+    Il file usa il formato di --download-archive di yt-dlp (una riga
+    "<extractor> <id>"): passato a yt-dlp, fa saltare gli elementi già noti
+    di playlist e canali prima di estrarne le informazioni. yt-dlp vi
+    aggiunge i video che scarica; l'archivio vi aggiunge quelli salvati in
+    libreria. Gli URL di un singolo video noto vengono scartati senza
+    nemmeno avviare yt-dlp.
+    """
+
+    def __init__(self, db, path):
+        self.db = db
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._ids = None
+        self._keys = set()
+        self._offset = 0
+
+    def load(self):
+        """Carica id della libreria e file (una sola volta, anche in background)"""
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        if self._ids is not None:
+            return
+        videos = self.db.get_video_extractors()
+        self._ids = {video_id for video_id, _ in videos}
+        self._read_new_lines()
+
+        # Video salvati prima dell'archivio: il file deve conoscerli per yt-dlp.
+        # Senza estrattore (librerie precedenti) solo gli id di YouTube
+        archived = {key.split(' ', 1)[1] for key in self._keys}
+        keys = []
+        for video_id, extractor in sorted(videos):
+            if video_id in archived:
+                continue
+            if extractor:
+                keys.append(f"{extractor.lower()} {video_id}")
+            elif YOUTUBE_VIDEO_ID_RE.fullmatch(video_id):
+                keys.append(f"youtube {video_id}")
+        self._append(keys)
+
+    def _read_new_lines(self):
+        # Legge solo le righe complete aggiunte dall'ultima lettura
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+
+        end = data.rfind(b'\n') + 1
+        self._offset += end
+        for line in data[:end].decode('utf-8', 'replace').splitlines():
+            parts = line.split()
+            if len(parts) == 2:
+                self._keys.add(' '.join(parts))
+                self._ids.add(parts[1])
+
+    def _append(self, keys):
+        if not keys:
+            return
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.writelines(f"{key}\n" for key in keys)
+        except OSError as e:
+            print(f"Errore scrittura archivio download: {e}")
+            return
+        self._keys.update(keys)
+
+    def contains(self, video_id):
+        """True se il video è già in libreria o nell'archivio"""
+        with self._lock:
+            self._load()
+            self._read_new_lines()
+            return video_id in self._ids
+
+    def match_url(self, url, playlist=False):
+        """Id del video se l'URL è un singolo video già noto, altrimenti None"""
+        if playlist and 'list=' in url:
+            return None
+        match = YOUTUBE_ID_RE.search(url)
+        if match and self.contains(match.group(1)):
+            return match.group(1)
+        return None
+
+    def add(self, video_id, extractor=None):
+        """Registra un video salvato in libreria (se yt-dlp non l'ha già fatto)"""
+        key = f"{(extractor or 'youtube').lower()} {video_id}"
+        with self._lock:
+            self._load()
+            self._read_new_lines()
+            self._ids.add(video_id)
+            if key not in self._keys:
+                self._append([key])
+
+
+class FrameExtractor:
+    """Estrae screenshot a intervalli regolari decodificando il video una sola volta.
+
+    Invece di lanciare un ffmpeg per ogni screenshot, un unico processo legge
+    il file e seleziona i frame con il filtro select. I video lunghi vengono
+    divisi in segmenti contigui elaborati in parallelo. `max_workers` è il
+    budget di core di un video (default: tutti): limita sia i processi ffmpeg
+    sia i loro thread di decodifica.
+    """
+
+    # Sotto questa durata (secondi) per segmento non conviene dividere il video
+    MIN_SEGMENT_DURATION = 600
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    @staticmethod
+    def probe_duration(video_path):
+        """Ritorna la durata del video in secondi usando ffprobe"""
+        probe_cmd = [
+            'ffprobe', '-v', 'error', '-show_entries',
+            'format=duration', '-of',
+            'default=noprint_wrappers=1:nokey=1',
+            video_path
+        ]
+
+        duration_output = subprocess.check_output(probe_cmd, stderr=subprocess.STDOUT)
+        return float(duration_output.strip())
+
+    def plan_segments(self, duration, interval):
+        """Divide gli screenshot in segmenti: lista di (primo indice, numero frame)"""
+        total = math.ceil(duration / interval)
+        if total <= 0:
+            return []
+
+        segments = min(self.max_workers, max(1, int(duration // self.MIN_SEGMENT_DURATION)))
+        per_segment = math.ceil(total / segments)
+        return [(first, min(per_segment, total - first))
+                for first in range(0, total, per_segment)]
+
+    def extract(self, video_path, output_dir, interval):
+        """Estrae uno screenshot ogni `interval` secondi.
+
+        Ritorna la lista ordinata di (timestamp, percorso) dei file creati.
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        duration = self.probe_duration(video_path)
+        plan = self.plan_segments(duration, interval)
+        if not plan:
+            return []
+
+        # Il budget di core viene ripartito tra i segmenti per la decodifica
+        threads = max(1, self.max_workers // len(plan))
+
+        with ThreadPoolExecutor(max_workers=len(plan)) as pool:
+            futures = [
+                pool.submit(self._extract_segment, video_path, output_dir,
+                            interval, first, count, index, threads)
+                for index, (first, count) in enumerate(plan)
+            ]
+            screenshots = []
+            for future in futures:
+                screenshots.extend(future.result())
+
+        return screenshots
+
+    def _extract_segment(self, video_path, output_dir, interval, first, count, index, threads):
+        """Estrae i frame di un segmento con un solo processo ffmpeg"""
+        start = first * interval
+        pattern = output_dir / f".segment{index}_%06d.jpg"
+
+        cmd = ['ffmpeg', '-v', 'error', '-y', '-threads', str(threads)]
+        if start > 0:
+            cmd.extend(['-ss', str(start)])
+        cmd.extend([
+            '-t', str(count * interval),
+            '-i', video_path,
+            '-an', '-sn', '-dn',
+            # Primo frame con t >= k * interval per ogni k: nessun drift
+            '-vf', f'select=gte(t\\,selected_n*{interval})',
+            '-vsync', 'vfr',
+            '-frames:v', str(count),
+            '-q:v', '2',
+            str(pattern)
+        ])
+
+        subprocess.run(cmd, capture_output=True, check=True)
+
+        # Rinomina i frame con il timestamp, come le versioni precedenti
+        screenshots = []
+        for offset in range(count):
+            frame_path = output_dir / f".segment{index}_{offset + 1:06d}.jpg"
+            if not frame_path.exists():
+                break
+            timestamp = start + offset * interval
+            output_path = output_dir / f"screenshot_{int(timestamp)}.jpg"
+            os.replace(frame_path, output_path)
+            screenshots.append((timestamp, str(output_path)))
+
+        return screenshots
+
+
+class StageTimer:
+    """Durata delle fasi di un job, salvata nella tabella job_metrics.
+
+    Le fasi di yt-dlp (estrazione, download, merge, conversione) si
+    susseguono nello stesso processo: start() chiude quella in corso. Le
+    fasi successive (sottotitoli, database, screenshot) si misurano con
+    span().
+    """
+
+    # Nomi leggibili delle fasi, nell'ordine in cui avvengono
+    LABELS = {
+        'extraction': "Estrazione",
+        'download': "Download",
+        'merge': "Merge ffmpeg",
+        'conversion': "Conversione",
+        'postprocess': "Post-processing",
+        'subtitles': "Sottotitoli",
+        'database': "Database",
+        'screenshots': "Screenshot",
+    }
+
+    def __init__(self, job_id=None):
+        self.job_id = job_id
+        # (video_id, fase, inizio, durata in secondi)
+        self.spans = []
+        self._current = None
+
+    def start(self, stage):
+        """Inizia una fase (se non è già quella in corso)"""
+        if self._current is not None and self._current[0] == stage:
+            return
+        self.stop()
+        self._current = (stage, datetime.now(), time.perf_counter())
+
+    def stop(self):
+        """Chiude la fase in corso"""
+        if self._current is None:
+            return
+        stage, started_at, start = self._current
+        self.spans.append((None, stage, started_at.isoformat(), time.perf_counter() - start))
+        self._current = None
+
+    @contextmanager
+    def span(self, stage, video_id=None):
+        """Misura il blocco `with` come una fase"""
+        started_at = datetime.now()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((video_id, stage, started_at.isoformat(),
+                               time.perf_counter() - start))
+
+    def rows(self):
+        """Righe per DatabaseManager.add_job_metrics"""
+        return [(self.job_id,) + span for span in self.spans]
+
+    def totals(self):
+        """Secondi totali per fase"""
+        totals = defaultdict(float)
+        for _, stage, _, duration in self.spans:
+            totals[stage] += duration
+        return {stage: round(duration, 3) for stage, duration in totals.items()}
+
+
+class DownloadJob:
+    """Un singolo download in coda, con le opzioni scelte al momento dell'invio.
+
+    Una playlist è un job padre: i suoi elementi diventano job figli
+    (`children`) eseguiti in parallelo dalla coda, e il padre ne riassume
+    l'avanzamento. I job salvati in un JobStore hanno come id quello della
+    tabella jobs.
+    """
+
+    _ids = itertools.count(1)
+
+    # Stati possibili di un job
+    PENDING = "In coda"
+    RUNNING = "In corso"
+    DONE = "Completato"
+    FAILED = "Errore"
+
+    # Stato salvato nella tabella jobs per ogni stato del job
+    STATE_CODES = {PENDING: 'pending', RUNNING: 'running', DONE: 'done', FAILED: 'failed'}
+
+    def __init__(self, url, options, parent=None, job_id=None):
+        self.id = job_id if job_id is not None else next(self._ids)
+        self.url = url
+        self.options = options
+        self.parent = parent
+        self.state = self.PENDING
+        self.progress = 0.0
+        self.status = ""
+        self.result = ""
+        self.tracker = ProgressTracker()
+        # Id dei video salvati nella Knowledge Base da questo job
+        self.video_ids = []
+        # True se il video era già in libreria e non è stato scaricato
+        self.skipped = False
+        # Playlist: job degli elementi, elenco completo, elementi già in libreria
+        self.children = []
+        self.enumerated = False
+        self.entries_skipped = 0
+        # Persistenza: riga nella tabella jobs, avvii, file .part in corso
+        self.stored = False
+        self.attempts = 0
+        self.partial_files = []
+        # Durata delle fasi dell'ultima esecuzione
+        self.timer = None
+
+    @property
+    def finished(self):
+        return self.state in (self.DONE, self.FAILED)
+
+
+class JobStore:
+    """Coda di download persistente nella tabella jobs del database.
+
+    Ogni job viene registrato appena creato e aggiornato a ogni cambio di
+    stato, quindi dopo una chiusura (o un crash) i job in coda e quelli
+    interrotti possono ripartire: yt-dlp riprende dai file .part rimasti.
+    I job di una sessione sono "in affitto" (lease) finché la sessione è
+    viva: un'altra istanza aperta sullo stesso database non li prende, e
+    dopo un crash tornano disponibili allo scadere del lease.
+    """
+
+    # Durata del lease e intervallo di rinnovo (secondi)
+    LEASE_SECONDS = 15
+    RENEW_INTERVAL = 5
+    # Avvii dopo i quali un job interrotto da un crash viene segnato come fallito
+    MAX_ATTEMPTS = 3
+    # Giorni dopo i quali i job terminati vengono eliminati dalla tabella
+    PRUNE_DAYS = 30
+
+    def __init__(self, db):
+        self.db = db
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._thread = None
+        self._pruned = False
+
+    def lease_until(self):
+        return time.time() + self.LEASE_SECONDS
+
+    def add(self, job):
+        """Registra un nuovo job: da qui in poi job.id è l'id della tabella"""
+        parent_id = job.parent.id if job.parent is not None else None
+        job_id = self.db.add_job(job.url, job.options, parent_id, self.owner, self.lease_until())
+        if job_id is not None:
+            job.id = job_id
+            job.stored = True
+        return job
+
+    def save(self, job):
+        """Salva stato, tentativi e file parziali del job"""
+        if job.stored:
+            self.db.save_job(job.id, DownloadJob.STATE_CODES[job.state], job.attempts,
+                             job.result, job.partial_files, job.enumerated)
+
+    def resume(self):
+        """Prende in carico i job non terminati di sessioni chiuse e li ricostruisce.
+
+        Ritorna i job, i padri prima dei figli. Una playlist già elencata
+        torna con tutti i suoi elementi (anche quelli terminati, per il
+        riepilogo); una playlist interrotta durante l'elenco perde gli
+        elementi e viene elencata di nuovo.
+        """
+        if not self._pruned:
+            before = datetime.fromtimestamp(time.time() - self.PRUNE_DAYS * 86400)
+            self.db.prune_jobs(before.isoformat())
+            self._pruned = True
+
+        now = time.time()
+        rows = self.db.claim_jobs(self.owner, now + self.LEASE_SECONDS, now, self.MAX_ATTEMPTS)
+        parents = {row[0] for row in rows if row[5] is None and json.loads(row[2]).get('playlist')}
+
+        jobs = []
+        restored = {}
+        for row in rows:
+            job_id, parent_id = row[0], row[5]
+            if parent_id in parents:
+                # Gli elementi arrivano insieme alla loro playlist
+                continue
+
+            job = self._restore(row)
+            jobs.append(job)
+            restored[job_id] = job
+
+            if job_id not in parents:
+                continue
+            if not job.enumerated:
+                self.db.delete_child_jobs(job_id)
+                continue
+
+            job.state = DownloadJob.RUNNING
+            for child_row in self.db.get_child_jobs(job_id):
+                child = self._restore(child_row[:8], parent=job)
+                state, result = child_row[3], child_row[8]
+                if state in ('done', 'failed'):
+                    child.state = DownloadJob.DONE if state == 'done' else DownloadJob.FAILED
+                    child.progress = 100
+                    child.result = result or ""
+                job.children.append(child)
+                jobs.append(child)
+
+        return jobs
+
+    def _restore(self, row, parent=None):
+        job_id, url, options, state, attempts, parent_id, enumerated, partial_files = row
+        job = DownloadJob(url, json.loads(options), parent=parent, job_id=job_id)
+        job.stored = True
+        job.attempts = attempts or 0
+        job.enumerated = bool(enumerated)
+        job.partial_files = json.loads(partial_files) if partial_files else []
+        return job
+
+    def start(self, on_expired=None):
+        """Avvia il rinnovo periodico dei lease della sessione.
+
+        Con `on_expired` (chiamato a ogni rinnovo) la sessione riprende anche
+        i job rimasti a una sessione terminata senza chiudere (crash).
+        """
+        def renew():
+            while not self._stop.wait(self.RENEW_INTERVAL):
+                self.db.renew_job_leases(self.owner, self.lease_until())
+                if on_expired is not None:
+                    on_expired()
+            # Chiusura ordinata: i job non terminati sono subito riprendibili
+            self.db.release_jobs(self.owner)
+
+        self._thread = threading.Thread(target=renew, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Ferma il rinnovo e rilascia i job della sessione"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        else:
+            self.db.release_jobs(self.owner)
+
+
+class DownloadQueue:
+    """Coda di download servita da un pool di worker di dimensione limitata"""
+
+    def __init__(self, runner, max_workers=4):
+        self.runner = runner
+        self.max_workers = max(1, int(max_workers))
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._workers = 0
+        self._active = 0
+
+    def submit(self, job):
+        """Accoda un job e avvia un worker se c'è posto nel pool"""
+        with self._cond:
+            self._pending.append(job)
+            self._spawn_workers()
+
+    def set_max_workers(self, max_workers):
+        """Cambia il numero massimo di download contemporanei"""
+        with self._cond:
+            self.max_workers = max(1, int(max_workers))
+            self._spawn_workers()
+
+    def stats(self):
+        """Ritorna (job in corso, job in attesa)"""
+        with self._cond:
+            return self._active, len(self._pending)
+
+    def join(self, timeout=None):
+        """Attende che tutti i job accodati siano terminati; ritorna False allo scadere"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not (self._pending or self._active), timeout)
+
+    def _spawn_workers(self):
+        # Chiamato con il lock acquisito: un worker per ogni job in attesa,
+        # senza superare la dimensione del pool
+        idle = self._workers - self._active
+        while self._workers < self.max_workers and idle < len(self._pending):
+            self._workers += 1
+            idle += 1
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                # I worker in eccesso (pool ridotto) o senza lavoro terminano
+                if not self._pending or self._workers > self.max_workers:
+                    self._workers -= 1
+                    return
+                job = self._pending.popleft()
+                self._active += 1
+
+            try:
+                self.runner(job)
+            except Exception as e:
+                print(f"Errore job #{job.id}: {e}")
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._cond.notify_all()
+
+
+class ScreenshotQueue:
+    """Coda del Visual Summary servita da un pool limitato, con priorità.
+
+    `runner(video_id, *args, **kwargs)` genera gli screenshot di un video.
+    Le richieste vengono servite per priorità (MANUAL prima di AUTO), poi in
+    ordine di arrivo. Una nuova richiesta per un video già in attesa si
+    unisce a quella esistente invece di duplicarla (restano priorità e
+    argomenti della più importante); per un video in elaborazione viene
+    ignorata. Con pause() i worker non iniziano nuovi video; con
+    pause_when_busy anche mentre `busy()` è vero (ad esempio download in
+    corso), tranne che per le richieste MANUAL. `on_change()` viene chiamato
+    (da qualsiasi thread) quando cambia l'arretrato.
+    """
+
+    # Priorità: valori minori vengono serviti prima
+    MANUAL = 0
+    AUTO = 10
+
+    # Secondi tra i controlli di busy() mentre la coda è trattenuta
+    BUSY_POLL = 1.0
+
+    def __init__(self, runner, max_workers=None, busy=None, on_change=None):
+        self.runner = runner
+        self.max_workers = max(1, int(max_workers or self.default_workers()))
+        self.busy = busy or (lambda: False)
+        self.on_change = on_change or (lambda: None)
+        self.paused = False
+        self.pause_when_busy = False
+        # video_id -> (priorità, ordine di arrivo, args, kwargs); l'heap può
+        # contenere voci superate, scartate quando vengono estratte
+        self._pending = {}
+        self._heap = []
+        self._order = itertools.count()
+        self._running = set()
+        self._cond = threading.Condition()
+        self._workers = 0
+
+    @staticmethod
+    def default_workers():
+        """Video in parallelo di default: metà dei core.
+
+        Ogni video usa a sua volta più processi ffmpeg: il FrameExtractor
+        del runner va creato con max_workers = core // video in parallelo,
+        così pool e segmenti insieme non superano i core disponibili.
+        """
+        return max(1, (os.cpu_count() or 1) // 2)
+
+    def submit(self, video_id, *args, priority=AUTO, **kwargs):
+        """Accoda un video; ritorna False se è già in elaborazione"""
+        with self._cond:
+            if video_id in self._running:
+                return False
+
+            if video_id in self._pending:
+                # Stesso video già in attesa: vince la richiesta più importante
+                # (a parità, la più recente), con il posto in coda della prima
+                pending_priority, order, pending_args, pending_kwargs = self._pending[video_id]
+                if pending_priority < priority:
+                    priority, args, kwargs = pending_priority, pending_args, pending_kwargs
+            else:
+                order = next(self._order)
+            if self._pending.get(video_id, (None, None))[:2] != (priority, order):
+                heapq.heappush(self._heap, (priority, order, video_id))
+            self._pending[video_id] = (priority, order, args, kwargs)
+            self._spawn_workers()
+            self._cond.notify_all()
+        self.on_change()
+        return True
+
+    def pause(self):
+        with self._cond:
+            self.paused = True
+        self.on_change()
+
+    def resume(self):
+        with self._cond:
+            self.paused = False
+            self._cond.notify_all()
+        self.on_change()
+
+    def set_pause_when_busy(self, enabled):
+        """Trattiene la coda mentre busy() è vero (es. download in corso)"""
+        with self._cond:
+            self.pause_when_busy = bool(enabled)
+            self._cond.notify_all()
+        self.on_change()
+
+    def stats(self):
+        """Ritorna (video in elaborazione, video in attesa, coda trattenuta)"""
+        with self._cond:
+            return len(self._running), len(self._pending), self._held(self._next_priority())
+
+    def backlog(self):
+        """Id dei video in attesa, nell'ordine in cui verranno elaborati"""
+        with self._cond:
+            return [video_id for video_id, _ in
+                    sorted(self._pending.items(), key=lambda item: item[1][:2])]
+
+    def join(self, timeout=None):
+        """Attende che l'arretrato sia esaurito; ritorna False allo scadere"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not (self._pending or self._running), timeout)
+
+    def _next_priority(self):
+        # Chiamato con il lock acquisito: priorità della prossima richiesta valida
+        while self._heap:
+            priority, order, video_id = self._heap[0]
+            if self._pending.get(video_id, (None, None))[:2] == (priority, order):
+                return priority
+            heapq.heappop(self._heap)
+        return None
+
+    def _held(self, priority):
+        if self.paused:
+            return True
+        return (self.pause_when_busy and priority is not None
+                and priority > self.MANUAL and self.busy())
+
+    def _spawn_workers(self):
+        # Chiamato con il lock acquisito, come in DownloadQueue
+        idle = self._workers - len(self._running)
+        while self._workers < self.max_workers and idle < len(self._pending):
+            self._workers += 1
+            idle += 1
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while True:
+                    priority = self._next_priority()
+                    if priority is None or self._workers > self.max_workers:
+                        self._workers -= 1
+                        return
+                    if not self._held(priority):
+                        break
+                    # busy() non avvisa quando cambia: viene ricontrollato
+                    self._cond.wait(self.BUSY_POLL)
+
+                _, _, video_id = heapq.heappop(self._heap)
+                _, _, args, kwargs = self._pending.pop(video_id)
+                self._running.add(video_id)
+            self.on_change()
+
+            try:
+                self.runner(video_id, *args, **kwargs)
+            except Exception as e:
+                print(f"Errore screenshot {video_id}: {e}")
+            finally:
+                with self._cond:
+                    self._running.discard(video_id)
+                    self._cond.notify_all()
+                self.on_change()
+
+
+class DownloadPipeline:
+    """Download con yt-dlp, salvataggio nella Knowledge Base e Visual Summary.
+
+    Non dipende dall'interfaccia: la GUI e la riga di comando si agganciano
+    con i callback `log(message, tag)`, `on_update(job)` (progresso del job,
+    chiamato dal thread worker) e `on_saved(records, options)` (video appena
+    salvati; di default genera il Visual Summary nello stesso thread).
+    `on_done(job)` viene chiamato una volta quando un job termina; per le
+    playlist, quando è terminato l'ultimo elemento. Con un DownloadArchive
+    i video già noti vengono saltati (opzione 'skip_known' del job); con un
+    JobStore i job sopravvivono alla chiusura (vedi resume e shutdown); con
+    un BandwidthGovernor attivo tutti i download condividono un unico limite
+    di banda.
+    """
+
+    # Eseguibile di yt-dlp (sostituibile, ad esempio dai benchmark offline)
+    YTDLP_COMMAND = ('yt-dlp',)
+
+    # Campi di ogni elemento stampati dall'elenco piatto della playlist
+    ENTRY_TEMPLATE = '{id,url,webpage_url,title,ie_key}'
+
+    # Percorsi finali di sottotitoli e thumbnail scritti da yt-dlp
+    SUBTITLE_PATHS = 'requested_subtitles.:.filepath'
+    THUMBNAIL_PATHS = 'thumbnails.:.filepath'
+
+    # Campi dei metadati che yt-dlp scrive (una riga JSON per video) durante
+    # il download, per la Knowledge Base; filepath è il file finale dopo
+    # merge, conversione e spostamento, filesize la dimensione del formato
+    # scaricato (assente per i formati uniti video+audio)
+    METADATA_TEMPLATE = ('{id,extractor_key,title,uploader,duration,upload_date,description,'
+                         'filepath,filesize,' + SUBTITLE_PATHS + ',' + THUMBNAIL_PATHS + '}')
+
+    # Lingue delle trascrizioni salvate nella Knowledge Base
+    TRANSCRIPT_LANGUAGES = ('it', 'en')
+
+    # Intervallo (secondi) tra gli screenshot del Visual Summary automatico
+    SUMMARY_INTERVAL = 30
+
+    # Fasi di yt-dlp riconosciute dal prefisso delle righe di output
+    YTDLP_STAGES = (
+        ('[download]', 'download'),
+        ('[Merger]', 'merge'),
+        ('[ExtractAudio]', 'conversion'),
+        ('[VideoConvertor]', 'conversion'),
+        ('[Fixup', 'postprocess'),
+        ('[Metadata]', 'postprocess'),
+        ('[EmbedSubtitle]', 'postprocess'),
+        ('[MoveFiles]', 'postprocess'),
+    )
+
+    def __init__(self, db, log=None, on_update=None, on_saved=None, frame_extractor=None,
+                 archive=None, on_done=None, submit=None, store=None, governor=None,
+                 profiler=None):
+        self.db = db
+        self.archive = archive
+        self.store = store
+        self.governor = governor
+        self.log = log or (lambda message, tag='info': None)
+        self.on_update = on_update or (lambda job: None)
+        self.on_done = on_done or (lambda job: None)
+        # Profilazione opzionale (youtube_profiling): senza profiler i metodi
+        # restano quelli della classe
+        self.profiler = profiler
+        if profiler is not None:
+            self.download_video = profiler.wrap(
+                'download', self.download_video, lambda job: (job.id, job.video_ids))
+            self.save_to_database = profiler.wrap(
+                'ingest', self.save_to_database,
+                lambda video_infos, options, timer=None: (
+                    timer.job_id if timer else None,
+                    [info['id'] for info in video_infos if info.get('id')]))
+            self.extract_screenshots = profiler.wrap(
+                'screenshots', self.extract_screenshots,
+                lambda video_id, video_path, interval, output_path, job_id=None: (
+                    job_id, [video_id]))
+        # Accoda i job degli elementi di una playlist (senza coda: in sequenza)
+        self.submit = submit or self.download_video
+        self._playlist_lock = threading.Lock()
+        self.on_saved = on_saved or self.generate_summaries
+        self.frame_extractor = frame_extractor or FrameExtractor()
+        # Processi yt-dlp in corso, interrotti da shutdown()
+        self.stopping = False
+        self._processes = set()
+        self._process_lock = threading.Lock()
+
+    def create_job(self, url, options, parent=None):
+        """Crea un job e lo registra nella coda persistente (se presente)"""
+        job = DownloadJob(url, options, parent=parent)
+        if self.store is not None:
+            self.store.add(job)
+        return job
+
+    def persist(self, job):
+        """Salva lo stato del job nella coda persistente (se presente)"""
+        if self.store is not None:
+            self.store.save(job)
+
+    def resume(self, register=None):
+        """Riprende i job rimasti nella coda persistente da sessioni precedenti.
+
+        I job da eseguire vengono accodati con `submit`; gli altri (playlist
+        già elencate ed elementi terminati) passano solo a `register`, per
+        mostrarli. Ritorna tutti i job ripresi.
+        """
+        if self.store is None:
+            return []
+
+        register = register or self.on_update
+        jobs = self.store.resume()
+        for job in jobs:
+            if job.finished or job.enumerated:
+                register(job)
+            else:
+                self.log(f"[#{job.id}] ▶️ Ripresa dalla sessione precedente: {job.url}", 'info')
+                self.submit(job)
+
+        # Playlist i cui elementi erano già tutti terminati
+        for job in jobs:
+            if job.enumerated and not job.finished:
+                self.update_playlist(job)
+        return jobs
+
+    def shutdown(self, timeout=5):
+        """Interrompe i download in corso: i job restano in coda per la
+        prossima sessione, e yt-dlp riprenderà dai file .part"""
+        self.stopping = True
+        with self._process_lock:
+            processes = list(self._processes)
+
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def spawn(self, cmd):
+        """Avvia yt-dlp (stdout e stderr uniti) registrando il processo"""
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            encoding='utf-8',
+            errors='replace',
+            **SUBPROCESS_OPTIONS
+        )
+        with self._process_lock:
+            self._processes.add(process)
+        # shutdown() arrivato mentre il processo partiva
+        if self.stopping:
+            process.terminate()
+        return process
+
+    def reap(self, process):
+        """Attende la fine del processo e lo rimuove da quelli in corso"""
+        process.wait()
+        with self._process_lock:
+            self._processes.discard(process)
+
+    def build_command(self, job, metadata_file=None, proxy=None):
+        """Costruisce la riga di comando yt-dlp per il job"""
+        options = job.options
+        output_path = options['output_path']
+        prefix = f"[#{job.id}]"
+
+        # Costruiamo il comando yt-dlp con --remote-components per HD
+        # Questo è l'UNICO modo per ottenere formati HD con YouTube moderno
+        cmd = [
+            *self.YTDLP_COMMAND,
+            '--remote-components', 'ejs:github',  # Challenge solver per HD
+            '--newline',  # Progress su righe separate
+            '--progress-template', PROGRESS_TEMPLATE,  # Progress come JSON per riga
+            '-o', os.path.join(output_path, '%(title)s.%(ext)s'),
+            '--write-thumbnail',  # Download thumbnail
+            '--continue',  # Riprende i file .part di un download interrotto
+        ]
+
+        # Formato
+        if options['format'] == 'audio':
+            cmd.extend(['-f', 'bestaudio/best'])
+            cmd.extend(['-x', '--audio-format', 'mp3', '--audio-quality', '192K'])
+            self.log(f"{prefix} 🎵 Modalità: Solo Audio (MP3)", 'info')
+        elif options['format'] == 'subtitles':
+            cmd.extend(['--skip-download', '--write-subs', '--write-auto-subs'])
+            cmd.extend(['--sub-langs', 'it,en,es,fr,de,pt,ru,ja,ko,zh-Hans,zh-Hant,ar'])
+            cmd.extend(['--sub-format', 'srt/vtt/best'])
+            self.log(f"{prefix} 📝 Modalità: Solo Sottotitoli", 'info')
+        else:
+            quality = options['quality']
+            if quality == 'best':
+                format_string = 'bestvideo+bestaudio/best'
+            else:
+                format_string = f'bestvideo[height<={quality}]+bestaudio/bestvideo+bestaudio/best'
+
+            cmd.extend(['-f', format_string])
+            cmd.extend(['--merge-output-format', 'mp4'])
+            self.log(f"{prefix} 🎬 Modalità: Video - Qualità: {quality}", 'info')
+
+        # Sottotitoli per Knowledge Base
+        if options['knowledge_base'] and options['format'] != 'subtitles':
+            cmd.extend(['--write-subs', '--write-auto-subs', '--sub-langs', 'it,en'])
+            cmd.append('--ignore-errors')  # Continua se sottotitoli falliscono
+            self.log(f"{prefix} 🧠 Knowledge Base: Abilitato (sottotitoli opzionali)", 'info')
+
+        # Playlist
+        if options['playlist']:
+            cmd.append('--yes-playlist')
+            self.log(f"{prefix} 📑 Modalità Playlist: Attiva", 'info')
+        else:
+            cmd.append('--no-playlist')
+
+        # Traffico attraverso il proxy locale del limite di banda condiviso
+        if proxy:
+            cmd.extend(['--proxy', proxy.url])
+
+        # Elementi già in libreria saltati da yt-dlp prima dell'estrazione
+        if self.archive is not None and options['skip_known']:
+            cmd.extend(['--download-archive', self.archive.path])
+
+        # Metadati per il database scritti dallo stesso processo di download:
+        # nessuna seconda estrazione (e nessun traffico extra) a fine download
+        if metadata_file:
+            # Senza download (solo sottotitoli) la fase after_move non viene
+            # eseguita: before_dl arriva dopo la scrittura di sottotitoli e thumbnail
+            when = 'before_dl' if options['format'] == 'subtitles' else 'after_move'
+            cmd.extend(['--print-to-file', f'{when}:{self.METADATA_TEMPLATE}',
+                        metadata_file.replace('%', '%%')])
+
+        # Aggiungi URL
+        cmd.append(job.url)
+        return cmd
+
+    def download_video(self, job):
+        """Esegue il job: download con yt-dlp (subprocess, per supporto HD) e ingest"""
+        # In chiusura: il job resta in coda per la prossima sessione
+        if self.stopping:
+            return job
+        if job.options['playlist']:
+            return self.run_playlist(job)
+
+        url = job.url
+        options = job.options
+        prefix = f"[#{job.id}]"
+
+        job.state = DownloadJob.RUNNING
+        job.status = "Avvio..."
+        self.notify(job)
+
+        # Video singolo già in libreria: nessun lavoro di rete
+        if self.archive is not None and options['skip_known']:
+            known_id = self.archive.match_url(url, options['playlist'])
+            if known_id:
+                self.log(f"{prefix} ⏭️ Già in libreria: {known_id} (download saltato)", 'info')
+                job.skipped = True
+                job.progress = 100
+                job.state = DownloadJob.DONE
+                job.result = "⏭️ Già in libreria"
+                self.finish(job)
+                return job
+
+        job.attempts += 1
+        job.timer = timer = StageTimer(job.id)
+        self.persist(job)
+        for partial in job.partial_files:
+            if os.path.exists(partial):
+                self.log(f"{prefix} ▶️ Ripresa da {format_bytes(os.path.getsize(partial))}: "
+                         f"{os.path.basename(partial)}", 'info')
+
+        output_path = options['output_path']
+        os.makedirs(output_path, exist_ok=True)
+
+        metadata_file = None
+        if options['knowledge_base']:
+            fd, metadata_file = tempfile.mkstemp(prefix='ytdl_meta_', suffix='.jsonl')
+            os.close(fd)
+
+        proxy = None
+        try:
+            if self.governor is not None and self.governor.enabled:
+                proxy = self.governor.open()
+                if self.governor.limited:
+                    self.log(f"{prefix} 🚦 Banda condivisa: {self.governor.describe()}", 'info')
+            elif self.governor is not None and self.governor.limited:
+                self.log(f"{prefix} ⚠️ Limite di banda non applicato: il proxy di sistema "
+                         f"non è un proxy HTTP", 'error')
+
+            cmd = self.build_command(job, metadata_file, proxy)
+
+            self.log(f"{prefix} 🔗 URL: {url}", 'info')
+            self.log(f"{prefix} 🚀 Inizio download con challenge solver HD...", 'info')
+            self.log(f"{prefix} 🔧 Comando: yt-dlp --remote-components ejs:github ...", 'info')
+
+            # Esegui yt-dlp come subprocess
+            timer.start('extraction')
+            process = self.spawn(cmd)
+
+            # Leggi output: le righe di progresso sono JSON strutturato
+            for line in process.stdout:
+                line = line.strip()
+                if not line:
+                    continue
+
+                event = parse_progress_line(line)
+                if event is None:
+                    for marker, stage in self.YTDLP_STAGES:
+                        if line.startswith(marker):
+                            timer.start(stage)
+                            break
+                    self.log(f"{prefix} {line}", 'info')
+                    continue
+
+                timer.start('download')
+                job.tracker.update(event)
+                job.progress = job.tracker.percent
+                job.status = job.tracker.summary()
+
+                # Nuovo file in scrittura: salvato per riprenderlo dopo un'interruzione
+                if event.filename and event.status == 'downloading':
+                    partial = event.filename + '.part'
+                    if partial not in job.partial_files:
+                        job.partial_files.append(partial)
+                        self.persist(job)
+
+                self.notify(job)
+
+            self.reap(process)
+            timer.stop()
+
+            if process.returncode == 0:
+                self.log(f"{prefix} ✅ DOWNLOAD COMPLETATO!", 'success')
+                job.progress = 100
+                job.status = "💾 Elaborazione..."
+                self.notify(job)
+
+                # Salva nel database se richiesto
+                if options['knowledge_base']:
+                    self.log(f"{prefix} 💾 Salvataggio nel database...", 'info')
+                    try:
+                        video_infos = self.read_download_metadata(metadata_file)
+                        records = self.save_to_database(video_infos, options, timer)
+                        job.video_ids = [record['video']['id'] for record in records]
+                        self.archive_videos(video_infos, job.video_ids)
+                    except Exception as e:
+                        self.log(f"{prefix} ⚠️ Errore salvataggio database: {e}", 'error')
+
+                job.partial_files = []
+                job.state = DownloadJob.DONE
+                job.result = f"📁 {output_path}"
+            elif self.stopping:
+                self.log(f"{prefix} ⏸️ Interrotto: riprenderà al prossimo avvio", 'info')
+                job.state = DownloadJob.PENDING
+                job.result = "⏸️ Interrotto"
+            else:
+                raise Exception(f"yt-dlp terminato con errore (code {process.returncode})")
+
+        except Exception as e:
+            error_msg = str(e)
+            self.log(f"{prefix} ❌ ERRORE: {error_msg}", 'error')
+            job.state = DownloadJob.FAILED
+            job.result = f"❌ {error_msg}"
+
+        finally:
+            if proxy is not None:
+                proxy.close()
+            if metadata_file and os.path.exists(metadata_file):
+                os.remove(metadata_file)
+            timer.stop()
+            self.db.add_job_metrics(timer.rows())
+            self.finish(job)
+
+        return job
+
+    def notify(self, job):
+        """Segnala un aggiornamento del job (e della sua playlist)"""
+        self.on_update(job)
+        if job.parent is not None:
+            self.update_playlist(job.parent)
+
+    def finish(self, job):
+        """Segnala che il job è terminato (o interrotto)"""
+        job.status = ""
+        self.persist(job)
+        self.on_update(job)
+        self.on_done(job)
+        if job.parent is not None:
+            self.update_playlist(job.parent)
+
+    def run_playlist(self, job):
+        """Accoda un job per ogni elemento della playlist, man mano che arriva.
+
+        Gli elementi vengono elencati in modo piatto e pigro (vedi
+        iter_playlist_entries): il primo download parte appena il primo
+        elemento è noto, e ognuno viene risolto solo quando un worker lo
+        prende. Gli elementi sono scaricati in parallelo dai worker della
+        coda; un elemento fallito non blocca gli altri. Il job della playlist
+        termina con l'ultimo elemento (vedi update_playlist).
+        """
+        prefix = f"[#{job.id}]"
+        job.state = DownloadJob.RUNNING
+        job.status = "📑 Lettura playlist..."
+        job.attempts += 1
+        self.persist(job)
+        self.on_update(job)
+
+        # Gli elementi sono video singoli, con le stesse opzioni della playlist
+        entry_options = dict(job.options, playlist=False)
+        skip_known = self.archive is not None and job.options['skip_known']
+
+        try:
+            self.log(f"{prefix} 📑 Lettura elementi della playlist: {job.url}", 'info')
+            for entry in self.iter_playlist_entries(job.url):
+                url = entry.get('url') or entry.get('webpage_url')
+                if not url:
+                    continue
+                if skip_known and entry.get('id') and self.archive.contains(entry['id']):
+                    job.entries_skipped += 1
+                    continue
+
+                if self.stopping:
+                    break
+
+                child = self.create_job(url, entry_options, parent=job)
+                with self._playlist_lock:
+                    job.children.append(child)
+                self.submit(child)
+        except Exception as e:
+            if not self.stopping:
+                self.log(f"{prefix} ❌ ERRORE playlist: {e}", 'error')
+                if not job.children:
+                    job.state = DownloadJob.FAILED
+                    job.result = f"❌ {e}"
+                    self.finish(job)
+                    return job
+
+        # Elenco interrotto: alla ripresa la playlist viene elencata di nuovo
+        if self.stopping:
+            job.state = DownloadJob.PENDING
+            job.result = "⏸️ Interrotto"
+            self.finish(job)
+            return job
+
+        with self._playlist_lock:
+            job.enumerated = True
+        self.persist(job)
+
+        self.log(f"{prefix} 📑 Playlist: {len(job.children)} video in coda, "
+                 f"{job.entries_skipped} già in libreria", 'info')
+
+        self.update_playlist(job)
+        return job
+
+    def iter_playlist_entries(self, url):
+        """Genera gli elementi della playlist (id, url, titolo) man mano che yt-dlp li elenca.
+
+        Con --flat-playlist gli elementi non vengono risolti e con
+        --lazy-playlist yt-dlp li stampa pagina per pagina, senza raccogliere
+        prima l'intero elenco: la memoria resta costante anche per canali
+        con migliaia di video.
+        """
+        cmd = [
+            *self.YTDLP_COMMAND,
+            '--flat-playlist', '--lazy-playlist', '--yes-playlist',
+            '--ignore-errors',
+            '-O', self.ENTRY_TEMPLATE,
+            url
+        ]
+        process = self.spawn(cmd)
+
+        found = 0
+        last_error = None
+        exhausted = False
+        try:
+            for line in process.stdout:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Avvisi ed errori di yt-dlp (stdout e stderr sono uniti)
+                    last_error = line
+                    continue
+                found += 1
+                yield entry
+            exhausted = True
+        finally:
+            # Generatore abbandonato a metà: niente processi orfani
+            if not exhausted and process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            self.reap(process)
+
+        if process.returncode != 0 and not found:
+            raise Exception(last_error or f"yt-dlp terminato con errore (code {process.returncode})")
+
+    def update_playlist(self, job):
+        """Ricalcola l'avanzamento della playlist dai suoi elementi"""
+        with self._playlist_lock:
+            children = list(job.children)
+            total = len(children)
+            done = sum(1 for child in children if child.state == DownloadJob.DONE)
+            failed = sum(1 for child in children if child.state == DownloadJob.FAILED)
+
+            completed = job.enumerated and done + failed == total and not job.finished
+            if completed:
+                job.progress = 100
+                job.state = DownloadJob.FAILED if failed else DownloadJob.DONE
+                job.result = f"📑 {done}/{total} completati"
+                if failed:
+                    job.result += f", {failed} errori"
+                if job.entries_skipped:
+                    job.result += f", {job.entries_skipped} già in libreria"
+            elif not job.finished:
+                if total:
+                    job.progress = sum(child.progress for child in children) / total
+                job.status = f"📑 {done + failed}/{total} video ({failed} errori)"
+
+        if completed:
+            self.log(f"[#{job.id}] 📑 Playlist terminata: {job.result}",
+                     'error' if failed else 'success')
+            self.finish(job)
+        else:
+            self.on_update(job)
+
+    def archive_videos(self, video_infos, video_ids):
+        """Aggiunge all'archivio i video appena salvati in libreria"""
+        if self.archive is None:
+            return
+        extractors = {info.get('id'): info.get('extractor_key') for info in video_infos}
+        for video_id in video_ids:
+            self.archive.add(video_id, extractors.get(video_id))
+
+    def read_download_metadata(self, metadata_file):
+        """Legge i metadati scritti da yt-dlp con --print-to-file (JSON per riga)"""
+        video_infos = {}
+        with open(metadata_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    info = json.loads(line)
+                except ValueError:
+                    continue
+                # Un video può comparire più volte (es. ripetuto in playlist)
+                if info.get('id'):
+                    video_infos[info['id']] = info
+        return list(video_infos.values())
+
+    def save_to_database(self, video_infos, options, timer=None):
+        """Salva video e trascrizioni nel database in una sola transazione.
+
+        Ritorna i record salvati (vuoto in caso di errore). Con uno
+        StageTimer misura lettura dei sottotitoli e scrittura nel database.
+        """
+        timer = timer or StageTimer()
+        records = []
+        for video_info in video_infos:
+            try:
+                with timer.span('subtitles', video_info.get('id')):
+                    record = self.build_library_record(video_info, options)
+                # Per attribuire al job gli screenshot generati dopo
+                record['job_id'] = timer.job_id
+                records.append(record)
+            except Exception as e:
+                self.log(f"⚠️ Errore preparazione {video_info.get('id')}: {e}", 'error')
+
+        with timer.span('database'):
+            saved = self.db.ingest_videos(records)
+        if not saved:
+            self.log("⚠️ Errore salvataggio database", 'error')
+            return []
+
+        for record in records:
+            self.log(f"💾 Video salvato nel database: {record['video']['id']}", 'success')
+
+        self.on_saved(records, options)
+        return records
+
+    def build_library_record(self, video_info, options):
+        """Raccoglie file, thumbnail e trascrizioni di un video per ingest_videos.
+
+        I percorsi arrivano già risolti da yt-dlp (vedi METADATA_TEMPLATE):
+        nessuna ricerca dei file a partire dal titolo.
+        """
+        video_id = video_info.get('id')
+
+        file_path = video_info.get('filepath')
+        thumbnails = video_info.get(self.THUMBNAIL_PATHS) or []
+        thumb_path = thumbnails[-1] if thumbnails else None
+
+        # File size dai metadati; il file viene letto solo se manca (formati
+        # uniti) o se la conversione audio ha cambiato il file
+        file_size = video_info.get('filesize') if options['format'] != 'audio' else None
+        if file_size is None and file_path:
+            try:
+                file_size = os.path.getsize(file_path)
+            except OSError:
+                pass
+        file_size = file_size or 0
+
+        video_data = {
+            'id': video_id,
+            'title': video_info.get('title'),
+            'uploader': video_info.get('uploader'),
+            'duration': video_info.get('duration'),
+            'upload_date': video_info.get('upload_date'),
+            'description': (video_info.get('description') or '')[:500],  # Primi 500 char
+            'thumbnail_path': thumb_path,
+            'file_path': file_path,
+            'file_size': file_size,
+            'format': options['format'],
+            'extractor': video_info.get('extractor_key')
+        }
+
+        # Sottotitoli (opzionali - possono mancare): testo completo e cue con i tempi
+        transcripts = []
+        segments = []
+        for sub_path in video_info.get(self.SUBTITLE_PATHS) or []:
+            # yt-dlp li salva come <nome>.<lingua>.<ext>
+            parts = os.path.basename(sub_path).rsplit('.', 2)
+            lang = parts[1] if len(parts) == 3 else None
+            if lang not in self.TRANSCRIPT_LANGUAGES:
+                continue
+
+            try:
+                with open(sub_path, 'r', encoding='utf-8') as f:
+                    cues = list(iter_cues(f))
+
+                transcripts.append((lang, ' '.join(text for _, _, text in cues)))
+                segments.extend((lang, start, end, text) for start, end, text in cues)
+                self.log(f"📝 Trascrizione trovata: {lang} ({len(cues)} segmenti)", 'success')
+            except Exception as e:
+                self.log(f"⚠️ Errore lettura sottotitolo {lang}: {e}", 'error')
+
+        if not transcripts and options['knowledge_base']:
+            self.log("⚠️ Nessun sottotitolo trovato (possibile errore 429 o non disponibili)", 'error')
+            self.log("💡 Video salvato comunque - ricerca Knowledge Base limitata", 'info')
+
+        return {'video': video_data, 'transcripts': transcripts, 'segments': segments}
+
+    @staticmethod
+    def wants_summary(record, options):
+        """True se per il video va generato il Visual Summary automatico"""
+        return bool(options['auto_summary'] and record['video']['file_path']
+                    and options['format'] == 'video')
+
+    def generate_summaries(self, records, options):
+        """Genera il Visual Summary dei video salvati, nel thread corrente"""
+        for record in records:
+            if not self.wants_summary(record, options):
+                continue
+            video_data = record['video']
+            self.log(f"📸 Generazione Visual Summary: {video_data['id']}", 'info')
+            try:
+                self.extract_screenshots(video_data['id'], video_data['file_path'],
+                                         self.SUMMARY_INTERVAL, options['output_path'],
+                                         record.get('job_id'))
+            except Exception as e:
+                self.log(f"⚠️ Errore generazione screenshot {video_data['id']}: {e}", 'error')
+
+    def extract_screenshots(self, video_id, video_path, interval, output_path, job_id=None):
+        """Estrae gli screenshot con ffmpeg e li salva nel database.
+
+        Ritorna la lista di (timestamp, percorso) degli screenshot creati.
+        La durata viene registrata come fase 'screenshots' del job.
+        """
+        # Directory per screenshot
+        screenshots_dir = Path(output_path) / "screenshots" / video_id
+
+        timer = StageTimer(job_id)
+        with timer.span('screenshots', video_id):
+            # Estrazione in una sola passata (divisa in segmenti paralleli)
+            screenshots = self.frame_extractor.extract(video_path, screenshots_dir, interval)
+
+            # Salva nel database (una sola transazione)
+            self.db.add_screenshots(video_id, screenshots)
+        self.db.add_job_metrics(timer.rows())
+        return screenshots
@@ -12,11 +12,13 @@ import sys
 import threading
 from pathlib import Path
 import json
+import importlib.util
 from datetime import datetime
+from youtube_progress import ProgressEvent, ProgressTracker
 
-try:
-    import yt_dlp
-except ImportError:
+# Solo verifica: yt_dlp (centinaia di extractor) viene importato al primo
+# download, non all'avvio
+if importlib.util.find_spec('yt_dlp') is None:
     print("ERRORE: yt-dlp non è installato. Esegui: pip install yt-dlp")
     sys.exit(1)
 
@@ -48,6 +50,7 @@ class YouTubeDownloaderGUI:
         self.subtitles_var = tk.BooleanVar(value=False)
         self.playlist_var = tk.BooleanVar(value=False)
         self.is_downloading = False
+        self.progress_tracker = ProgressTracker()
 
         # Crea UI
         self.create_widgets()
@@ -276,23 +279,13 @@ class YouTubeDownloaderGUI:
         """Hook per aggiornare la progress bar"""
         if d['status'] == 'downloading':
             try:
-                # Rimuovi colori ANSI e caratteri speciali
-                percent_str = d.get('_percent_str', '0%').strip()
-                percent_str = percent_str.replace('\x1b[0;94m', '').replace('\x1b[0m', '')
-                percent = float(percent_str.replace('%', ''))
-
-                self.progress_var.set(percent)
-
-                downloaded = d.get('_downloaded_bytes_str', 'N/A')
-                total = d.get('_total_bytes_str', 'N/A')
-                speed = d.get('_speed_str', 'N/A')
-                eta = d.get('_eta_str', 'N/A')
-
-                status = f"⬇️ Download: {percent:.1f}% - {downloaded}/{total} - Velocità: {speed} - ETA: {eta}"
-                self.status_label.config(text=status)
+                self.progress_tracker.update(ProgressEvent.from_hook(d))
+                self.progress_var.set(self.progress_tracker.percent)
+                self.status_label.config(text=self.progress_tracker.summary())
             except:
                 pass
         elif d['status'] == 'finished':
+            self.progress_tracker.update(ProgressEvent.from_hook(d))
             self.progress_var.set(100)
             self.status_label.config(text="✅ Download completato, elaborazione in corso...")
 
@@ -364,6 +357,8 @@ class YouTubeDownloaderGUI:
         # Playlist
         if self.playlist_var.get():
             ydl_opts['noplaylist'] = False
+            # Elementi elaborati man mano che arrivano, senza l'elenco completo
+            ydl_opts['lazy_playlist'] = True
             self.log("📑 Modalità Playlist: Attiva", 'info')
         else:
             ydl_opts['noplaylist'] = True
@@ -372,22 +367,19 @@ class YouTubeDownloaderGUI:
             self.log(f"🔗 URL: {url}", 'info')
             self.log("🚀 Inizio download...", 'info')
 
+            import yt_dlp
+
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Ottieni info
-                info = ydl.extract_info(url, download=False)
-
-                if 'entries' in info:
-                    # È una playlist
-                    video_count = len(info['entries'])
-                    self.log(f"📑 Playlist rilevata: {video_count} video", 'info')
-                    self.log(f"📺 Titolo playlist: {info.get('title', 'N/A')}", 'info')
+                if self.playlist_var.get():
+                    self.download_playlist(ydl, url)
                 else:
-                    # Video singolo
+                    # Ottieni info
+                    info = ydl.extract_info(url, download=False)
                     self.log(f"📺 Titolo: {info.get('title', 'N/A')}", 'info')
-                    self.log(f"⏱️ Durata: {info.get('duration', 0) // 60} minuti", 'info')
+                    self.log(f"⏱️ Durata: {(info.get('duration') or 0) // 60} minuti", 'info')
 
-                # Download
-                ydl.download([url])
+                    # Download con le info già estratte (nessuna seconda estrazione)
+                    ydl.process_ie_result(info, download=True)
 
             self.log("✅ DOWNLOAD COMPLETATO CON SUCCESSO!", 'success')
             self.log(f"📁 File salvato in: {output_path}", 'success')
@@ -407,6 +399,55 @@ class YouTubeDownloaderGUI:
             self.is_downloading = False
             self.download_btn.config(state=tk.NORMAL, text="⬇️ SCARICA VIDEO")
 
+    def download_playlist(self, ydl, url):
+        """Scarica una playlist un elemento alla volta.
+
+        L'elenco viene letto senza risolvere gli elementi (process=False):
+        `entries` è un generatore, e ogni video viene estratto solo quando
+        tocca a lui. La memoria resta costante e il primo download parte
+        subito anche per canali con migliaia di video.
+        """
+        info = ydl.extract_info(url, download=False, process=False)
+
+        if info.get('_type') not in ('playlist', 'multi_video'):
+            # Non è una playlist: elaborazione normale
+            ydl.process_ie_result(info, download=True)
+            return
+
+        self.log(f"📺 Titolo playlist: {info.get('title', 'N/A')}", 'info')
+
+        # Campi della playlist che yt-dlp aggiunge a ogni elemento quando
+        # elabora la playlist intera (template di output, metadati)
+        playlist_info = {
+            'playlist': info.get('title') or info.get('id'),
+            'playlist_id': info.get('id'),
+            'playlist_title': info.get('title'),
+            'playlist_uploader': info.get('uploader'),
+            'playlist_uploader_id': info.get('uploader_id'),
+            'playlist_channel': info.get('channel'),
+            'playlist_channel_id': info.get('channel_id'),
+            'playlist_webpage_url': info.get('webpage_url'),
+            'playlist_count': info.get('playlist_count'),
+            'n_entries': info.get('playlist_count'),
+        }
+
+        downloaded = failed = 0
+        for index, entry in enumerate(info.get('entries') or [], start=1):
+            if not entry:
+                continue
+            self.log(f"📑 Video {index}: {entry.get('title') or entry.get('url', 'N/A')}", 'info')
+            self.progress_tracker = ProgressTracker()
+            try:
+                ydl.process_ie_result(entry, download=True, extra_info={
+                    **playlist_info, 'playlist_index': index, 'playlist_autonumber': index})
+                downloaded += 1
+            except Exception as e:
+                # Un elemento fallito non blocca il resto della playlist
+                failed += 1
+                self.log(f"⚠️ Errore video {index}: {e}", 'error')
+
+        self.log(f"📑 Playlist: {downloaded} video scaricati, {failed} errori", 'info')
+
     def start_download(self):
         """Avvia il download in un thread separato"""
         if self.is_downloading:
@@ -415,6 +456,7 @@ class YouTubeDownloaderGUI:
         self.is_downloading = True
         self.download_btn.config(state=tk.DISABLED, text="⏳ Download in corso...")
         self.progress_var.set(0)
+        self.progress_tracker = ProgressTracker()
 
         # Avvia download in thread separato
         thread = threading.Thread(target=self.download_video, daemon=True)
@@ -6,220 +6,423 @@ Applicazione avanzata con Knowledge Base ricercabile e Visual Summary
 FIX CRITICO: Download HD funzionante con subprocess + remote_components
 """
 
+import time
+
+# Inizio del caricamento del modulo, riferimento per i tempi di avvio
+STARTUP_T0 = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import os
 import sys
 import threading
-import sqlite3
 from pathlib import Path
-import json
 from datetime import datetime
-import re
-from PIL import Image, ImageTk
+import json
+import importlib.util
 import subprocess
-
-try:
-    import yt_dlp
-except ImportError:
+import webbrowser
+import hashlib
+from collections import deque, OrderedDict
+from youtube_bandwidth import BandwidthGovernor, parse_rate, parse_schedule
+from youtube_core import (DEFAULT_DB_PATH, DEFAULT_LIBRARY_DIR, DatabaseManager,
+                          DownloadArchive, DownloadJob, DownloadPipeline, DownloadQueue,
+                          FrameExtractor, JobStore, ScreenshotQueue, StageTimer,
+                          percentile)
+from youtube_profiling import PROFILE_ENV, Profiler
+from youtube_subtitles import format_timestamp
+
+# Solo verifica: il download usa l'eseguibile yt-dlp, importare il modulo
+# (centinaia di extractor) rallenterebbe l'avvio senza servire a nulla
+if importlib.util.find_spec('yt_dlp') is None:
     print("ERRORE: yt-dlp non è installato. Esegui: pip install yt-dlp")
     sys.exit(1)
 
 
-class DatabaseManager:
-    """Gestisce il database SQLite per metadati e trascrizioni"""
-
-    def __init__(self, db_path):
-        self.db_path = db_path
-        self.init_database()
-
-    def init_database(self):
-        """Inizializza il database con le tabelle necessarie"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # Tabella video
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS videos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                video_id TEXT UNIQUE NOT NULL,
-                title TEXT NOT NULL,
-                channel TEXT,
-                duration INTEGER,
-                upload_date TEXT,
-                description TEXT,
-                thumbnail_path TEXT,
-                file_path TEXT,
-                download_date TEXT,
-                file_size INTEGER,
-                format TEXT
-            )
-        ''')
-
-        # Tabella trascrizioni
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transcripts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                video_id TEXT NOT NULL,
-                language TEXT,
-                transcript_text TEXT,
-                FOREIGN KEY (video_id) REFERENCES videos(video_id)
-            )
-        ''')
-
-        # Tabella screenshot
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS screenshots (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                video_id TEXT NOT NULL,
-                timestamp REAL,
-                screenshot_path TEXT,
-                FOREIGN KEY (video_id) REFERENCES videos(video_id)
-            )
-        ''')
-
-        # Indice per ricerca full-text
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_transcript_search
-            ON transcripts(transcript_text)
-        ''')
-
-        conn.commit()
-        conn.close()
-
-    def add_video(self, video_data):
-        """Aggiunge un video al database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+class ThumbnailCache:
+    """Cache delle miniature: varianti ridimensionate su disco e LRU in memoria.
+
+    Le varianti vengono generate una sola volta (di norma all'ingest) in file
+    PNG identificati da percorso e mtime del sorgente, quindi un file
+    modificato produce automaticamente una nuova miniatura. In memoria resta
+    un LRU di PhotoImage limitato da un budget in byte.
+    """
+
+    LIBRARY_SIZE = (120, 90)
+    SCREENSHOT_SIZE = (300, 200)
+
+    def __init__(self, cache_dir, memory_budget=64 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.memory_budget = memory_budget
+        self._photos = OrderedDict()
+        self._memory_used = 0
+
+    def cache_path(self, source, size):
+        """Percorso su disco della variante `size` del file sorgente"""
+        mtime = os.stat(source).st_mtime_ns
+        key = hashlib.sha1(f"{os.path.abspath(source)}|{mtime}".encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{key}_{size[0]}x{size[1]}.png"
+
+    def ensure(self, source, size):
+        """Genera la variante su disco se manca e ne ritorna il percorso"""
+        path = self.cache_path(source, size)
+        if not path.exists():
+            # PIL viene caricato solo quando serve generare una miniatura
+            from PIL import Image
+
+            with Image.open(source) as img:
+                img = img.convert('RGB').resize(size, Image.Resampling.LANCZOS)
+                # Scrittura atomica: più thread possono generare la stessa variante
+                tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+                img.save(tmp_path, 'PNG')
+            os.replace(tmp_path, path)
+        return path
+
+    def precompute(self, source, sizes):
+        """Genera in anticipo le varianti richieste (chiamabile da qualsiasi thread)"""
+        for size in sizes:
+            try:
+                self.ensure(source, size)
+            except Exception as e:
+                print(f"Errore generazione miniatura {source}: {e}")
 
+    def get_photo(self, source, size):
+        """PhotoImage della miniatura, o None se non disponibile (solo thread Tk)"""
         try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO videos
-                (video_id, title, channel, duration, upload_date, description,
-                 thumbnail_path, file_path, download_date, file_size, format)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                video_data.get('id'),
-                video_data.get('title'),
-                video_data.get('uploader'),
-                video_data.get('duration'),
-                video_data.get('upload_date'),
-                video_data.get('description'),
-                video_data.get('thumbnail_path'),
-                video_data.get('file_path'),
-                datetime.now().isoformat(),
-                video_data.get('file_size'),
-                video_data.get('format')
-            ))
-            conn.commit()
-            return True
+            key = str(self.ensure(source, size))
         except Exception as e:
-            print(f"Errore inserimento video: {e}")
-            return False
-        finally:
-            conn.close()
+            print(f"Errore miniatura {source}: {e}")
+            return None
+
+        photo = self._photos.get(key)
+        if photo is not None:
+            self._photos.move_to_end(key)
+            return photo
+
+        # Il PNG già ridimensionato viene caricato da Tk senza passare da PIL
+        photo = tk.PhotoImage(file=key)
+        self._photos[key] = photo
+        self._memory_used += photo.width() * photo.height() * 4
+
+        while self._memory_used > self.memory_budget and len(self._photos) > 1:
+            _, old = self._photos.popitem(last=False)
+            self._memory_used -= old.width() * old.height() * 4
+
+        return photo
+
+
+class VirtualVideoList(tk.Frame):
+    """Lista video virtualizzata per la Libreria.
+
+    Crea solo le card visibili e le ricicla durante lo scroll; le righe
+    arrivano dal database a pagine (paginazione keyset) tenute in una piccola
+    cache, quindi il costo non dipende dal numero di video.
+    """
+
+    ROW_HEIGHT = 130
+    PAGE_SIZE = 50
+    MAX_CACHED_PAGES = 20
+    WHEEL_SEQUENCES = ('<MouseWheel>', '<Button-4>', '<Button-5>')
+
+    def __init__(self, parent, app, total):
+        super().__init__(parent, bg=app.bg_color)
+        self.app = app
+        self.db = app.db
+        self.total = total
+        self.top = 0
+        self.visible_rows = 0
+        self.cards = []
+        self._pages = OrderedDict()
+
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.viewport = tk.Frame(self, bg=app.bg_color)
+        self.viewport.pack(side="left", fill="both", expand=True)
+        self.viewport.bind('<Configure>', self.on_resize)
+
+        for sequence in self.WHEEL_SEQUENCES:
+            self.bind_all(sequence, self.on_mousewheel, add='+')
+        self.bind('<Destroy>', self.on_destroy)
+
+    def on_destroy(self, event):
+        if event.widget is self:
+            for sequence in self.WHEEL_SEQUENCES:
+                self.unbind_all(sequence)
+
+    def on_resize(self, event):
+        """Adegua il numero di card al numero di righe visibili"""
+        rows = max(1, event.height // self.ROW_HEIGHT + 1)
+        while len(self.cards) < rows:
+            self.cards.append(self.app.create_video_card(self.viewport))
+        while len(self.cards) > rows:
+            self.cards.pop()['frame'].destroy()
+
+        self.visible_rows = rows
+        self.scroll_to(self.top, force=True)
+
+    def on_scrollbar(self, *args):
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * self.total))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            if args[2] == 'pages':
+                step *= max(1, self.visible_rows - 1)
+            self.scroll_to(self.top + step)
+
+    def on_mousewheel(self, event):
+        # bind_all: reagisce solo se il puntatore è sopra la lista
+        widget = self.winfo_containing(event.x_root, event.y_root)
+        if widget is None or not str(widget).startswith(str(self)):
+            return
 
-    def add_transcript(self, video_id, language, text):
-        """Aggiunge una trascrizione"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.top - 3)
+        else:
+            self.scroll_to(self.top + 3)
+
+    def scroll_to(self, index, force=False):
+        """Mostra le righe a partire da `index`"""
+        # L'ultima card può essere tagliata: permette di vedere l'ultima riga intera
+        max_top = max(0, self.total - self.visible_rows + 1)
+        index = max(0, min(index, max_top))
+        if index == self.top and not force:
+            return
 
-        try:
-            cursor.execute('''
-                INSERT INTO transcripts (video_id, language, transcript_text)
-                VALUES (?, ?, ?)
-            ''', (video_id, language, text))
-            conn.commit()
-            return True
-        except Exception as e:
-            print(f"Errore inserimento trascrizione: {e}")
-            return False
-        finally:
-            conn.close()
+        self.top = index
+        self.render()
+
+    def render(self):
+        """Ricollega le card del pool alle righe visibili"""
+        for position, card in enumerate(self.cards):
+            row = self.get_row(self.top + position)
+            if row is None:
+                card['frame'].place_forget()
+                continue
+
+            self.app.bind_video_card(card, row)
+            card['frame'].place(x=10, y=position * self.ROW_HEIGHT,
+                                relwidth=1, width=-20,
+                                height=self.ROW_HEIGHT - 10)
+
+        if self.total:
+            first = self.top / self.total
+            last = min(1.0, (self.top + self.visible_rows) / self.total)
+            self.scrollbar.set(first, last)
+
+    def get_row(self, index):
+        """Riga in posizione `index`, o None se fuori dalla lista"""
+        if index >= self.total:
+            return None
+
+        page = self.load_page(index // self.PAGE_SIZE)
+        offset = index % self.PAGE_SIZE
+        return page[offset] if offset < len(page) else None
+
+    def load_page(self, page_no):
+        """Pagina dalla cache o dal database"""
+        page = self._pages.get(page_no)
+        if page is not None:
+            self._pages.move_to_end(page_no)
+            return page
+
+        if page_no == 0:
+            after = None
+        elif page_no - 1 in self._pages and self._pages[page_no - 1]:
+            # Scroll sequenziale: la chiave arriva dalla pagina precedente
+            last = self._pages[page_no - 1][-1]
+            after = (last[5], last[0])
+        else:
+            after = self.db.get_video_key_at(page_no * self.PAGE_SIZE - 1)
+            if after is None:
+                return []
 
-    def add_screenshot(self, video_id, timestamp, path):
-        """Aggiunge uno screenshot"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        page = self.db.get_videos_page(after, self.PAGE_SIZE)
+        self._pages[page_no] = page
+        while len(self._pages) > self.MAX_CACHED_PAGES:
+            self._pages.popitem(last=False)
+        return page
 
-        try:
-            cursor.execute('''
-                INSERT INTO screenshots (video_id, timestamp, screenshot_path)
-                VALUES (?, ?, ?)
-            ''', (video_id, timestamp, path))
-            conn.commit()
-            return True
-        except Exception as e:
-            print(f"Errore inserimento screenshot: {e}")
-            return False
-        finally:
-            conn.close()
 
-    def search_transcripts(self, query):
-        """Ricerca nelle trascrizioni"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+class LogBuffer:
+    """Storico del log: ultime righe in un ring buffer e storico completo su file.
 
-        try:
-            cursor.execute('''
-                SELECT DISTINCT v.video_id, v.title, v.channel, v.thumbnail_path,
-                       v.file_path, t.transcript_text, t.language
-                FROM videos v
-                JOIN transcripts t ON v.video_id = t.video_id
-                WHERE t.transcript_text LIKE ?
-                ORDER BY v.download_date DESC
-            ''', (f'%{query}%',))
-
-            results = cursor.fetchall()
-            return results
-        except Exception as e:
-            print(f"Errore ricerca: {e}")
-            return []
-        finally:
-            conn.close()
+    Le righe arrivano da qualsiasi thread. Il widget di log mostra solo le
+    ultime `max_lines` righe e riceve quelle nuove a blocchi (take_pending);
+    lo storico completo della sessione resta nel file di spill.
+    """
 
-    def get_all_videos(self):
-        """Ottiene tutti i video"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    MAX_LINES = 2000
+    KEEP_SESSIONS = 10
 
-        try:
-            cursor.execute('''
-                SELECT video_id, title, channel, thumbnail_path, file_path,
-                       download_date, format
-                FROM videos
-                ORDER BY download_date DESC
-            ''')
-            return cursor.fetchall()
-        except Exception as e:
-            print(f"Errore recupero video: {e}")
-            return []
-        finally:
-            conn.close()
+    def __init__(self, spill_dir, max_lines=MAX_LINES):
+        self.max_lines = max_lines
+        self._lock = threading.Lock()
+        self._lines = deque(maxlen=max_lines)
+        self._pending = deque(maxlen=max_lines)
 
-    def get_video_screenshots(self, video_id):
-        """Ottiene gli screenshot di un video"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        spill_dir = Path(spill_dir)
+        self._spill = None
+        try:
+            spill_dir.mkdir(parents=True, exist_ok=True)
+            self._cleanup_sessions(spill_dir)
+            self.spill_path = spill_dir / f"session_{datetime.now():%Y%m%d_%H%M%S}_{os.getpid()}.log"
+            self._spill = open(self.spill_path, 'a', encoding='utf-8')
+        except OSError as e:
+            print(f"Log su file non disponibile: {e}")
+
+    def _cleanup_sessions(self, spill_dir):
+        """Mantiene solo i file delle sessioni più recenti"""
+        sessions = sorted(spill_dir.glob('session_*.log'))
+        for old in sessions[:max(0, len(sessions) - self.KEEP_SESSIONS + 1)]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
 
+    def append(self, line, tag):
+        with self._lock:
+            self._lines.append((line, tag))
+            self._pending.append((line, tag))
+            if self._spill:
+                try:
+                    self._spill.write(line)
+                except OSError:
+                    pass
+
+    def take_pending(self):
+        """Righe arrivate dall'ultimo prelievo (al massimo max_lines)"""
+        with self._lock:
+            lines = list(self._pending)
+            self._pending.clear()
+            return lines
+
+    def snapshot(self):
+        """Ultime righe, per ripopolare un widget appena creato"""
+        with self._lock:
+            self._pending.clear()
+            return list(self._lines)
+
+    def read_all(self):
+        """Storico completo della sessione"""
+        with self._lock:
+            if self._spill:
+                try:
+                    self._spill.flush()
+                    with open(self.spill_path, 'r', encoding='utf-8') as f:
+                        return f.read()
+                except OSError:
+                    pass
+            return ''.join(line for line, _ in self._lines)
+
+    def close(self):
+        with self._lock:
+            if self._spill:
+                self._spill.close()
+                self._spill = None
+
+
+class UIUpdateBus:
+    """Canale thread-safe tra i thread worker e il thread Tk.
+
+    I worker pubblicano aggiornamenti senza mai toccare i widget né
+    attendere il disegno; il thread Tk li applica tutti insieme a ogni tick
+    di root.after. Gli aggiornamenti pubblicati con post_latest vengono
+    fusi per chiave, così ogni tick applica solo l'ultimo stato di un job.
+    Un callback può aprire un dialogo modale: i tick continuano nel suo
+    ciclo di eventi e la UI resta aggiornata finché è aperto.
+    """
+
+    def __init__(self, root, interval_ms=100):
+        self.root = root
+        self.interval_ms = interval_ms
+        self._lock = threading.Lock()
+        self._events = deque()
+        self._latest = OrderedDict()
+
+    def start(self):
+        """Avvia il ciclo di aggiornamento (dal thread Tk)"""
+        self.root.after(self.interval_ms, self._tick)
+
+    def post(self, callback, *args):
+        """Esegue callback(*args) nel thread Tk al prossimo tick, in ordine"""
+        with self._lock:
+            self._events.append((callback, args))
+
+    def post_latest(self, key, callback, *args):
+        """Come post, ma per ogni chiave si esegue solo l'ultima richiesta del tick"""
+        with self._lock:
+            self._latest.pop(key, None)
+            self._latest[key] = (callback, args)
+
+    def _tick(self):
+        # Riarmato prima dei callback: un dialogo modale non ferma il ciclo
+        self.root.after(self.interval_ms, self._tick)
+
+        with self._lock:
+            self._events.extend(self._latest.values())
+            self._latest = OrderedDict()
+            count = len(self._events)
+
+        # Un evento alla volta dalla coda condivisa: i tick annidati (durante
+        # un dialogo) proseguono in ordine da dove si è fermato questo
+        for _ in range(count):
+            with self._lock:
+                if not self._events:
+                    break
+                callback, args = self._events.popleft()
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Errore aggiornamento UI: {e}")
+
+
+class StartupTimer:
+    """Tempi delle fasi di avvio, dal caricamento del modulo alla prima finestra"""
+
+    def __init__(self, start=None):
+        self.start = start if start is not None else time.perf_counter()
+        self._last = self.start
+        self.phases = []
+
+    def mark(self, phase):
+        """Chiude la fase in corso registrandone la durata"""
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self._last) * 1000))
+        self._last = now
+
+    @property
+    def total_ms(self):
+        return (self._last - self.start) * 1000
+
+    def summary(self):
+        phases = ", ".join(f"{name} {ms:.0f}" for name, ms in self.phases)
+        return f"⏱️ Avvio in {self.total_ms:.0f} ms ({phases})"
+
+    def save(self, path):
+        """Aggiunge una riga JSON allo storico degli avvii"""
+        record = {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'total_ms': round(self.total_ms, 1),
+            'phases': {name: round(ms, 1) for name, ms in self.phases}
+        }
         try:
-            cursor.execute('''
-                SELECT timestamp, screenshot_path
-                FROM screenshots
-                WHERE video_id = ?
-                ORDER BY timestamp
-            ''', (video_id,))
-            return cursor.fetchall()
-        except Exception as e:
-            print(f"Errore recupero screenshot: {e}")
-            return []
-        finally:
-            conn.close()
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+        except OSError as e:
+            print(f"Impossibile salvare i tempi di avvio: {e}")
 
 
 class YouTubeDownloaderGUI:
-    def __init__(self, root):
+    # Cue trovati mostrati per ogni video nei risultati di ricerca
+    SEARCH_CUES_PER_VIDEO = 5
+    # Job considerati nei tempi per fase delle Impostazioni
+    METRICS_JOBS = 50
+
+    def __init__(self, root, startup=None):
         self.root = root
+        self.startup = startup or StartupTimer()
         self.root.title("🎬 YouTube Downloader Premium v2.1.2")
         self.root.geometry("1200x800")
         self.root.resizable(True, True)
@@ -236,33 +439,133 @@ class YouTubeDownloaderGUI:
         self.card_hover = "#45475a"
 
         # Database
-        db_path = Path.home() / "Downloads" / "YouTube" / "youtube_library.db"
+        db_path = DEFAULT_DB_PATH
         db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.db = DatabaseManager(str(db_path))
+        # Lo schema viene creato in background (vedi init_database_thread)
+        self.db = DatabaseManager(str(db_path), initialize=False)
+        # Video già scaricati (caricato in background insieme al database)
+        self.archive = DownloadArchive(self.db, db_path.parent / "download_archive.txt")
+        # Coda persistente: i job non terminati riprendono al prossimo avvio
+        self.store = JobStore(self.db)
 
         # Variabili
-        self.download_path = tk.StringVar(value=str(Path.home() / "Downloads" / "YouTube"))
+        self.download_path = tk.StringVar(value=str(DEFAULT_LIBRARY_DIR))
         self.url_var = tk.StringVar()
         self.quality_var = tk.StringVar(value="best")
         self.format_var = tk.StringVar(value="video")
         self.subtitles_var = tk.BooleanVar(value=True)  # Sempre attivi per Knowledge Base
         self.playlist_var = tk.BooleanVar(value=False)
         self.auto_summary_var = tk.BooleanVar(value=True)
-        self.is_downloading = False
+        self.skip_known_var = tk.BooleanVar(value=True)
+        self.max_workers_var = tk.IntVar(value=4)
+        self.rate_limit_var = tk.StringVar(value="")
+        self.rate_schedule_var = tk.StringVar(value="")
+        self.screenshots_paused_var = tk.BooleanVar(value=False)
+        self.pause_screenshots_busy_var = tk.BooleanVar(value=False)
         self.current_section = "download"
 
-        # Cache per immagini
-        self.image_cache = {}
+        # Aggiornamenti della UI provenienti dai thread worker
+        self.ui_bus = UIUpdateBus(self.root)
+        self.ui_bus.start()
+
+        # Log: ultime righe in memoria, storico completo su file
+        self.log_buffer = LogBuffer(db_path.parent / "logs")
+        self.logs_dir = db_path.parent / "logs"
+
+        # Cache miniature (su disco accanto al database + LRU in memoria)
+        self.thumbnails = ThumbnailCache(db_path.parent / "thumbnails")
+
+        # Download, ingest ed estrazione screenshot (condivisi con la CLI); i
+        # core vengono divisi tra i video in parallelo della coda screenshot e
+        # i segmenti ffmpeg di ciascun video
+        screenshot_workers = ScreenshotQueue.default_workers()
+        self.frame_extractor = FrameExtractor(
+            max(1, (os.cpu_count() or 1) // screenshot_workers))
+        # Limite di banda condiviso tra i download (vedi Impostazioni): può
+        # cambiare in ogni momento, quindi tutti i job passano dal proxy
+        self.governor = BandwidthGovernor(adjustable=True)
+        # Profilazione opzionale di download, ingest e screenshot (YTDL_PROFILE)
+        try:
+            self.profiler = Profiler.from_env(db_path.parent / "profiles", log=self.log)
+        except ValueError as e:
+            self.profiler = None
+            self.log(f"⚠️ {PROFILE_ENV} ignorata: {e}", 'error')
+        if self.profiler is not None:
+            self.log(f"🔬 Profilazione attiva ({', '.join(sorted(self.profiler.kinds))}): "
+                     f"{self.profiler.directory}", 'info')
+        self.pipeline = DownloadPipeline(self.db, log=self.log, on_update=self.update_job,
+                                         on_saved=self.on_videos_saved,
+                                         frame_extractor=self.frame_extractor,
+                                         archive=self.archive, submit=self.submit_job,
+                                         store=self.store, governor=self.governor,
+                                         profiler=self.profiler)
+
+        # Coda download con pool di worker
+        self.jobs = []
+        self.download_queue = DownloadQueue(self.pipeline.download_video,
+                                            self.max_workers_var.get())
+        # Visual Summary in un pool limitato ai core, non un thread per video
+        self.screenshot_queue = ScreenshotQueue(self.extract_screenshots_thread,
+                                                screenshot_workers,
+                                                busy=self.downloads_active,
+                                                on_change=self.update_screenshot_status)
+
+        # Schema, archivio e job da riprendere: avviato solo ora perché
+        # resume_jobs usa pipeline e code appena create
+        threading.Thread(target=self.init_database_thread, daemon=True).start()
+
+        self.startup.mark('init')
 
         # Configura stile
         self.setup_styles()
+        self.startup.mark('stili')
 
         # Crea UI principale
         self.create_main_layout()
+        self.startup.mark('layout')
+
+        # Il report dei tempi parte quando la finestra compare
+        self.root.bind('<Map>', self.on_first_map, add='+')
 
         # Crea directory di default
         os.makedirs(self.download_path.get(), exist_ok=True)
 
+        self.log("✨ YouTube Downloader Premium v2.1.2 pronto!", 'success')
+        self.log("🎬 FIX: Download HD/720p/1080p ora funzionante!", 'info')
+
+    def init_database_thread(self):
+        """Crea lo schema del database fuori dal thread Tk"""
+        start = time.perf_counter()
+        try:
+            self.db.init_database()
+        except Exception as e:
+            self.log(f"❌ Errore inizializzazione database: {e}", 'error')
+            return
+        self.log(f"🗄️ Database pronto in {(time.perf_counter() - start) * 1000:.0f} ms", 'info')
+
+        # Id dei video noti in memoria prima del primo download
+        self.archive.load()
+
+        # Job rimasti dalla sessione precedente; poi, a ogni rinnovo dei
+        # lease, quelli di sessioni terminate senza chiudere (crash)
+        self.resume_jobs()
+        self.store.start(on_expired=self.resume_jobs)
+
+    def resume_jobs(self):
+        """Riprende i job non terminati delle sessioni precedenti"""
+        jobs = self.pipeline.resume(register=self.register_job)
+        if jobs:
+            self.log(f"▶️ Job ripresi dalla sessione precedente: {len(jobs)}", 'info')
+
+    def on_first_map(self, event):
+        """Registra il tempo fino alla prima finestra visibile"""
+        # Il binding sulla root riceve anche il <Map> dei widget figli
+        if event.widget is not self.root or self.startup.phases[-1][0] == 'finestra':
+            return
+        self.startup.mark('finestra')
+        self.log(self.startup.summary(), 'info')
+        self.startup.save(self.logs_dir / "startup.jsonl")
+
     def setup_styles(self):
         """Configura gli stili ttk"""
         style = ttk.Style()
@@ -326,6 +629,22 @@ class YouTubeDownloaderGUI:
                        borderwidth=0,
                        thickness=20)
 
+        # Treeview style (coda download)
+        style.configure('Jobs.Treeview',
+                       background=self.bg_color,
+                       fieldbackground=self.bg_color,
+                       foreground=self.fg_color,
+                       font=('Segoe UI', 9),
+                       borderwidth=0,
+                       rowheight=24)
+        style.configure('Jobs.Treeview.Heading',
+                       background=self.frame_color,
+                       foreground=self.accent_color,
+                       font=('Segoe UI', 9, 'bold'),
+                       borderwidth=0)
+        style.map('Jobs.Treeview',
+                 background=[('selected', self.card_hover)])
+
     def create_main_layout(self):
         """Crea il layout principale con sidebar"""
         # Container principale
@@ -496,6 +815,24 @@ class YouTubeDownloaderGUI:
         ttk.Checkbutton(right_col, text="📸 Genera Visual Summary",
                        variable=self.auto_summary_var,
                        style='Custom.TCheckbutton').pack(anchor=tk.W, pady=2)
+        ttk.Checkbutton(right_col, text="⏭️ Salta video già in libreria",
+                       variable=self.skip_known_var,
+                       style='Custom.TCheckbutton').pack(anchor=tk.W, pady=2)
+
+        workers_frame = tk.Frame(right_col, bg=self.frame_color)
+        workers_frame.pack(anchor=tk.W, pady=(10, 2))
+
+        tk.Label(workers_frame, text="🔀 Download paralleli:",
+                bg=self.frame_color, fg=self.fg_color,
+                font=('Segoe UI', 9)).pack(side=tk.LEFT, padx=(0, 10))
+
+        tk.Spinbox(workers_frame, from_=1, to=16, width=4,
+                  textvariable=self.max_workers_var,
+                  command=self.update_max_workers,
+                  font=('Segoe UI', 9),
+                  bg=self.bg_color, fg=self.fg_color,
+                  buttonbackground=self.frame_color,
+                  relief=tk.FLAT, bd=2).pack(side=tk.LEFT)
 
         # Directory
         dir_frame = ttk.Frame(self.content_area, style='Card.TFrame', padding="15")
@@ -522,7 +859,7 @@ class YouTubeDownloaderGUI:
         browse_btn.pack(side=tk.LEFT, padx=(10, 0))
 
         # Pulsante Download
-        self.download_btn = tk.Button(self.content_area, text="⬇️ SCARICA VIDEO",
+        self.download_btn = tk.Button(self.content_area, text="⬇️ AGGIUNGI ALLA CODA",
                                      command=self.start_download,
                                      bg=self.button_color, fg='#1e1e2e',
                                      font=('Segoe UI', 12, 'bold'),
@@ -541,6 +878,46 @@ class YouTubeDownloaderGUI:
                                      style='Custom.TLabel', font=('Segoe UI', 9))
         self.status_label.pack(anchor=tk.W, pady=(0, 10))
 
+        # Coda download
+        jobs_frame = ttk.Frame(self.content_area, style='Card.TFrame', padding="15")
+        jobs_frame.pack(fill=tk.X, pady=(0, 15))
+
+        jobs_header = tk.Frame(jobs_frame, bg=self.frame_color)
+        jobs_header.pack(fill=tk.X, pady=(0, 5))
+
+        ttk.Label(jobs_header, text="📦 Coda download:", style='Card.TLabel',
+                 font=('Segoe UI', 10, 'bold')).pack(side=tk.LEFT)
+
+        clear_jobs_btn = tk.Button(jobs_header, text="🧹 Rimuovi terminati",
+                                  command=self.clear_finished_jobs,
+                                  bg=self.frame_color, fg=self.accent_color,
+                                  font=('Segoe UI', 8, 'bold'),
+                                  relief=tk.FLAT, bd=0, padx=10, pady=2,
+                                  cursor='hand2')
+        clear_jobs_btn.pack(side=tk.RIGHT)
+
+        columns = ('id', 'url', 'state', 'progress', 'result')
+        # Colonna ad albero: gli elementi delle playlist stanno sotto il job padre
+        self.jobs_tree = ttk.Treeview(jobs_frame, columns=columns, show='tree headings',
+                                      height=5, style='Jobs.Treeview')
+        self.jobs_tree.column('#0', width=30, stretch=False)
+        headings = [
+            ('id', '#', 40),
+            ('url', 'URL', 320),
+            ('state', 'Stato', 90),
+            ('progress', 'Progresso', 80),
+            ('result', 'Risultato', 300)
+        ]
+        for col, text, width in headings:
+            self.jobs_tree.heading(col, text=text, anchor=tk.W)
+            self.jobs_tree.column(col, width=width, anchor=tk.W,
+                                  stretch=col in ('url', 'result'))
+        self.jobs_tree.pack(fill=tk.X)
+
+        for job in self.jobs:
+            self.refresh_job_row(job)
+        self.refresh_queue_status()
+
         # Log
         log_frame = ttk.Frame(self.content_area, style='Card.TFrame', padding="15")
         log_frame.pack(fill=tk.BOTH, expand=True)
@@ -572,8 +949,8 @@ class YouTubeDownloaderGUI:
         self.log_text.tag_config('success', foreground=self.success_color)
         self.log_text.tag_config('error', foreground=self.error_color)
 
-        self.log("✨ YouTube Downloader Premium v2.1.2 pronto!", 'success')
-        self.log("🎬 FIX: Download HD/720p/1080p ora funzionante!", 'info')
+        # Ripristina le ultime righe (il widget viene ricreato a ogni cambio sezione)
+        self.insert_log_lines(self.log_buffer.snapshot())
 
     def show_library_section(self):
         """Mostra la sezione libreria con ricerca"""
@@ -610,13 +987,26 @@ class YouTubeDownloaderGUI:
                               cursor='hand2')
         search_btn.pack(side=tk.LEFT, padx=(10, 0))
 
-        # Frame risultati (scrollable)
-        results_frame = ttk.Frame(self.content_area, style='Custom.TFrame')
-        results_frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(search_frame,
+                 text='💡 "frase esatta" per le frasi, parola* per i prefissi',
+                 style='Card.TLabel',
+                 font=('Segoe UI', 8)).pack(anchor=tk.W, pady=(8, 0))
+
+        # Frame risultati: lista virtualizzata oppure risultati di ricerca
+        self.results_frame = ttk.Frame(self.content_area, style='Custom.TFrame')
+        self.results_frame.pack(fill=tk.BOTH, expand=True)
+
+        # Mostra tutti i video inizialmente
+        self.display_all_videos()
+
+    def create_scrollable_results(self):
+        """Sostituisce il contenuto dei risultati con un'area scrollabile"""
+        for widget in self.results_frame.winfo_children():
+            widget.destroy()
 
         # Canvas per scroll
-        canvas = tk.Canvas(results_frame, bg=self.bg_color, highlightthickness=0)
-        scrollbar = ttk.Scrollbar(results_frame, orient="vertical", command=canvas.yview)
+        canvas = tk.Canvas(self.results_frame, bg=self.bg_color, highlightthickness=0)
+        scrollbar = ttk.Scrollbar(self.results_frame, orient="vertical", command=canvas.yview)
         self.results_container = ttk.Frame(canvas, style='Custom.TFrame')
 
         self.results_container.bind(
@@ -630,18 +1020,15 @@ class YouTubeDownloaderGUI:
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
 
-        # Mostra tutti i video inizialmente
-        self.display_all_videos()
-
     def display_all_videos(self):
-        """Mostra tutti i video nel database"""
-        for widget in self.results_container.winfo_children():
+        """Mostra tutti i video nel database (lista virtualizzata)"""
+        for widget in self.results_frame.winfo_children():
             widget.destroy()
 
-        videos = self.db.get_all_videos()
+        total = self.db.count_videos()
 
-        if not videos:
-            no_videos = ttk.Label(self.results_container,
+        if not total:
+            no_videos = ttk.Label(self.results_frame,
                                  text="📭 Nessun video nel database.\nScarica video con 'Salva in Knowledge Base' attivo!",
                                  style='Custom.TLabel',
                                  font=('Segoe UI', 12),
@@ -649,15 +1036,12 @@ class YouTubeDownloaderGUI:
             no_videos.pack(pady=50)
             return
 
-        for video in videos:
-            self.create_video_card(video)
-
-    def create_video_card(self, video_data):
-        """Crea una card per un video"""
-        video_id, title, channel, thumb_path, file_path, download_date, format_type = video_data
+        video_list = VirtualVideoList(self.results_frame, self, total)
+        video_list.pack(fill=tk.BOTH, expand=True)
 
-        card = tk.Frame(self.results_container, bg=self.frame_color, relief=tk.RAISED, bd=1)
-        card.pack(fill=tk.X, padx=10, pady=5)
+    def create_video_card(self, parent):
+        """Crea una card video riutilizzabile (vedi bind_video_card)"""
+        card = tk.Frame(parent, bg=self.frame_color, relief=tk.RAISED, bd=1)
 
         # Hover effect
         def on_enter(e):
@@ -671,40 +1055,29 @@ class YouTubeDownloaderGUI:
         inner = tk.Frame(card, bg=self.frame_color)
         inner.pack(fill=tk.BOTH, padx=15, pady=15)
 
-        # Thumbnail (se esiste)
-        if thumb_path and os.path.exists(thumb_path):
-            try:
-                img = Image.open(thumb_path)
-                img = img.resize((120, 90), Image.Resampling.LANCZOS)
-                photo = ImageTk.PhotoImage(img)
-                self.image_cache[video_id] = photo  # Mantieni riferimento
-
-                thumb_label = tk.Label(inner, image=photo, bg=self.frame_color)
-                thumb_label.pack(side=tk.LEFT, padx=(0, 15))
-            except:
-                pass
+        # Thumbnail (immagine vuota se il video non ne ha una)
+        blank = tk.PhotoImage(width=ThumbnailCache.LIBRARY_SIZE[0],
+                              height=ThumbnailCache.LIBRARY_SIZE[1])
+        thumb_label = tk.Label(inner, image=blank, bg=self.frame_color)
+        thumb_label.pack(side=tk.LEFT, padx=(0, 15))
 
         # Info
         info_frame = tk.Frame(inner, bg=self.frame_color)
         info_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
-        title_label = tk.Label(info_frame, text=title[:80] + ("..." if len(title) > 80 else ""),
-                              bg=self.frame_color, fg=self.accent_color,
+        title_label = tk.Label(info_frame, bg=self.frame_color, fg=self.accent_color,
                               font=('Segoe UI', 11, 'bold'), anchor='w')
         title_label.pack(fill=tk.X)
 
-        channel_label = tk.Label(info_frame, text=f"📺 {channel or 'N/A'}",
-                                bg=self.frame_color, fg=self.fg_color,
+        channel_label = tk.Label(info_frame, bg=self.frame_color, fg=self.fg_color,
                                 font=('Segoe UI', 9), anchor='w')
         channel_label.pack(fill=tk.X, pady=(2, 0))
 
-        date_label = tk.Label(info_frame, text=f"📅 Scaricato: {download_date[:10] if download_date else 'N/A'}",
-                             bg=self.frame_color, fg=self.fg_color,
+        date_label = tk.Label(info_frame, bg=self.frame_color, fg=self.fg_color,
                              font=('Segoe UI', 8), anchor='w')
         date_label.pack(fill=tk.X, pady=(2, 0))
 
-        format_label = tk.Label(info_frame, text=f"📄 {format_type or 'N/A'}",
-                               bg=self.frame_color, fg=self.fg_color,
+        format_label = tk.Label(info_frame, bg=self.frame_color, fg=self.fg_color,
                                font=('Segoe UI', 8), anchor='w')
         format_label.pack(fill=tk.X, pady=(2, 0))
 
@@ -712,37 +1085,76 @@ class YouTubeDownloaderGUI:
         actions_frame = tk.Frame(inner, bg=self.frame_color)
         actions_frame.pack(side=tk.RIGHT)
 
-        if file_path and os.path.exists(file_path):
-            open_btn = tk.Button(actions_frame, text="▶️ Apri",
-                                command=lambda: self.open_file(file_path),
-                                bg=self.button_color, fg='#1e1e2e',
-                                font=('Segoe UI', 8, 'bold'),
-                                relief=tk.FLAT, padx=10, pady=5,
-                                cursor='hand2')
-            open_btn.pack(pady=2)
+        open_btn = tk.Button(actions_frame, text="▶️ Apri",
+                            bg=self.button_color, fg='#1e1e2e',
+                            font=('Segoe UI', 8, 'bold'),
+                            relief=tk.FLAT, padx=10, pady=5,
+                            cursor='hand2')
 
         folder_btn = tk.Button(actions_frame, text="📂 Cartella",
-                              command=lambda: self.open_folder(file_path),
                               bg=self.frame_color, fg=self.fg_color,
                               font=('Segoe UI', 8, 'bold'),
                               relief=tk.FLAT, padx=10, pady=5,
                               cursor='hand2')
-        folder_btn.pack(pady=2)
+        folder_btn.pack(side=tk.BOTTOM, pady=2)
+
+        return {
+            'frame': card,
+            'blank': blank,
+            'thumb': thumb_label,
+            'title': title_label,
+            'channel': channel_label,
+            'date': date_label,
+            'format': format_label,
+            'open': open_btn,
+            'folder': folder_btn
+        }
+
+    def bind_video_card(self, card, video_data):
+        """Mostra un video in una card creata da create_video_card"""
+        video_id, title, channel, thumb_path, file_path, download_date, format_type = video_data
+
+        photo = None
+        if thumb_path and os.path.exists(thumb_path):
+            photo = self.thumbnails.get_photo(thumb_path, ThumbnailCache.LIBRARY_SIZE)
+        photo = photo or card['blank']
+        card['thumb'].config(image=photo)
+        card['thumb'].image = photo  # Mantieni riferimento anche se esce dall'LRU
+
+        card['title'].config(text=title[:80] + ("..." if len(title) > 80 else ""))
+        card['channel'].config(text=f"📺 {channel or 'N/A'}")
+        card['date'].config(text=f"📅 Scaricato: {download_date[:10] if download_date else 'N/A'}")
+        card['format'].config(text=f"📄 {format_type or 'N/A'}")
+
+        if file_path and os.path.exists(file_path):
+            card['open'].config(command=lambda: self.open_file(file_path))
+            card['open'].pack(side=tk.TOP, pady=2)
+        else:
+            card['open'].pack_forget()
+
+        card['folder'].config(command=lambda: self.open_folder(file_path))
 
     def perform_search(self):
         """Esegue la ricerca nel database"""
         query = self.search_var.get().strip()
 
-        for widget in self.results_container.winfo_children():
-            widget.destroy()
-
         if not query:
             self.display_all_videos()
             return
 
-        results = self.db.search_transcripts(query)
+        self.create_scrollable_results()
+
+        # Cue trovati, raggruppati per video nell'ordine di rilevanza
+        grouped = OrderedDict()
+        for hit in self.db.search_segments(query):
+            video_id, title, channel, thumb_path, file_path, _, start, _, text = hit
+            video_data = (video_id, title, channel, thumb_path, file_path, None, None)
+            grouped.setdefault(video_id, (video_data, []))[1].append((start, text))
 
-        if not results:
+        # Trascrizioni senza segmenti (video salvati prima) o frasi a cavallo di due cue
+        results = [r for r in self.db.search_transcripts(query) if r[0] not in grouped]
+
+        if not grouped and not results:
             no_results = ttk.Label(self.results_container,
                                   text=f"🔍 Nessun risultato per: '{query}'",
                                   style='Custom.TLabel',
@@ -750,15 +1162,25 @@ class YouTubeDownloaderGUI:
             no_results.pack(pady=50)
             return
 
+        for video_data, cues in grouped.values():
+            self.create_search_result_card(video_data, None, sorted(cues))
+
         for result in results:
             video_id, title, channel, thumb_path, file_path, transcript_text, language = result
+            # Con FTS5 il database restituisce già lo snippet
+            if not self.db.fts_enabled:
+                transcript_text = self.create_snippet(transcript_text, query)
             self.create_search_result_card(
                 (video_id, title, channel, thumb_path, file_path, None, None),
-                query, transcript_text
+                transcript_text
             )
 
-    def create_search_result_card(self, video_data, query, transcript_snippet):
-        """Crea una card per risultato di ricerca"""
+    def create_search_result_card(self, video_data, snippet, cues=None):
+        """Crea una card per risultato di ricerca.
+
+        `cues` è la lista di (inizio, testo) dei segmenti trovati: ognuno
+        diventa un link al punto del video; senza cue si mostra lo snippet.
+        """
         video_id, title, channel, thumb_path, file_path, _, _ = video_data
 
         card = tk.Frame(self.results_container, bg=self.frame_color, relief=tk.RAISED, bd=1)
@@ -769,16 +1191,11 @@ class YouTubeDownloaderGUI:
 
         # Thumbnail
         if thumb_path and os.path.exists(thumb_path):
-            try:
-                img = Image.open(thumb_path)
-                img = img.resize((120, 90), Image.Resampling.LANCZOS)
-                photo = ImageTk.PhotoImage(img)
-                self.image_cache[f"{video_id}_search"] = photo
-
+            photo = self.thumbnails.get_photo(thumb_path, ThumbnailCache.LIBRARY_SIZE)
+            if photo is not None:
                 thumb_label = tk.Label(inner, image=photo, bg=self.frame_color)
+                thumb_label.image = photo
                 thumb_label.pack(side=tk.LEFT, padx=(0, 15))
-            except:
-                pass
 
         # Info
         info_frame = tk.Frame(inner, bg=self.frame_color)
@@ -794,13 +1211,28 @@ class YouTubeDownloaderGUI:
                                 font=('Segoe UI', 9), anchor='w')
         channel_label.pack(fill=tk.X, pady=(2, 0))
 
-        # Snippet con query evidenziata
-        snippet = self.create_snippet(transcript_snippet, query)
-        snippet_label = tk.Label(info_frame, text=f"💬 ...{snippet}...",
-                                bg=self.frame_color, fg=self.success_color,
-                                font=('Segoe UI', 9, 'italic'), anchor='w',
-                                wraplength=500, justify=tk.LEFT)
-        snippet_label.pack(fill=tk.X, pady=(5, 0))
+        if cues:
+            # Punti del video in cui compare la ricerca
+            for start, text in cues[:self.SEARCH_CUES_PER_VIDEO]:
+                cue_label = tk.Label(info_frame, text=f"⏱️ {format_timestamp(start)}  {text}",
+                                     bg=self.frame_color, fg=self.success_color,
+                                     font=('Segoe UI', 9, 'italic'), anchor='w',
+                                     wraplength=500, justify=tk.LEFT, cursor='hand2')
+                cue_label.pack(fill=tk.X, pady=(5, 0))
+                cue_label.bind('<Button-1>',
+                               lambda e, s=start: self.open_at_time(video_id, s))
+
+            if len(cues) > self.SEARCH_CUES_PER_VIDEO:
+                tk.Label(info_frame, text=f"… altri {len(cues) - self.SEARCH_CUES_PER_VIDEO} punti",
+                         bg=self.frame_color, fg=self.fg_color,
+                         font=('Segoe UI', 8), anchor='w').pack(fill=tk.X, pady=(2, 0))
+        else:
+            # Snippet con query evidenziata
+            snippet_label = tk.Label(info_frame, text=f"💬 ...{snippet}...",
+                                    bg=self.frame_color, fg=self.success_color,
+                                    font=('Segoe UI', 9, 'italic'), anchor='w',
+                                    wraplength=500, justify=tk.LEFT)
+            snippet_label.pack(fill=tk.X, pady=(5, 0))
 
         # Bottoni
         actions_frame = tk.Frame(inner, bg=self.frame_color)
@@ -837,6 +1269,26 @@ class YouTubeDownloaderGUI:
                          style='SectionTitle.TLabel')
         title.pack(pady=(0, 20))
 
+        # Coda degli screenshot (anche quelli automatici dei download)
+        queue_frame = ttk.Frame(self.content_area, style='Card.TFrame', padding="15")
+        queue_frame.pack(fill=tk.X, pady=(0, 15))
+
+        self.screenshot_status_label = ttk.Label(queue_frame, text="", style='Card.TLabel')
+        self.screenshot_status_label.pack(anchor=tk.W, pady=(0, 5))
+
+        queue_options = tk.Frame(queue_frame, bg=self.frame_color)
+        queue_options.pack(fill=tk.X)
+        ttk.Checkbutton(queue_options, text="⏸️ In pausa",
+                       variable=self.screenshots_paused_var,
+                       command=self.toggle_screenshot_pause,
+                       style='Custom.TCheckbutton').pack(side=tk.LEFT, padx=(0, 20))
+        ttk.Checkbutton(queue_options, text="⬇️ Attendi la fine dei download",
+                       variable=self.pause_screenshots_busy_var,
+                       command=lambda: self.screenshot_queue.set_pause_when_busy(
+                           self.pause_screenshots_busy_var.get()),
+                       style='Custom.TCheckbutton').pack(side=tk.LEFT)
+        self.refresh_screenshot_status()
+
         # Selezione video
         select_frame = ttk.Frame(self.content_area, style='Card.TFrame', padding="15")
         select_frame.pack(fill=tk.X, pady=(0, 15))
@@ -911,6 +1363,10 @@ class YouTubeDownloaderGUI:
 
     def display_existing_screenshots(self, video_id):
         """Mostra screenshot esistenti per un video"""
+        # La sezione Summary potrebbe non essere più visibile
+        if not (hasattr(self, 'screenshots_container') and self.screenshots_container.winfo_exists()):
+            return
+
         for widget in self.screenshots_container.winfo_children():
             widget.destroy()
 
@@ -941,12 +1397,12 @@ class YouTubeDownloaderGUI:
         card.pack(side=tk.LEFT, padx=10)
 
         try:
-            img = Image.open(path)
-            img = img.resize((300, 200), Image.Resampling.LANCZOS)
-            photo = ImageTk.PhotoImage(img)
-            self.image_cache[path] = photo
+            photo = self.thumbnails.get_photo(path, ThumbnailCache.SCREENSHOT_SIZE)
+            if photo is None:
+                return
 
             img_label = tk.Label(card, image=photo, bg=self.frame_color)
+            img_label.image = photo
             img_label.pack(padx=5, pady=5)
 
             # Timestamp
@@ -977,68 +1433,45 @@ class YouTubeDownloaderGUI:
         file_path = video_data[4]
         interval = int(self.interval_var.get())
 
-        # Genera in thread separato
-        thread = threading.Thread(
-            target=self.extract_screenshots_thread,
-            args=(video_id, file_path, interval),
-            daemon=True
-        )
-        thread.start()
+        # Le richieste manuali passano davanti a quelle automatiche
+        if not self.screenshot_queue.submit(video_id, file_path, interval,
+                                            self.download_path.get(), notify=True,
+                                            priority=ScreenshotQueue.MANUAL):
+            messagebox.showinfo("In corso", "Screenshot di questo video già in generazione!")
+            return
+
+        messagebox.showinfo("Avviato", "Generazione screenshot in coda!\nAttendere...")
 
-        messagebox.showinfo("Avviato", "Generazione screenshot avviata!\nAttendere...")
+    def extract_screenshots_thread(self, video_id, video_path, interval, output_path,
+                                   job_id=None, notify=False):
+        """Estrae screenshot dal video usando ffmpeg (worker della coda screenshot).
 
-    def extract_screenshots_thread(self, video_id, video_path, interval):
-        """Estrae screenshot dal video usando ffmpeg"""
+        Con `notify` (richieste manuali) mostra griglia ed esito in un
+        dialogo; i Visual Summary automatici vanno solo nel log.
+        """
         try:
-            # Directory per screenshot
-            screenshots_dir = Path(self.download_path.get()) / "screenshots" / video_id
-            screenshots_dir.mkdir(parents=True, exist_ok=True)
-
-            # Ottieni durata video
-            probe_cmd = [
-                'ffprobe', '-v', 'error', '-show_entries',
-                'format=duration', '-of',
-                'default=noprint_wrappers=1:nokey=1',
-                video_path
-            ]
-
-            duration_output = subprocess.check_output(probe_cmd, stderr=subprocess.STDOUT)
-            duration = float(duration_output.strip())
-
-            # Genera screenshot
-            timestamps = []
-            current = 0
-            while current < duration:
-                timestamp = current
-                output_path = screenshots_dir / f"screenshot_{int(timestamp)}.jpg"
-
-                # Estrai frame
-                cmd = [
-                    'ffmpeg', '-ss', str(timestamp), '-i', video_path,
-                    '-vframes', '1', '-q:v', '2',
-                    str(output_path), '-y'
-                ]
-
-                subprocess.run(cmd, capture_output=True, check=True)
-
-                # Salva nel database
-                self.db.add_screenshot(video_id, timestamp, str(output_path))
-                timestamps.append((timestamp, str(output_path)))
-
-                current += interval
+            timestamps = self.pipeline.extract_screenshots(video_id, video_path,
+                                                           interval, output_path, job_id)
+
+            # Miniature per la griglia del Visual Summary
+            for _, screenshot_path in timestamps:
+                self.thumbnails.precompute(screenshot_path, [ThumbnailCache.SCREENSHOT_SIZE])
 
             # Aggiorna UI
-            self.root.after(0, lambda: self.display_existing_screenshots(video_id))
-            self.root.after(0, lambda: messagebox.showinfo(
-                "Completato",
-                f"Generati {len(timestamps)} screenshot!"
-            ))
+            if notify:
+                self.ui_bus.post(self.display_existing_screenshots, video_id)
+                self.ui_bus.post(messagebox.showinfo, "Completato",
+                                 f"Generati {len(timestamps)} screenshot!")
+            else:
+                self.log(f"📸 Visual Summary pronto: {video_id} ({len(timestamps)} screenshot)",
+                         'success')
 
         except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror(
-                "Errore",
-                f"Errore generazione screenshot:\n{str(e)}"
-            ))
+            if notify:
+                self.ui_bus.post(messagebox.showerror, "Errore",
+                                 f"Errore generazione screenshot:\n{str(e)}")
+            else:
+                self.log(f"⚠️ Errore generazione screenshot {video_id}: {e}", 'error')
 
     def show_settings_section(self):
         """Mostra la sezione impostazioni"""
@@ -1055,10 +1488,9 @@ class YouTubeDownloaderGUI:
                  style='Card.TLabel',
                  font=('Segoe UI', 12, 'bold')).pack(anchor=tk.W, pady=(0, 15))
 
-        videos = self.db.get_all_videos()
         stats_text = f"""
-        📹 Video nel database: {len(videos)}
-        📁 Percorso database: {Path.home() / 'Downloads' / 'YouTube' / 'youtube_library.db'}
+        📹 Video nel database: {self.db.count_videos()}
+        📁 Percorso database: {self.db.db_path}
         💾 Directory download: {self.download_path.get()}
         """
 
@@ -1067,6 +1499,56 @@ class YouTubeDownloaderGUI:
                               font=('Segoe UI', 10), justify=tk.LEFT)
         stats_label.pack(anchor=tk.W)
 
+        # Tempi per fase degli ultimi job
+        metrics_frame = ttk.Frame(self.content_area, style='Card.TFrame', padding="20")
+        metrics_frame.pack(fill=tk.X, pady=(0, 15))
+
+        ttk.Label(metrics_frame, text=f"⏱️ Tempi per fase (ultimi {self.METRICS_JOBS} job)",
+                 style='Card.TLabel',
+                 font=('Segoe UI', 12, 'bold')).pack(anchor=tk.W, pady=(0, 10))
+
+        tk.Label(metrics_frame, text=self.format_stage_metrics(),
+                bg=self.frame_color, fg=self.fg_color,
+                font=('Consolas', 9), justify=tk.LEFT).pack(anchor=tk.W)
+
+        # Limite di banda
+        bandwidth_frame = ttk.Frame(self.content_area, style='Card.TFrame', padding="20")
+        bandwidth_frame.pack(fill=tk.X, pady=(0, 15))
+
+        ttk.Label(bandwidth_frame, text="🚦 Limite di banda",
+                 style='Card.TLabel',
+                 font=('Segoe UI', 12, 'bold')).pack(anchor=tk.W, pady=(0, 10))
+
+        ttk.Label(bandwidth_frame,
+                 text="Diviso tra i download in corso; vale subito anche per quelli già "
+                      "avviati. Vuoto = illimitato.",
+                 style='Card.TLabel').pack(anchor=tk.W, pady=(0, 10))
+
+        for text, variable, hint in (
+            ("Limite:", self.rate_limit_var, "es. 2M, 500K"),
+            ("Fasce orarie:", self.rate_schedule_var, "es. 08:00-19:00=2M, 19:00-08:00=0")
+        ):
+            row = tk.Frame(bandwidth_frame, bg=self.frame_color)
+            row.pack(fill=tk.X, pady=2)
+            tk.Label(row, text=text, width=12, anchor=tk.W,
+                    bg=self.frame_color, fg=self.fg_color,
+                    font=('Segoe UI', 9)).pack(side=tk.LEFT)
+            tk.Entry(row, textvariable=variable, width=40,
+                    font=('Segoe UI', 9),
+                    bg=self.bg_color, fg=self.fg_color,
+                    insertbackground=self.fg_color,
+                    relief=tk.FLAT, bd=5).pack(side=tk.LEFT, ipady=3)
+            tk.Label(row, text=hint,
+                    bg=self.frame_color, fg=self.accent_color,
+                    font=('Segoe UI', 8)).pack(side=tk.LEFT, padx=10)
+
+        tk.Button(bandwidth_frame, text="✔️ Applica",
+                 command=self.apply_bandwidth_limit,
+                 bg=self.frame_color, fg=self.accent_color,
+                 font=('Segoe UI', 9, 'bold'),
+                 relief=tk.FLAT, bd=0, padx=15, pady=5,
+                 cursor='hand2').pack(anchor=tk.W, pady=(10, 0))
+
         # About
         about_frame = ttk.Frame(self.content_area, style='Card.TFrame', padding="20")
         about_frame.pack(fill=tk.X)
@@ -1093,6 +1575,20 @@ class YouTubeDownloaderGUI:
                               font=('Segoe UI', 10), justify=tk.LEFT)
         about_label.pack(anchor=tk.W)
 
+    def format_stage_metrics(self):
+        """Tabella di mediana e p95 per fase, dalla tabella job_metrics"""
+        durations = self.db.get_stage_durations(self.METRICS_JOBS)
+        if not durations:
+            return "Nessun job misurato finora"
+
+        lines = [f"{'Fase':<18}{'Job':>5}{'Mediana':>10}{'p95':>10}"]
+        for stage, label in StageTimer.LABELS.items():
+            values = sorted(durations.get(stage, []))
+            if values:
+                lines.append(f"{label:<18}{len(values):>5}"
+                             f"{percentile(values, 50):>9.2f}s{percentile(values, 95):>9.2f}s")
+        return '\n'.join(lines)
+
     # Metodi helper e download (mantengono logica originale)
 
     def browse_directory(self):
@@ -1103,275 +1599,218 @@ class YouTubeDownloaderGUI:
             self.log(f"📁 Directory cambiata: {directory}", 'info')
 
     def log(self, message, tag='info'):
-        """Aggiungi messaggio al log"""
-        if hasattr(self, 'log_text'):
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            self.log_text.insert(tk.END, f"[{timestamp}] {message}\n", tag)
-            self.log_text.see(tk.END)
-            self.root.update_idletasks()
+        """Aggiungi messaggio al log (chiamabile da qualsiasi thread)"""
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        self.log_buffer.append(f"[{timestamp}] {message}\n", tag)
+        # Le righe vengono inserite nel widget a blocchi, una volta per tick
+        self.ui_bus.post_latest('log_flush', self.flush_log)
+
+    def flush_log(self):
+        """Inserisce nel widget le righe arrivate dall'ultimo tick (solo thread Tk)"""
+        if hasattr(self, 'log_text') and self.log_text.winfo_exists():
+            self.insert_log_lines(self.log_buffer.take_pending())
+
+    def insert_log_lines(self, lines):
+        """Inserisce un blocco di righe e rimuove le più vecchie oltre il limite"""
+        if not lines:
+            return
+
+        args = []
+        for line, tag in lines:
+            args.extend((line, tag))
+        self.log_text.insert(tk.END, *args)
+
+        # 'end-1c' è sull'ultima riga (vuota): le righe di testo sono una in meno
+        line_count = int(self.log_text.index('end-1c').split('.')[0]) - 1
+        excess = line_count - self.log_buffer.max_lines
+        if excess > 0:
+            self.log_text.delete('1.0', f'{excess + 1}.0')
+
+        self.log_text.see(tk.END)
 
     def copy_log_to_clipboard(self):
-        """Copia tutto il contenuto del log nella clipboard"""
+        """Copia tutto lo storico del log nella clipboard"""
         if hasattr(self, 'log_text'):
-            log_content = self.log_text.get("1.0", tk.END)
+            log_content = self.log_buffer.read_all()
             self.root.clipboard_clear()
             self.root.clipboard_append(log_content)
             self.root.update()
             messagebox.showinfo("Copiato", "Log copiato nella clipboard!")
 
-    def strip_ansi_codes(self, text):
-        """Rimuove tutti i codici ANSI di escape dal testo"""
-        ansi_escape = re.compile(r'\x1b\[[0-9;]*m')
-        return ansi_escape.sub('', text)
+    def on_videos_saved(self, records, options):
+        """Miniature e Visual Summary dei video appena salvati (thread worker)"""
+        for record in records:
+            video_data = record['video']
 
-    def progress_hook(self, d):
-        """Hook per aggiornare la progress bar"""
-        if d['status'] == 'downloading':
-            try:
-                percent_str = self.strip_ansi_codes(d.get('_percent_str', '0%').strip())
-                percent = float(percent_str.replace('%', ''))
+            # Miniatura per Libreria e risultati di ricerca
+            if video_data['thumbnail_path']:
+                self.thumbnails.precompute(video_data['thumbnail_path'],
+                                           [ThumbnailCache.LIBRARY_SIZE])
 
-                self.progress_var.set(percent)
+            # Genera Visual Summary se richiesto
+            if self.pipeline.wants_summary(record, options):
+                self.log(f"📸 Visual Summary in coda: {video_data['id']}", 'info')
+                self.screenshot_queue.submit(video_data['id'], video_data['file_path'],
+                                             self.pipeline.SUMMARY_INTERVAL,
+                                             options['output_path'], record.get('job_id'))
+
+    def downloads_active(self):
+        """True se ci sono download in corso o in coda (thread worker)"""
+        active, pending = self.download_queue.stats()
+        return bool(active or pending)
+
+    def toggle_screenshot_pause(self):
+        """Sospende o riprende l'avvio di nuovi Visual Summary"""
+        if self.screenshots_paused_var.get():
+            self.screenshot_queue.pause()
+        else:
+            self.screenshot_queue.resume()
 
-                downloaded = self.strip_ansi_codes(d.get('_downloaded_bytes_str', 'N/A'))
-                total = self.strip_ansi_codes(d.get('_total_bytes_str', 'N/A'))
-                speed = self.strip_ansi_codes(d.get('_speed_str', 'N/A'))
-                eta = self.strip_ansi_codes(d.get('_eta_str', 'N/A'))
+    def update_screenshot_status(self):
+        """Aggiorna l'arretrato degli screenshot (chiamabile dai thread worker)"""
+        self.ui_bus.post_latest('screenshot_status', self.refresh_screenshot_status)
 
-                status = f"⬇️ {percent:.1f}% - {downloaded}/{total} - {speed} - ETA: {eta}"
-                self.status_label.config(text=status)
-            except:
-                pass
-        elif d['status'] == 'finished':
-            self.progress_var.set(100)
-            self.status_label.config(text="✅ Download completato!")
+    def refresh_screenshot_status(self):
+        """Mostra video in elaborazione e in attesa nella sezione Visual Summary"""
+        if not (hasattr(self, 'screenshot_status_label')
+                and self.screenshot_status_label.winfo_exists()):
+            return
+
+        running, pending, held = self.screenshot_queue.stats()
+        text = (f"📸 Coda screenshot: {running} in corso, {pending} in attesa "
+                f"(max {self.screenshot_queue.max_workers} paralleli)")
+        if held and pending:
+            text += " - ⏸️ in pausa"
+        backlog = self.screenshot_queue.backlog()
+        if backlog:
+            text += "\n⏭️ Prossimi: " + ", ".join(backlog[:5])
+            if len(backlog) > 5:
+                text += f" e altri {len(backlog) - 5}"
+        self.screenshot_status_label.config(text=text)
 
-    def download_video(self):
-        """Funzione per scaricare il video - USA SUBPROCESS per supporto HD"""
+    def start_download(self):
+        """Aggiunge l'URL alla coda di download"""
         url = self.url_var.get().strip()
 
         if not url:
             self.log("❌ ERRORE: Inserisci un URL valido!", 'error')
             messagebox.showerror("Errore", "Inserisci un URL valido!")
-            self.is_downloading = False
-            self.download_btn.config(state=tk.NORMAL, text="⬇️ SCARICA VIDEO")
             return
 
-        output_path = self.download_path.get()
-        os.makedirs(output_path, exist_ok=True)
-
-        # Costruiamo il comando yt-dlp con --remote-components per HD
-        # Questo è l'UNICO modo per ottenere formati HD con YouTube moderno
-        cmd = [
-            'yt-dlp',
-            '--remote-components', 'ejs:github',  # Challenge solver per HD
-            '--newline',  # Progress su righe separate
-            '-o', os.path.join(output_path, '%(title)s.%(ext)s'),
-            '--write-thumbnail',  # Download thumbnail
-        ]
-
-        # Formato
-        if self.format_var.get() == 'audio':
-            cmd.extend(['-f', 'bestaudio/best'])
-            cmd.extend(['-x', '--audio-format', 'mp3', '--audio-quality', '192K'])
-            self.log("🎵 Modalità: Solo Audio (MP3)", 'info')
-        elif self.format_var.get() == 'subtitles':
-            cmd.extend(['--skip-download', '--write-subs', '--write-auto-subs'])
-            cmd.extend(['--sub-langs', 'it,en,es,fr,de,pt,ru,ja,ko,zh-Hans,zh-Hant,ar'])
-            cmd.extend(['--sub-format', 'srt/vtt/best'])
-            self.log("📝 Modalità: Solo Sottotitoli", 'info')
-        else:
-            quality = self.quality_var.get()
-            if quality == 'best':
-                format_string = 'bestvideo+bestaudio/best'
-            else:
-                format_string = f'bestvideo[height<={quality}]+bestaudio/bestvideo+bestaudio/best'
-
-            cmd.extend(['-f', format_string])
-            cmd.extend(['--merge-output-format', 'mp4'])
-            self.log(f"🎬 Modalità: Video - Qualità: {quality}", 'info')
-
-        # Sottotitoli per Knowledge Base
-        if self.subtitles_var.get() and self.format_var.get() != 'subtitles':
-            cmd.extend(['--write-subs', '--write-auto-subs', '--sub-langs', 'it,en'])
-            cmd.append('--ignore-errors')  # Continua se sottotitoli falliscono
-            self.log("🧠 Knowledge Base: Abilitato (sottotitoli opzionali)", 'info')
-
-        # Playlist
-        if self.playlist_var.get():
-            cmd.append('--yes-playlist')
-            self.log("📑 Modalità Playlist: Attiva", 'info')
-        else:
-            cmd.append('--no-playlist')
-
-        # Aggiungi URL
-        cmd.append(url)
-
+        # Le opzioni vengono fissate al momento dell'invio: cambiarle dopo
+        # non influenza i job già in coda
+        options = {
+            'output_path': self.download_path.get(),
+            'format': self.format_var.get(),
+            'quality': self.quality_var.get(),
+            'knowledge_base': self.subtitles_var.get(),
+            'playlist': self.playlist_var.get(),
+            'auto_summary': self.auto_summary_var.get(),
+            'skip_known': self.skip_known_var.get()
+        }
+
+        job = self.pipeline.create_job(url, options)
+        self.submit_job(job)
+        self.url_var.set("")
+
+        self.log(f"[#{job.id}] ➕ Aggiunto alla coda: {url}", 'info')
+
+    def submit_job(self, job):
+        """Accoda un job e lo mostra in tabella (anche dai thread worker,
+        per gli elementi delle playlist)"""
+        self.jobs.append(job)
+        self.download_queue.submit(job)
+        self.update_job(job)
+
+    def register_job(self, job):
+        """Mostra in tabella un job ripreso che non va eseguito (playlist già
+        elencata o elemento già terminato)"""
+        self.jobs.append(job)
+        self.update_job(job)
+
+    def update_max_workers(self):
+        """Applica il nuovo numero di download paralleli"""
         try:
-            self.log(f"🔗 URL: {url}", 'info')
-            self.log("🚀 Inizio download con challenge solver HD...", 'info')
-            self.log(f"🔧 Comando: yt-dlp --remote-components ejs:github ...", 'info')
-
-            # Esegui yt-dlp come subprocess
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                encoding='utf-8',
-                errors='replace'
-            )
-
-            # Leggi output per progress
-            for line in process.stdout:
-                line = line.strip()
-                if line:
-                    self.log(line, 'info')
-
-                    # Parse progress
-                    if '[download]' in line and '%' in line:
-                        try:
-                            # Cerca pattern "X.X%"
-                            match = re.search(r'(\d+\.?\d*)%', line)
-                            if match:
-                                percent = float(match.group(1))
-                                self.progress_var.set(percent)
-                                self.status_label.config(text=f"⬇️ Download: {percent:.1f}%")
-                                self.root.update_idletasks()
-                        except:
-                            pass
-
-            process.wait()
-
-            if process.returncode == 0:
-                self.log("✅ DOWNLOAD COMPLETATO!", 'success')
-                self.status_label.config(text="✅ Download completato!")
-                self.progress_var.set(100)
-
-                # Salva nel database se richiesto
-                if self.subtitles_var.get():
-                    self.log("💾 Salvataggio nel database...", 'info')
-                    # Usa yt-dlp API solo per ottenere info (senza download)
-                    try:
-                        with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
-                            info = ydl.extract_info(url, download=False)
-                            if info:
-                                if 'entries' in info:
-                                    for video_info in info['entries']:
-                                        if video_info:
-                                            self.save_to_database(video_info, output_path)
-                                else:
-                                    self.save_to_database(info, output_path)
-                    except Exception as e:
-                        self.log(f"⚠️ Errore salvataggio database: {e}", 'error')
-
-                messagebox.showinfo("Successo", f"Download completato!\n\nFile in: {output_path}")
-            else:
-                raise Exception(f"yt-dlp terminato con errore (code {process.returncode})")
+            workers = int(self.max_workers_var.get())
+        except (tk.TclError, ValueError):
+            return
+        self.download_queue.set_max_workers(workers)
+        self.log(f"🔀 Download paralleli: {self.download_queue.max_workers}", 'info')
+        self.refresh_queue_status()
 
-        except Exception as e:
-            error_msg = str(e)
-            self.log(f"❌ ERRORE: {error_msg}", 'error')
-            self.status_label.config(text="❌ Errore durante il download")
-            self.progress_var.set(0)
-            messagebox.showerror("Errore", f"Errore:\n\n{error_msg}")
-
-        finally:
-            self.is_downloading = False
-            self.download_btn.config(state=tk.NORMAL, text="⬇️ SCARICA VIDEO")
-
-    def save_to_database(self, video_info, output_path):
-        """Salva video e trascrizioni nel database"""
+    def apply_bandwidth_limit(self):
+        """Applica limite di banda e fasce orarie, anche ai download in corso"""
         try:
-            video_id = video_info.get('id')
-
-            # Trova file scaricato
-            file_path = None
-            for ext in ['mp4', 'webm', 'mkv', 'mp3']:
-                potential_path = os.path.join(output_path, f"{video_info.get('title')}.{ext}")
-                if os.path.exists(potential_path):
-                    file_path = potential_path
-                    break
-
-            # Trova thumbnail
-            thumb_path = None
-            for ext in ['jpg', 'png', 'webp']:
-                potential_thumb = os.path.join(output_path, f"{video_info.get('title')}.{ext}")
-                if os.path.exists(potential_thumb):
-                    thumb_path = potential_thumb
-                    break
-
-            # File size
-            file_size = os.path.getsize(file_path) if file_path and os.path.exists(file_path) else 0
-
-            # Salva video
-            video_data = {
-                'id': video_id,
-                'title': video_info.get('title'),
-                'uploader': video_info.get('uploader'),
-                'duration': video_info.get('duration'),
-                'upload_date': video_info.get('upload_date'),
-                'description': video_info.get('description', '')[:500],  # Primi 500 char
-                'thumbnail_path': thumb_path,
-                'file_path': file_path,
-                'file_size': file_size,
-                'format': self.format_var.get()
-            }
-
-            self.db.add_video(video_data)
-            self.log(f"💾 Video salvato nel database: {video_id}", 'success')
-
-            # Trova e salva sottotitoli (opzionale - può fallire)
-            subtitles_found = False
-            try:
-                for lang in ['it', 'en']:
-                    for ext in ['srt', 'vtt']:
-                        sub_path = os.path.join(output_path, f"{video_info.get('title')}.{lang}.{ext}")
-                        if os.path.exists(sub_path):
-                            try:
-                                with open(sub_path, 'r', encoding='utf-8') as f:
-                                    sub_text = f.read()
-                                    # Rimuovi timestamp e formattazione
-                                    clean_text = re.sub(r'\d{2}:\d{2}:\d{2}[.,]\d{3}\s*-->\s*\d{2}:\d{2}:\d{2}[.,]\d{3}', '', sub_text)
-                                    clean_text = re.sub(r'\d+\n', '', clean_text)
-                                    clean_text = ' '.join(clean_text.split())
-
-                                    self.db.add_transcript(video_id, lang, clean_text)
-                                    self.log(f"📝 Trascrizione salvata: {lang}", 'success')
-                                    subtitles_found = True
-                            except Exception as e:
-                                self.log(f"⚠️ Errore lettura sottotitolo {lang}: {e}", 'error')
-
-                if not subtitles_found and self.subtitles_var.get():
-                    self.log("⚠️ Nessun sottotitolo trovato (possibile errore 429 o non disponibili)", 'error')
-                    self.log("💡 Video salvato comunque - ricerca Knowledge Base limitata", 'info')
-            except Exception as e:
-                self.log(f"⚠️ Errore processing sottotitoli: {e}", 'error')
+            rate = parse_rate(self.rate_limit_var.get())
+            schedule = parse_schedule(self.rate_schedule_var.get())
+        except ValueError as e:
+            messagebox.showerror("Errore", f"Limite di banda non valido:\n{e}")
+            return
+        self.governor.configure(rate, schedule)
+        self.log(f"🚦 Limite di banda: {self.governor.describe()}", 'info')
 
-            # Genera Visual Summary se richiesto
-            if self.auto_summary_var.get() and file_path and self.format_var.get() == 'video':
-                self.log("📸 Generazione Visual Summary in background...", 'info')
-                thread = threading.Thread(
-                    target=self.extract_screenshots_thread,
-                    args=(video_id, file_path, 30),
-                    daemon=True
-                )
-                thread.start()
+    def update_job(self, job):
+        """Aggiorna la riga di un job (chiamabile dai thread worker).
 
-        except Exception as e:
-            self.log(f"⚠️ Errore salvataggio database: {e}", 'error')
-
-    def start_download(self):
-        """Avvia il download in un thread separato"""
-        if self.is_downloading:
+        Più aggiornamenti dello stesso job nello stesso tick diventano uno solo.
+        """
+        self.ui_bus.post_latest(('job', job.id), self.refresh_job_row, job)
+        self.ui_bus.post_latest('queue_status', self.refresh_queue_status)
+        # La coda screenshot può essere trattenuta dai download in corso
+        self.update_screenshot_status()
+
+    def refresh_job_row(self, job):
+        """Ridisegna la riga del job nella tabella della coda"""
+        if hasattr(self, 'jobs_tree') and self.jobs_tree.winfo_exists():
+            values = (
+                job.id,
+                job.url,
+                job.state,
+                f"{job.progress:.1f}%",
+                job.status or job.result
+            )
+            iid = str(job.id)
+            if self.jobs_tree.exists(iid):
+                self.jobs_tree.item(iid, values=values)
+            else:
+                parent = ''
+                if job.parent is not None and self.jobs_tree.exists(str(job.parent.id)):
+                    parent = str(job.parent.id)
+                self.jobs_tree.insert(parent, tk.END, iid=iid, values=values)
+
+    def refresh_queue_status(self):
+        """Aggiorna progress bar e stato complessivi della coda"""
+        if not (hasattr(self, 'status_label') and self.status_label.winfo_exists()):
             return
 
-        self.is_downloading = True
-        self.download_btn.config(state=tk.DISABLED, text="⏳ Download...")
-        self.progress_var.set(0)
-
-        thread = threading.Thread(target=self.download_video, daemon=True)
-        thread.start()
+        active, pending = self.download_queue.stats()
+        # Le playlist contano attraverso i loro elementi
+        leaves = [j for j in self.jobs if not j.children]
+        running = [j for j in leaves if j.state == DownloadJob.RUNNING]
+
+        if running:
+            self.progress_var.set(sum(j.progress for j in running) / len(running))
+            self.status_label.config(
+                text=f"⬇️ {active} in corso, {pending} in coda "
+                     f"(max {self.download_queue.max_workers} paralleli)")
+        elif pending:
+            self.status_label.config(text=f"⏳ {pending} in coda")
+        elif self.jobs:
+            failed = sum(1 for j in leaves if j.state == DownloadJob.FAILED)
+            done = sum(1 for j in leaves if j.state == DownloadJob.DONE)
+            self.progress_var.set(100)
+            self.status_label.config(text=f"✅ Coda completata: {done} ok, {failed} errori")
+
+    def clear_finished_jobs(self):
+        """Rimuove dalla tabella i job completati o falliti"""
+        # Gli elementi restano finché non è terminata l'intera playlist
+        finished = [j for j in self.jobs
+                    if j.finished and (j.parent is None or j.parent.finished)]
+        for job in finished:
+            self.jobs.remove(job)
+            if self.jobs_tree.exists(str(job.id)):
+                self.jobs_tree.delete(str(job.id))
+        self.refresh_queue_status()
 
     def open_file(self, file_path):
         """Apri file con applicazione predefinita"""
@@ -1385,6 +1824,10 @@ class YouTubeDownloaderGUI:
         except Exception as e:
             messagebox.showerror("Errore", f"Impossibile aprire il file:\n{e}")
 
+    def open_at_time(self, video_id, seconds):
+        """Apre il video su YouTube dal secondo indicato"""
+        webbrowser.open(f"https://www.youtube.com/watch?v={video_id}&t={int(seconds)}s")
+
     def open_folder(self, file_path):
         """Apri la cartella contenente il file"""
         try:
@@ -1405,8 +1848,12 @@ class YouTubeDownloaderGUI:
 
 def main():
     """Funzione principale"""
+    startup = StartupTimer(STARTUP_T0)
+    startup.mark('import')
+
     root = tk.Tk()
-    app = YouTubeDownloaderGUI(root)
+    startup.mark('tk')
+    app = YouTubeDownloaderGUI(root, startup)
 
     # Centra finestra
     root.update_idletasks()
@@ -1418,6 +1865,15 @@ def main():
 
     root.mainloop()
 
+    # I download in corso si fermano lasciando i .part: ripresi al prossimo avvio
+    app.pipeline.shutdown()
+    app.download_queue.join(timeout=10)
+    app.store.stop()
+
+    # Chiude la connessione del thread Tk (checkpoint del WAL)
+    app.db.close()
+    app.log_buffer.close()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Profilazione opzionale di download, ingest e screenshot.
+
+Con la variabile d'ambiente YTDL_PROFILE (o --profile nella CLI) ogni
+esecuzione di DownloadPipeline.download_video, save_to_database ed
+extract_screenshots viene eseguita sotto cProfile e tracemalloc, e i
+risultati finiscono nella cartella profiles accanto al database:
+
+    <data>_job<id>_<video_id>_<fase>.prof   statistiche cProfile (pstats, snakeviz)
+    <data>_job<id>_<video_id>_<fase>.txt    funzioni più costose e allocazioni
+
+YTDL_PROFILE=1 (o "all") profila tutte le fasi; altrimenti indica le fasi
+separate da virgole, ad esempio YTDL_PROFILE=ingest. Se non è impostata
+i metodi non vengono nemmeno avvolti: nessun costo in produzione.
+"""
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+
+# Variabile d'ambiente che attiva la profilazione
+PROFILE_ENV = 'YTDL_PROFILE'
+
+# Fasi profilabili: download_video, save_to_database, extract_screenshots
+KINDS = ('download', 'ingest', 'screenshots')
+
+
+def parse_kinds(value):
+    """Fasi da profilare dal valore di YTDL_PROFILE ("1", "all", "ingest,screenshots")"""
+    value = (value or '').strip().lower()
+    if value in ('', '0', 'no', 'off', 'false'):
+        return set()
+    if value in ('1', 'yes', 'on', 'true', 'all'):
+        return set(KINDS)
+
+    kinds = {kind.strip() for kind in value.split(',') if kind.strip()}
+    unknown = kinds - set(KINDS)
+    if unknown:
+        raise ValueError(f"fasi di profilazione sconosciute: {', '.join(sorted(unknown))} "
+                         f"(valide: {', '.join(KINDS)})")
+    return kinds
+
+
+class Profiler:
+    """cProfile e tracemalloc attorno alle singole esecuzioni di una fase.
+
+    cProfile misura un thread: un'esecuzione annidata nello stesso thread
+    (l'ingest dentro il download) registra solo le allocazioni, perché le
+    sue chiamate compaiono già nel profilo esterno. tracemalloc invece è
+    unico per il processo: con più job in parallelo le allocazioni
+    riportate includono anche quelle degli altri thread.
+    """
+
+    # Righe riportate nel file di testo per funzioni e allocazioni
+    TOP = 30
+
+    def __init__(self, directory, kinds=KINDS, log=None):
+        self.directory = Path(directory)
+        self.kinds = set(kinds)
+        self.log = log or (lambda message, tag='info': None)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._tracing = 0
+        self._owns_tracing = False
+
+    @classmethod
+    def from_env(cls, directory, log=None, value=None):
+        """Profiler configurato da YTDL_PROFILE (o da `value`), None se disattivato"""
+        if value is None:
+            value = os.environ.get(PROFILE_ENV)
+        kinds = parse_kinds(value)
+        return cls(directory, kinds, log) if kinds else None
+
+    def wrap(self, kind, function, describe):
+        """Avvolge `function` se la fase è attiva.
+
+        `describe` riceve gli stessi argomenti di `function` e ritorna
+        (job_id, video_ids) per il nome dei file; viene chiamata a esecuzione
+        terminata, quando gli id sono noti.
+        """
+        if kind not in self.kinds:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            return self.run(kind, function, args, kwargs, describe)
+        return wrapper
+
+    def run(self, kind, function, args, kwargs, describe):
+        nested = getattr(self._local, 'active', False)
+        profile = None
+        if not nested:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+: un solo cProfile attivo per processo
+                profile = None
+            self._local.active = profile is not None
+
+        self._start_tracing()
+        before = tracemalloc.take_snapshot()
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+                self._local.active = False
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            self._stop_tracing()
+
+            try:
+                job_id, video_ids = describe(*args, **kwargs)
+                self.dump(kind, job_id, video_ids, profile, before, after, elapsed, peak)
+            except Exception as e:
+                self.log(f"⚠️ Errore salvataggio profilo {kind}: {e}", 'error')
+
+    def _start_tracing(self):
+        with self._lock:
+            if self._tracing == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracing = True
+            self._tracing += 1
+
+    def _stop_tracing(self):
+        with self._lock:
+            self._tracing -= 1
+            if self._tracing == 0 and self._owns_tracing:
+                tracemalloc.stop()
+                self._owns_tracing = False
+
+    def dump(self, kind, job_id, video_ids, profile, before, after, elapsed, peak):
+        """Scrive .prof (se c'è il profilo cProfile) e .txt della singola esecuzione"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        video = re.sub(r'[^\w-]', '_', video_ids[0]) if video_ids else 'nessun-video'
+        if len(video_ids) > 1:
+            video += f"+{len(video_ids) - 1}"
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        job = job_id if job_id is not None else '-'
+        base = self.directory / f"{stamp}_job{job}_{video}_{kind}"
+
+        ignore = (tracemalloc.Filter(False, tracemalloc.__file__),
+                  tracemalloc.Filter(False, __file__),
+                  tracemalloc.Filter(False, '<frozen importlib._bootstrap>'))
+        growth = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'lineno')
+
+        with open(f"{base}.txt", 'w', encoding='utf-8') as f:
+            f.write(f"Fase: {kind}\nJob: {job}\nVideo: {', '.join(video_ids) or '-'}\n"
+                    f"Durata: {elapsed:.3f}s\n"
+                    f"Picco memoria tracciata (processo): {peak / 1048576:.1f}MiB\n\n")
+
+            if profile is not None:
+                profile.dump_stats(f"{base}.prof")
+                stream = io.StringIO()
+                stats = pstats.Stats(profile, stream=stream)
+                stats.sort_stats('cumulative').print_stats(self.TOP)
+                f.write(stream.getvalue())
+            else:
+                f.write("cProfile: esecuzione annidata, vedi il profilo esterno\n")
+
+            f.write(f"\nAllocazioni durante l'esecuzione (prime {self.TOP}):\n")
+            for stat in growth[:self.TOP]:
+                f.write(f"{stat}\n")
+
+        self.log(f"🔬 Profilo {kind} salvato: {base}.txt", 'info')
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modello comune degli eventi di progresso dei download.
+
+Usato sia dal progress hook di yt-dlp (youtube_downloader.py) sia dal parser
+dell'output del subprocess yt-dlp (youtube_downloader_v2.py), che stampa una
+riga JSON per ogni aggiornamento grazie a PROGRESS_TEMPLATE.
+"""
+
+import json
+import time
+from collections import OrderedDict
+
+
+# Prefisso delle righe di progresso nell'output di yt-dlp
+PROGRESS_PREFIX = 'ytdl-progress '
+
+# Campi del dizionario di progresso di yt-dlp inclusi negli eventi
+PROGRESS_FIELDS = (
+    'status', 'downloaded_bytes', 'total_bytes', 'total_bytes_estimate',
+    'speed', 'eta', 'elapsed', 'fragment_index', 'fragment_count', 'filename'
+)
+
+# Valore per --progress-template: una riga JSON per aggiornamento. Con la
+# sintassi {campo,...} i campi mancanti vengono omessi, quindi il JSON resta valido
+PROGRESS_TEMPLATE = (
+    'download:' + PROGRESS_PREFIX +
+    '{"info": %(info.{id,format_id})j, '
+    '"progress": %(progress.{' + ','.join(PROGRESS_FIELDS) + '})j}'
+)
+
+
+class ProgressEvent:
+    """Aggiornamento di progresso di un singolo stream (formato) di un video"""
+
+    __slots__ = ('video_id', 'stream', 'status', 'downloaded_bytes', 'total_bytes',
+                 'speed', 'eta', 'elapsed', 'fragment_index', 'fragment_count',
+                 'filename')
+
+    def __init__(self, video_id=None, stream=None, status='downloading',
+                 downloaded_bytes=0, total_bytes=None, speed=None, eta=None,
+                 elapsed=None, fragment_index=None, fragment_count=None,
+                 filename=None):
+        self.video_id = video_id
+        self.stream = stream
+        self.status = status
+        self.downloaded_bytes = downloaded_bytes or 0
+        self.total_bytes = total_bytes
+        self.speed = speed
+        self.eta = eta
+        self.elapsed = elapsed
+        self.fragment_index = fragment_index
+        self.fragment_count = fragment_count
+        self.filename = filename
+
+    @classmethod
+    def from_progress(cls, progress, info=None):
+        """Crea l'evento dal dizionario di progresso di yt-dlp"""
+        info = info or {}
+        total = progress.get('total_bytes') or progress.get('total_bytes_estimate')
+        event = cls(
+            video_id=info.get('id'),
+            stream=info.get('format_id'),
+            status=progress.get('status', 'downloading'),
+            downloaded_bytes=progress.get('downloaded_bytes'),
+            total_bytes=total,
+            speed=progress.get('speed'),
+            eta=progress.get('eta'),
+            elapsed=progress.get('elapsed'),
+            fragment_index=progress.get('fragment_index'),
+            fragment_count=progress.get('fragment_count'),
+            filename=progress.get('filename')
+        )
+        # A fine stream il totale coincide con quanto scaricato
+        if event.status == 'finished':
+            event.total_bytes = event.total_bytes or event.downloaded_bytes
+            event.downloaded_bytes = event.total_bytes
+        return event
+
+    @classmethod
+    def from_hook(cls, d):
+        """Crea l'evento dal dizionario passato ai progress_hooks di yt-dlp"""
+        return cls.from_progress(d, d.get('info_dict'))
+
+    @property
+    def percent(self):
+        if self.total_bytes:
+            return min(100.0, self.downloaded_bytes * 100.0 / self.total_bytes)
+        if self.fragment_count and self.fragment_index:
+            return min(100.0, self.fragment_index * 100.0 / self.fragment_count)
+        return None
+
+
+def parse_progress_line(line):
+    """Evento dalla riga stampata con PROGRESS_TEMPLATE, o None per le altre righe"""
+    if not line.startswith(PROGRESS_PREFIX):
+        return None
+
+    try:
+        data = json.loads(line[len(PROGRESS_PREFIX):])
+    except ValueError:
+        return None
+
+    return ProgressEvent.from_progress(data.get('progress') or {}, data.get('info'))
+
+
+class ProgressTracker:
+    """Aggrega gli eventi di un download: byte per stream e totali complessivi.
+
+    Con video e audio separati (o una playlist) ogni stream ha il proprio
+    totale, quindi la percentuale complessiva non riparte da zero quando
+    inizia lo stream successivo.
+    """
+
+    def __init__(self):
+        self.streams = OrderedDict()
+        self.started = None
+        self.last = None
+
+    def update(self, event):
+        """Registra un evento e ritorna il tracker stesso"""
+        if self.started is None:
+            self.started = time.monotonic()
+        if event.video_id or event.stream:
+            key = (event.video_id, event.stream)
+        else:
+            key = event.filename
+        self.streams[key] = event
+        self.last = event
+        return self
+
+    @property
+    def downloaded_bytes(self):
+        return sum(e.downloaded_bytes for e in self.streams.values())
+
+    @property
+    def total_bytes(self):
+        """Somma dei totali noti (gli stream senza totale contano quanto scaricato)"""
+        return sum(e.total_bytes or e.downloaded_bytes for e in self.streams.values())
+
+    @property
+    def percent(self):
+        total = self.total_bytes
+        if total:
+            return min(100.0, self.downloaded_bytes * 100.0 / total)
+        if self.last is not None and self.last.percent is not None:
+            return self.last.percent
+        return 0.0
+
+    @property
+    def speed(self):
+        """Velocità istantanea dello stream in corso (byte/s)"""
+        if self.last is None or self.last.status != 'downloading':
+            return None
+        return self.last.speed
+
+    @property
+    def average_speed(self):
+        """Throughput medio dall'inizio del download (byte/s)"""
+        if self.started is None:
+            return None
+        elapsed = time.monotonic() - self.started
+        return self.downloaded_bytes / elapsed if elapsed > 0 else None
+
+    def summary(self):
+        """Riga di stato leggibile per la UI"""
+        text = (f"⬇️ {self.percent:.1f}% - {format_bytes(self.downloaded_bytes)}"
+                f"/{format_bytes(self.total_bytes)}")
+
+        speed = self.speed
+        if speed:
+            text += f" - {format_bytes(speed)}/s"
+
+        last = self.last
+        if last is not None and last.eta is not None and last.status == 'downloading':
+            minutes, seconds = divmod(int(last.eta), 60)
+            text += f" - ETA: {minutes:02d}:{seconds:02d}"
+        if last is not None and last.fragment_count:
+            text += f" - frag {last.fragment_index or 0}/{last.fragment_count}"
+
+        return text
+
+
+def format_bytes(value):
+    """Formatta un numero di byte (es. 12.3MiB)"""
+    if value is None:
+        return 'N/A'
+
+    value = float(value)
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(value) < 1024:
+            return f"{value:.1f}{unit}" if unit != 'B' else f"{int(value)}B"
+        value /= 1024
+    return f"{value:.1f}TiB"
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parser dei sottotitoli SRT e WebVTT.
+
+Legge il file una riga alla volta e genera i singoli cue con tempi di
+inizio e fine, già ripuliti da tag ed entità HTML. Dai sottotitoli automatici di YouTube
+vengono tolte anche le righe ripetute da un cue all'altro. Usato per salvare le trascrizioni a
+segmenti (tabella transcript_segments) nella Knowledge Base.
+"""
+
+import html
+import re
+
+
+# Riga dei tempi: "00:01:02,500 --> 00:01:04,000" (SRT) o
+# "01:02.500 --> 01:04.000 align:start" (VTT, ore opzionali e impostazioni)
+TIMING_RE = re.compile(
+    r'((?:\d+:)?\d{1,2}:\d{2}[.,]\d{1,3})\s*-->\s*((?:\d+:)?\d{1,2}:\d{2}[.,]\d{1,3})'
+)
+
+# Tag di formattazione e timestamp interni (<b>, <c.colore>, <00:00:01.000>)
+TAG_RE = re.compile(r'<[^>]*>|\{\\[^}]*\}')
+
+# Marcatori dei sottotitoli automatici di YouTube: timestamp per parola
+# (<00:00:01.000>) e tag <c> attorno alle singole parole
+AUTO_CAPTION_RE = re.compile(r'<\d+:\d{2}:\d{2}\.\d{3}>|</?c[.>]')
+
+
+def parse_timestamp(value):
+    """Converte "hh:mm:ss,mmm" (o "mm:ss.mmm") in secondi"""
+    clock, _, fraction = value.replace(',', '.').partition('.')
+    seconds = 0
+    for part in clock.split(':'):
+        seconds = seconds * 60 + int(part)
+    return seconds + int(fraction.ljust(3, '0')[:3]) / 1000
+
+
+def format_timestamp(seconds):
+    """Formatta i secondi come m:ss o h:mm:ss"""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def clean_cue_line(line):
+    """Rimuove tag e entità HTML da una riga di testo"""
+    return ' '.join(html.unescape(TAG_RE.sub('', line)).split())
+
+
+def iter_cues(lines):
+    """Genera (inizio, fine, testo) per ogni cue di un file SRT o VTT.
+
+    `lines` è un qualsiasi iterabile di righe (anche il file aperto), letto
+    una riga alla volta. Intestazioni, numerazione SRT e blocchi NOTE/STYLE
+    vengono ignorati.
+
+    I sottotitoli automatici di YouTube ripetono all'inizio di ogni cue le
+    righe del precedente: quelle righe vengono scartate, e i cue che restano
+    vuoti non vengono generati. Vale solo per i file con i marcatori per
+    parola (<00:00:01.000>, <c>) e per i cue che si sovrappongono nel tempo
+    al precedente; i sottotitoli scritti a mano restano come sono, anche
+    quando due cue consecutivi hanno lo stesso testo.
+    """
+    start = end = None
+    text_lines = []
+    previous = []
+    previous_end = None
+    auto_captions = False
+
+    def flush():
+        nonlocal previous, previous_end
+        current = [line for line in text_lines if line]
+        new_lines = list(current)
+        if auto_captions or (previous_end is not None and start < previous_end):
+            while new_lines and new_lines[0] in previous:
+                new_lines.pop(0)
+        previous = current
+        previous_end = end
+        if new_lines:
+            return start, end, ' '.join(new_lines)
+        return None
+
+    for line in lines:
+        line = line.strip().lstrip('\ufeff')
+
+        match = TIMING_RE.search(line) if '-->' in line else None
+        if match:
+            # Nuovo cue (anche senza riga vuota dopo il precedente)
+            if start is not None:
+                cue = flush()
+                if cue:
+                    yield cue
+            start = parse_timestamp(match.group(1))
+            end = parse_timestamp(match.group(2))
+            text_lines = []
+        elif not line:
+            if start is not None:
+                cue = flush()
+                if cue:
+                    yield cue
+            start = end = None
+            text_lines = []
+        elif start is not None:
+            if not auto_captions and AUTO_CAPTION_RE.search(line):
+                auto_captions = True
+            text_lines.append(clean_cue_line(line))
+
+    if start is not None:
+        cue = flush()
+        if cue:
+            yield cue